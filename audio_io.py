@@ -0,0 +1,382 @@
+"""
+Audio sources and sinks for the voice pipeline
+
+``AudioLoop`` reads microphone audio from an ``AudioSource`` and plays model
+audio into an ``AudioSink``, so the same pipeline runs against the local
+sound card, files, in-memory buffers or a websocket. All audio is mono
+16-bit little-endian PCM; sources deliver ``SEND_SAMPLE_RATE`` and sinks
+receive ``RECEIVE_SAMPLE_RATE`` audio.
+
+``create_source()`` / ``create_sink()`` build one from a spec string, read
+from ``AUDIO_SOURCE`` / ``AUDIO_SINK`` by default:
+
+- ``pyaudio``            default input / output device
+- ``wav:<path>``         WAV file
+- ``raw:<path>``         headerless PCM file
+- ``null``               no input / discard output
+"""
+
+import asyncio
+import os
+import threading
+import wave
+from typing import Callable, Iterable, Optional, Union
+
+SEND_SAMPLE_RATE = 16000
+RECEIVE_SAMPLE_RATE = 24000
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # bytes, 16-bit PCM
+CHUNK_SIZE = 1024  # frames per read
+
+AUDIO_SOURCE = os.getenv("AUDIO_SOURCE", "pyaudio")
+AUDIO_SINK = os.getenv("AUDIO_SINK", "pyaudio")
+# Silence appended after a file source ends, so the model gets to answer
+AUDIO_FILE_TAIL_SECONDS = float(os.getenv("AUDIO_FILE_TAIL_SECONDS", "3"))
+
+_pya = None
+_pya_lock = threading.Lock()
+
+
+def _pyaudio():
+    """The pyaudio module and a shared PyAudio instance, created on first use
+
+    Creating the instance enumerates every audio device, so the sources and
+    sinks call this in a worker thread rather than on the event loop.
+    """
+    global _pya
+    import pyaudio  # optional: only needed for the sound card
+
+    with _pya_lock:
+        if _pya is None:
+            _pya = pyaudio.PyAudio()
+    return pyaudio, _pya
+
+
+class AudioSource:
+    """Produces caller audio; ``read()`` returns None once the stream has ended"""
+
+    sample_rate = SEND_SAMPLE_RATE
+    # Interactive sources (a live microphone) never end on their own
+    interactive = False
+
+    async def start(self):
+        pass
+
+    async def read(self) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class AudioSink:
+    """Consumes model audio"""
+
+    sample_rate = RECEIVE_SAMPLE_RATE
+    # Real-time sinks (a sound card) play at a fixed rate and are fed
+    # constant-size frames by the playback jitter buffer
+    realtime = False
+
+    async def start(self):
+        pass
+
+    async def write(self, data: bytes):
+        raise NotImplementedError
+
+    async def interrupt(self):
+        """Discard audio already written but not yet played (barge-in)"""
+
+    async def close(self):
+        pass
+
+
+class PyAudioSource(AudioSource):
+    """Default (or given) input device via PyAudio"""
+
+    interactive = True
+
+    def __init__(
+        self,
+        sample_rate: int = SEND_SAMPLE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+        device_index: Optional[int] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.device_index = device_index
+        self.stream = None
+
+    async def start(self):
+        pyaudio, pya = await asyncio.to_thread(_pyaudio)
+        device_index = self.device_index
+        if device_index is None:
+            device_index = pya.get_default_input_device_info()["index"]
+        self.stream = await asyncio.to_thread(
+            pya.open,
+            format=pyaudio.paInt16,
+            channels=CHANNELS,
+            rate=self.sample_rate,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=self.chunk_size,
+        )
+
+    async def read(self) -> Optional[bytes]:
+        kwargs = {"exception_on_overflow": False} if __debug__ else {}
+        return await asyncio.to_thread(self.stream.read, self.chunk_size, **kwargs)
+
+    async def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class PyAudioSink(AudioSink):
+    """Default output device via PyAudio"""
+
+    realtime = True
+
+    def __init__(self, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.stream = None
+
+    async def start(self):
+        pyaudio, pya = await asyncio.to_thread(_pyaudio)
+        self.stream = await asyncio.to_thread(
+            pya.open,
+            format=pyaudio.paInt16,
+            channels=CHANNELS,
+            rate=self.sample_rate,
+            output=True,
+        )
+
+    async def write(self, data: bytes):
+        await asyncio.to_thread(self.stream.write, data)
+
+    async def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class MemorySource(AudioSource):
+    """Serves PCM from memory in ``chunk_size`` frames
+
+    With ``realtime`` each chunk is delayed by its duration, like a live
+    microphone; otherwise chunks are returned as fast as they are read.
+    """
+
+    def __init__(
+        self,
+        data: Union[bytes, Iterable[bytes]],
+        sample_rate: int = SEND_SAMPLE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+        realtime: bool = False,
+        tail_seconds: float = 0.0,
+    ):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.realtime = realtime
+        pcm = data if isinstance(data, (bytes, bytearray)) else b"".join(data)
+        tail = int(tail_seconds * sample_rate) * SAMPLE_WIDTH * CHANNELS
+        self._pcm = bytes(pcm) + b"\x00" * tail
+        self._offset = 0
+
+    async def read(self) -> Optional[bytes]:
+        chunk_bytes = self.chunk_size * SAMPLE_WIDTH * CHANNELS
+        if self._offset >= len(self._pcm):
+            return None
+        chunk = self._pcm[self._offset:self._offset + chunk_bytes]
+        self._offset += len(chunk)
+        if self.realtime:
+            await asyncio.sleep(len(chunk) / (SAMPLE_WIDTH * CHANNELS * self.sample_rate))
+        return chunk
+
+
+class MemorySink(AudioSink):
+    """Collects everything written into ``data``"""
+
+    def __init__(self, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.data = bytearray()
+
+    async def write(self, data: bytes):
+        self.data += data
+
+
+class NullSink(AudioSink):
+    """Discards audio (counts the bytes for benchmarks)"""
+
+    def __init__(self, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.bytes_written = 0
+
+    async def write(self, data: bytes):
+        self.bytes_written += len(data)
+
+
+class NullSource(AudioSource):
+    """No caller audio: the stream ends immediately"""
+
+    async def read(self) -> Optional[bytes]:
+        return None
+
+
+def _check_wav(path: str, params, sample_rate: int):
+    if params.nchannels != CHANNELS or params.sampwidth != SAMPLE_WIDTH:
+        raise ValueError(f"{path}: expected mono 16-bit PCM")
+    if params.framerate != sample_rate:
+        raise ValueError(f"{path}: expected {sample_rate} Hz, got {params.framerate} Hz")
+
+
+class WavFileSource(MemorySource):
+    """Plays a mono 16-bit WAV file as caller audio, paced like a microphone"""
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: int = SEND_SAMPLE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+        realtime: bool = True,
+        tail_seconds: float = AUDIO_FILE_TAIL_SECONDS,
+    ):
+        with wave.open(path, "rb") as f:
+            _check_wav(path, f.getparams(), sample_rate)
+            pcm = f.readframes(f.getnframes())
+        super().__init__(pcm, sample_rate, chunk_size, realtime, tail_seconds)
+
+
+class RawFileSource(MemorySource):
+    """Plays a headerless mono 16-bit PCM file as caller audio"""
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: int = SEND_SAMPLE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+        realtime: bool = True,
+        tail_seconds: float = AUDIO_FILE_TAIL_SECONDS,
+    ):
+        with open(path, "rb") as f:
+            pcm = f.read()
+        super().__init__(pcm, sample_rate, chunk_size, realtime, tail_seconds)
+
+
+class WavFileSink(AudioSink):
+    """Records model audio to a WAV file"""
+
+    def __init__(self, path: str, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._wav = None
+
+    async def start(self):
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(CHANNELS)
+        self._wav.setsampwidth(SAMPLE_WIDTH)
+        self._wav.setframerate(self.sample_rate)
+
+    async def write(self, data: bytes):
+        self._wav.writeframes(data)
+
+    async def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class RawFileSink(AudioSink):
+    """Records model audio as headerless PCM"""
+
+    def __init__(self, path: str, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._file = None
+
+    async def start(self):
+        self._file = open(self.path, "wb")
+
+    async def write(self, data: bytes):
+        self._file.write(data)
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class WebSocketSource(AudioSource):
+    """Caller audio from binary websocket frames
+
+    Text frames are handed to ``on_text`` (e.g. typed messages for the
+    model). The stream ends when the caller disconnects.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        on_text: Optional[Callable] = None,
+        sample_rate: int = SEND_SAMPLE_RATE,
+    ):
+        self.websocket = websocket
+        self.on_text = on_text
+        self.sample_rate = sample_rate
+
+    async def read(self) -> Optional[bytes]:
+        from websockets.exceptions import ConnectionClosed
+
+        while True:
+            try:
+                message = await self.websocket.recv()
+            except ConnectionClosed:
+                return None
+            if isinstance(message, bytes):
+                return message
+            if self.on_text is not None:
+                await self.on_text(message)
+
+
+class WebSocketSink(AudioSink):
+    """Model audio as binary websocket frames (dropped once the caller is gone)"""
+
+    def __init__(self, websocket, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        self.websocket = websocket
+        self.sample_rate = sample_rate
+
+    async def write(self, data: bytes):
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            await self.websocket.send(data)
+        except ConnectionClosed:
+            pass
+
+
+def create_source(spec: Optional[str] = None, sample_rate: int = SEND_SAMPLE_RATE) -> AudioSource:
+    """Build the caller audio source named by ``spec`` (default ``AUDIO_SOURCE``)"""
+    spec = spec or AUDIO_SOURCE
+    kind, _, path = spec.partition(":")
+    if kind == "pyaudio":
+        return PyAudioSource(sample_rate)
+    if kind == "wav" and path:
+        return WavFileSource(path, sample_rate)
+    if kind == "raw" and path:
+        return RawFileSource(path, sample_rate)
+    if kind == "null":
+        return NullSource()
+    raise ValueError(f"Unknown audio source: {spec}")
+
+
+def create_sink(spec: Optional[str] = None, sample_rate: int = RECEIVE_SAMPLE_RATE) -> AudioSink:
+    """Build the model audio sink named by ``spec`` (default ``AUDIO_SINK``)"""
+    spec = spec or AUDIO_SINK
+    kind, _, path = spec.partition(":")
+    if kind == "pyaudio":
+        return PyAudioSink(sample_rate)
+    if kind == "wav" and path:
+        return WavFileSink(path, sample_rate)
+    if kind == "raw" and path:
+        return RawFileSink(path, sample_rate)
+    if kind == "null":
+        return NullSink(sample_rate)
+    raise ValueError(f"Unknown audio sink: {spec}")
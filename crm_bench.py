@@ -0,0 +1,477 @@
+"""
+Load test and benchmark for the mock CRM API
+
+Drives the FastAPI ``app`` from ``mock_crm.py`` with ``concurrency`` closed-
+loop clients, each sending its next request as soon as the previous one
+returns. Requests are drawn from a weighted mix of operations (lead creates,
+visits, status updates, list/get/lookup/visit-range reads). Each run reports
+requests/sec and p50/p95/p99 latency, overall and per operation.
+
+Two transports:
+
+- ``asgi`` calls the app in-process through ``httpx.ASGITransport``. There
+  is no socket or HTTP parser in the path, so it measures handler, storage
+  and logging cost.
+- ``uvicorn`` starts ``mock_crm:app`` under uvicorn in a subprocess and
+  benchmarks it over real HTTP. ``--url`` targets a server that is already
+  running.
+
+The server runs in a fresh working directory (CSV logs, snapshot, SQLite
+file), so runs start from an empty store. Results are appended as JSON lines
+to ``--results``. Each run is compared with the last stored run with the same
+transport, storage, mix and concurrency, so regressions show up between
+commits.
+
+    python crm_bench.py --transport asgi --concurrency 1,8,32 --mix default
+    python crm_bench.py --transport uvicorn --storage sqlite --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent
+RESULTS_PATH = os.getenv("CRM_BENCH_RESULTS", "crm_bench_results.jsonl")
+
+# Relative weights per operation
+MIXES = {
+    "default": {"create": 3, "visit": 2, "status": 2, "list": 2, "get": 1},
+    "write": {"create": 4, "visit": 3, "status": 3},
+    "read": {"list": 4, "get": 4, "lookup": 2},
+    "create": {"create": 1},
+}
+
+CITIES = ("Pune", "Mumbai", "Gurgaon", "Bengaluru", "Chennai", "Hyderabad")
+SOURCES = ("Website", "Instagram", "Referral", "Walk-in")
+STATUSES = ("IN_PROGRESS", "FOLLOW_UP", "WON", "LOST")
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """A named mix, or ``op=weight`` pairs like ``create=3,list=1``"""
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation {op!r}; expected one of {', '.join(OPERATIONS)}")
+        try:
+            mix[op] = int(weight or 1)
+        except ValueError:
+            raise ValueError(f"Bad weight for {op!r}: {weight!r}") from None
+    if not any(mix.values()):
+        raise ValueError(f"Empty mix: {spec!r}")
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(seconds: List[float]) -> dict:
+    values = sorted(seconds)
+    out = {}
+    for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        value = percentile(values, q)
+        out[name] = None if value is None else round(value * 1000, 2)
+    out["mean_ms"] = round(sum(values) / len(values) * 1000, 2) if values else None
+    out["max_ms"] = round(values[-1] * 1000, 2) if values else None
+    return out
+
+
+class LoadState:
+    """Leads created so far, for the operations that need an existing lead"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.leads: List[str] = []
+        self.phones: List[str] = []
+        self.visit_day = datetime(2026, 1, 5, 9, 0)
+        self.visits = 0
+
+    def new_lead(self) -> dict:
+        phone = f"9{self.rng.randrange(10**9):09d}"
+        return {
+            "name": f"Bench Lead {len(self.leads)}",
+            "phone": phone,
+            "city": self.rng.choice(CITIES),
+            "source": self.rng.choice(SOURCES),
+        }
+
+    def add_lead(self, lead_id: str, phone: str):
+        self.leads.append(lead_id)
+        self.phones.append(phone)
+
+    def some_lead(self) -> str:
+        return self.rng.choice(self.leads)
+
+
+async def op_create(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    payload = state.new_lead()
+    response = await client.post("/crm/leads", json=payload)
+    if response.status_code == 200:
+        state.add_lead(response.json()["lead_id"], payload["phone"])
+    return response
+
+
+async def op_visit(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    # A day apart, so no visit overlaps an earlier one (CRM_VISIT_SLOT_MINUTES)
+    state.visits += 1
+    visit_time = state.visit_day + timedelta(days=state.visits)
+    payload = {"lead_id": state.some_lead(), "visit_time": visit_time.isoformat(), "notes": "bench"}
+    return await client.post("/crm/visits", json=payload)
+
+
+async def op_status(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    payload = {"status": state.rng.choice(STATUSES), "notes": "bench"}
+    return await client.post(f"/crm/leads/{state.some_lead()}/status", json=payload)
+
+
+async def op_list(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    params = {"limit": 50}
+    if state.rng.random() < 0.5:
+        params["city"] = state.rng.choice(CITIES)
+    return await client.get("/crm/leads", params=params)
+
+
+async def op_get(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get(f"/crm/leads/{state.some_lead()}")
+
+
+async def op_lookup(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get("/crm/leads/lookup", params={"phone": state.rng.choice(state.phones)})
+
+
+async def op_range(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    start = state.visit_day + timedelta(days=state.rng.randrange(max(state.visits, 1)))
+    params = {"start": start.isoformat(), "end": (start + timedelta(days=7)).isoformat(), "limit": 50}
+    return await client.get("/crm/visits/range", params=params)
+
+
+OPERATIONS = {
+    "create": op_create,
+    "visit": op_visit,
+    "status": op_status,
+    "list": op_list,
+    "get": op_get,
+    "lookup": op_lookup,
+    "range": op_range,
+}
+
+
+async def seed_leads(client: httpx.AsyncClient, state: LoadState, count: int):
+    """Create ``count`` leads (unmeasured) for visit/status/get/lookup to use"""
+    for _ in range(count):
+        response = await op_create(client, state)
+        response.raise_for_status()
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    state: LoadState,
+    mix: Dict[str, int],
+    concurrency: int,
+    requests: int,
+    duration: Optional[float] = None,
+) -> dict:
+    """``requests`` requests (or ``duration`` seconds) from ``concurrency`` clients"""
+    ops = [op for op, weight in mix.items() if weight > 0]
+    weights = [mix[op] for op in ops]
+    samples: Dict[str, List[float]] = {op: [] for op in ops}
+    errors: Dict[str, int] = {op: 0 for op in ops}
+    issued = 0
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    async def worker():
+        nonlocal issued
+        while issued < requests and (deadline is None or time.perf_counter() < deadline):
+            issued += 1
+            op = state.rng.choices(ops, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                response = await OPERATIONS[op](client, state)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            samples[op].append(time.perf_counter() - t0)
+            if not ok:
+                errors[op] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(s) for s in samples.values())
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else None,
+        "errors": sum(errors.values()),
+        "latency": latency_summary([x for s in samples.values() for x in s]),
+        "ops": {
+            op: {"count": len(samples[op]), "errors": errors[op], **latency_summary(samples[op])}
+            for op in ops
+        },
+    }
+
+
+@asynccontextmanager
+async def asgi_client():
+    """The app called in-process; the current directory is the server's workdir"""
+    from event_log import setup_event_log
+
+    # Keep the per-request events (their cost is part of what we measure) off the console
+    setup_event_log(stream=open("crm_events.log", "a", encoding="utf-8"))
+    import mock_crm
+
+    async with mock_crm.app.router.lifespan_context(mock_crm.app):
+        transport = httpx.ASGITransport(app=mock_crm.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://crm") as client:
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, process=None, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"CRM server exited with code {process.returncode}")
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("CRM server did not start")
+        await asyncio.sleep(0.1)
+
+
+@asynccontextmanager
+async def http_client(max_connections: int, url: Optional[str] = None):
+    """Real HTTP: ``url`` if given, else uvicorn in a subprocess in the current directory"""
+    process = None
+    if url is None:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "--app-dir", str(REPO_DIR), "mock_crm:app",
+                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+            ],
+            stdout=open("crm_server.log", "a"),
+            stderr=subprocess.STDOUT,
+        )
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+            await _wait_until_ready(client, process)
+            yield client
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _comparable(a: dict, b: dict) -> bool:
+    keys = ("transport", "storage", "mix", "concurrency")
+    return all(a.get(k) == b.get(k) for k in keys)
+
+
+def load_results(path) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(result: dict, previous: List[dict]) -> Optional[dict]:
+    """Change against the last comparable stored run, in percent"""
+    for old in reversed(previous):
+        if _comparable(result, old):
+            def change(new, before):
+                if new is None or not before:
+                    return None
+                return round((new - before) / before * 100, 1)
+
+            return {
+                "against": old.get("label") or old.get("commit") or old.get("timestamp"),
+                "rps_pct": change(result["rps"], old["rps"]),
+                "p99_pct": change(result["latency"]["p99_ms"], old["latency"]["p99_ms"]),
+            }
+    return None
+
+
+async def benchmark(
+    transport: str = "asgi",
+    concurrency: List[int] = (1, 8, 32),
+    mix: str = "default",
+    requests: int = 2000,
+    duration: Optional[float] = None,
+    seed_count: int = 200,
+    seed: int = 1,
+    url: Optional[str] = None,
+    label: Optional[str] = None,
+    results_path=None,
+) -> List[dict]:
+    """Run one benchmark per concurrency level against a single server instance"""
+    weights = parse_mix(mix)
+    results_path = results_path or RESULTS_PATH
+    previous = load_results(results_path)
+    if transport == "asgi":
+        client_context = asgi_client()
+    elif transport == "uvicorn":
+        client_context = http_client(max(concurrency), url)
+    else:
+        raise ValueError(f"Unknown transport: {transport}")
+
+    common = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "label": label,
+        "transport": transport if url is None else "http",
+        "storage": os.getenv("CRM_STORAGE", "memory"),
+        "event_log": {
+            "level": os.getenv("EVENT_LOG_LEVEL", "INFO"),
+            "sample_rate": os.getenv("EVENT_LOG_SAMPLE_RATE", "1.0"),
+        },
+        "mix": mix,
+        "weights": weights,
+    }
+    results = []
+    async with client_context as client:
+        state = LoadState(seed)
+        await seed_leads(client, state, seed_count)
+        for level in concurrency:
+            run = await run_load(client, state, weights, level, requests, duration)
+            result = {**common, **run}
+            result["change"] = compare(result, previous)
+            results.append(result)
+
+    with open(results_path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    return results
+
+
+def format_report(results: List[dict]) -> str:
+    lines = [
+        f"{'conc':>5} {'requests':>9} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'errors':>7}  vs previous"
+    ]
+    for r in results:
+        lat = r["latency"]
+        change = r.get("change")
+        versus = (
+            f"rps {change['rps_pct']:+}% p99 {change['p99_pct']:+}% ({change['against']})"
+            if change and change["rps_pct"] is not None and change["p99_pct"] is not None
+            else "-"
+        )
+        lines.append(
+            f"{r['concurrency']:>5} {r['requests']:>9} {r['rps']:>9} {lat['p50_ms']:>8} "
+            f"{lat['p95_ms']:>8} {lat['p99_ms']:>8} {r['errors']:>7}  {versus}"
+        )
+        for op, stats in r["ops"].items():
+            lines.append(
+                f"{'':>5} {op:>9} {stats['count']:>9} {stats['p50_ms']:>8} "
+                f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['errors']:>7}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the mock CRM API")
+    parser.add_argument("--transport", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--mix", default="default", help=f"{'|'.join(MIXES)} or op=weight,...")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--duration", type=float, help="stop each level after this many seconds")
+    parser.add_argument("--seed-leads", type=int, default=200, help="leads created before measuring")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the traffic mix")
+    parser.add_argument("--storage", help="CRM_STORAGE for the server (memory|sqlite|postgres)")
+    parser.add_argument("--workdir", help="server working directory (default: a fresh temp dir)")
+    parser.add_argument("--label", help="name for this run in the results file")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file results are appended to")
+    parser.add_argument(
+        "--max-regression", type=float,
+        help="exit 1 if rps drops by more than this percent against the previous run",
+    )
+    args = parser.parse_args(argv)
+
+    if args.url:
+        args.transport = "uvicorn"
+    if args.storage:
+        os.environ["CRM_STORAGE"] = args.storage
+    try:
+        concurrency = [int(c) for c in args.concurrency.split(",")]
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results_path = os.path.abspath(args.results)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="crm-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    results = asyncio.run(benchmark(
+        transport=args.transport,
+        concurrency=concurrency,
+        mix=args.mix,
+        requests=args.requests,
+        duration=args.duration,
+        seed_count=args.seed_leads,
+        seed=args.seed,
+        url=args.url,
+        label=args.label,
+        results_path=results_path,
+    ))
+    print(format_report(results))
+    print(f"\nResults appended to {results_path} (server files in {workdir})")
+
+    if args.max_regression is not None:
+        for r in results:
+            change = r.get("change") or {}
+            if change.get("rps_pct") is not None and change["rps_pct"] < -args.max_regression:
+                print(f"Regression: rps {change['rps_pct']}% at concurrency {r['concurrency']}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
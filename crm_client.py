@@ -0,0 +1,318 @@
+import os
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import httpx
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_random_exponential,
+)
+
+from event_log import WARNING, log_event
+
+CRM_BASE_URL = os.getenv("CRM_BASE_URL", "http://localhost:8001")
+
+# Connection pool settings (override via environment)
+CRM_TIMEOUT = float(os.getenv("CRM_TIMEOUT", "5"))
+CRM_CONNECT_TIMEOUT = float(os.getenv("CRM_CONNECT_TIMEOUT", "2"))
+CRM_MAX_CONNECTIONS = int(os.getenv("CRM_MAX_CONNECTIONS", "20"))
+CRM_MAX_KEEPALIVE = int(os.getenv("CRM_MAX_KEEPALIVE", "10"))
+CRM_KEEPALIVE_EXPIRY = float(os.getenv("CRM_KEEPALIVE_EXPIRY", "30"))
+
+# Retries (keyed writes and requests that never reached the CRM) and circuit breaker
+CRM_RETRY_ATTEMPTS = int(os.getenv("CRM_RETRY_ATTEMPTS", "3"))
+CRM_RETRY_BACKOFF = float(os.getenv("CRM_RETRY_BACKOFF", "0.1"))
+CRM_RETRY_BACKOFF_MAX = float(os.getenv("CRM_RETRY_BACKOFF_MAX", "1"))
+CRM_BREAKER_THRESHOLD = int(os.getenv("CRM_BREAKER_THRESHOLD", "5"))
+CRM_BREAKER_RESET = float(os.getenv("CRM_BREAKER_RESET", "10"))
+
+# Absolute time.monotonic() deadline for the CRM calls of the current task
+_deadline: ContextVar[Optional[float]] = ContextVar("crm_deadline", default=None)
+
+
+@contextmanager
+def latency_budget(seconds: float):
+    """Bound every CRM call (retries and backoff included) made inside the block
+
+    The deadline lives in a context variable, so tasks created inside the
+    block (e.g. by ``asyncio.wait_for``) inherit it.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class CRMError(Exception):
+    """Raised when the CRM answers with a non-200 status"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(text)
+        self.status_code = status_code
+        self.text = text
+
+
+class CircuitOpenError(CRMError):
+    """Raised without calling the CRM while the circuit breaker is open"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(503, f"CRM unavailable (circuit open, retrying in {retry_in:.1f}s)")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fails CRM calls fast after repeated failures instead of waiting on timeouts.
+
+    Closed: calls go through; ``failure_threshold`` consecutive failures
+    (transport errors, timeouts, 5xx/429) open the circuit. Open: calls raise
+    ``CircuitOpenError`` immediately for ``reset_timeout`` seconds. Half-open:
+    one trial call is let through; success closes the circuit, failure opens
+    it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CRM_BREAKER_THRESHOLD,
+        reset_timeout: float = CRM_BREAKER_RESET,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        # Counters for monitoring
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the CRM now"""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._trial_in_flight):
+            self.rejected += 1
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+            raise CircuitOpenError(retry_in)
+        if state == self.HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        if self._state != self.CLOSED:
+            self._state = self.CLOSED
+            log_event("crm.circuit_closed")
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+            log_event(
+                "crm.circuit_opened", WARNING,
+                failures=self.consecutive_failures, reset_in=self.reset_timeout,
+            )
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+def _transient(e: BaseException) -> bool:
+    """Worth retrying a keyed (idempotent) write: the CRM may not have applied it"""
+    if isinstance(e, CircuitOpenError):
+        return False
+    if isinstance(e, CRMError):
+        return e.status_code >= 500 or e.status_code == 429
+    return isinstance(e, httpx.TransportError)
+
+
+def _not_sent(e: BaseException) -> bool:
+    """Safe to retry any request: it never reached the CRM"""
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+class AsyncCRMClient:
+    """Async CRM client backed by a persistent keep-alive connection pool.
+
+    The underlying ``httpx.AsyncClient`` is created lazily on first use so the
+    client can be constructed at import time and shared by every caller on
+    the event loop. Connections are reused over HTTP/1.1 until they sit idle
+    for longer than ``keepalive_expiry`` seconds.
+
+    Calls carrying an idempotency key are retried on transient failures with
+    jittered exponential backoff; other calls are only retried when the
+    request never reached the CRM. Retries stop at ``retry_attempts`` or at
+    the ``latency_budget`` deadline, whichever comes first, and every call
+    goes through a ``CircuitBreaker``.
+    """
+
+    def __init__(
+        self,
+        base_url: str = CRM_BASE_URL,
+        timeout: float = CRM_TIMEOUT,
+        connect_timeout: float = CRM_CONNECT_TIMEOUT,
+        max_connections: int = CRM_MAX_CONNECTIONS,
+        max_keepalive: int = CRM_MAX_KEEPALIVE,
+        keepalive_expiry: float = CRM_KEEPALIVE_EXPIRY,
+        retry_attempts: int = CRM_RETRY_ATTEMPTS,
+        retry_backoff: float = CRM_RETRY_BACKOFF,
+        retry_backoff_max: float = CRM_RETRY_BACKOFF_MAX,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.timeout_seconds = timeout
+        self.connect_timeout = connect_timeout
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lock = asyncio.Lock()
+
+        # Counters for monitoring
+        self.retries = 0
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            async with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.AsyncClient(
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        limits=self.limits,
+                        http1=True,
+                        http2=False,
+                        transport=self.transport,
+                    )
+        return self._client
+
+    async def post(self, path: str, payload: dict, idempotency_key: Optional[str] = None) -> dict:
+        """POST a JSON payload and return the decoded JSON response
+
+        With ``idempotency_key`` the CRM applies the write at most once; a
+        repeat of the same key returns the first response.
+        """
+        client = await self._get_client()
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        deadline = _deadline.get()
+
+        stop = stop_after_attempt(self.retry_attempts)
+        if deadline is not None:
+            # Don't start a backoff sleep that would end past the deadline
+            stop = stop | stop_before_delay(max(0.0, deadline - time.monotonic()))
+
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(_transient if idempotency_key else _not_sent),
+            stop=stop,
+            wait=wait_random_exponential(multiplier=self.retry_backoff, max=self.retry_backoff_max),
+            before_sleep=self._before_retry,
+            reraise=True,
+        ):
+            with attempt:
+                return await self._send(client, path, payload, headers, deadline)
+
+    async def _send(self, client, path, payload, headers, deadline) -> dict:
+        """One attempt, through the circuit breaker and within the deadline"""
+        self.breaker.before_call()
+        timeout = self.timeout
+        if deadline is not None:
+            remaining = max(0.001, deadline - time.monotonic())
+            timeout = httpx.Timeout(
+                min(self.timeout_seconds, remaining), connect=min(self.connect_timeout, remaining)
+            )
+        try:
+            response = await client.post(path, json=payload, headers=headers, timeout=timeout)
+        except (httpx.TransportError, asyncio.CancelledError):
+            # Cancellation here means the caller's deadline hit a slow CRM
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code != 200:
+            raise CRMError(response.status_code, response.text)
+        return response.json()
+
+    def _before_retry(self, retry_state):
+        self.retries += 1
+        log_event(
+            "crm.retry", WARNING,
+            attempt=retry_state.attempt_number,
+            error=repr(retry_state.outcome.exception()),
+            sleep=round(retry_state.next_action.sleep, 3),
+        )
+
+    def stats(self) -> dict:
+        """Retry and circuit breaker state for monitoring"""
+        return {"retries": self.retries, "breaker": self.breaker.snapshot()}
+
+    async def create_lead(self, payload: dict, idempotency_key: Optional[str] = None) -> dict:
+        return await self.post("/crm/leads", payload, idempotency_key)
+
+    async def schedule_visit(self, payload: dict, idempotency_key: Optional[str] = None) -> dict:
+        return await self.post("/crm/visits", payload, idempotency_key)
+
+    async def update_lead_status(
+        self, lead_id: str, payload: dict, idempotency_key: Optional[str] = None
+    ) -> dict:
+        return await self.post(f"/crm/leads/{lead_id}/status", payload, idempotency_key)
+
+    # Batch endpoints: one request, one result per item (in order)
+
+    async def create_leads(self, payloads: list, idempotency_key: Optional[str] = None) -> list:
+        response = await self.post("/crm/leads/batch", {"leads": payloads}, idempotency_key)
+        return response["results"]
+
+    async def schedule_visits(self, payloads: list, idempotency_key: Optional[str] = None) -> list:
+        response = await self.post("/crm/visits/batch", {"visits": payloads}, idempotency_key)
+        return response["results"]
+
+    async def update_lead_statuses(
+        self, updates: list, idempotency_key: Optional[str] = None
+    ) -> list:
+        """``updates`` are status payloads that also carry their ``lead_id``"""
+        response = await self.post(
+            "/crm/leads/status/batch", {"updates": updates}, idempotency_key
+        )
+        return response["results"]
+
+    async def aclose(self):
+        """Close all pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,575 @@
+"""
+Compact in-memory storage engine for millions of leads
+
+MemoryStorage keeps every lead as a dict of separate Python strings plus
+index entries, several hundred bytes per lead. CompactStorage holds the same
+data column by column:
+
+- lead and visit ids as 16 raw UUID bytes in one bytearray
+- status, city and source as integer codes into a table of interned values
+- created_at and visit_time as 64-bit microsecond counts
+- version, codes and index buckets in ``array`` columns instead of lists of ints
+- notes only for the records that have them
+
+Reads decode a record into the same dict MemoryStorage returns, so the API
+responses do not change. Ids that are not canonical UUID strings and
+timestamps that would not round-trip are also kept as given, in side tables.
+Visits at the same instant are ordered by id bytes, which for UUID ids is
+visit_id order as in the other engines.
+Selected with CRM_STORAGE=compact; snapshots and log replay work as for the
+memory engine.
+"""
+
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from uuid import UUID
+
+from crm_storage import (
+    LEAD_COLUMNS,
+    LEAD_FILTERS,
+    VISIT_FILTERS,
+    CRMStorage,
+    VersionConflict,
+    _check_filters,
+    _visit_ts,
+    normalize_phone,
+)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# visit_time offset meaning "naive datetime"
+_NAIVE = -(2 ** 31)
+# Rows exported per store lock hold while taking a snapshot
+EXPORT_CHUNK = 10000
+
+
+def _id_key(record_id) -> bytes:
+    """16 bytes naming an id: the UUID itself, or an MD5 digest of anything else
+
+    For canonical UUID strings byte order is string order.
+    """
+    try:
+        parsed = UUID(record_id)
+    except (ValueError, TypeError, AttributeError):
+        parsed = None
+    if parsed is not None and str(parsed) == record_id:
+        return parsed.bytes
+    return hashlib.md5(str(record_id).encode()).digest()
+
+
+def _phone_key(phone: str):
+    """Normalized phone as an int (half the size of the string) when lossless"""
+    digits = normalize_phone(phone)
+    return int(digits) if digits and digits[0] != "0" else digits
+
+
+def _unpack_timestamp(micros: int) -> str:
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def _pack_timestamp(text) -> Optional[int]:
+    """Microseconds for a naive ISO timestamp, or None if it would not round-trip"""
+    try:
+        parsed = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        return None
+    micros = (parsed - _EPOCH) // _MICROSECOND
+    return micros if _unpack_timestamp(micros) == text else None
+
+
+def _pack_visit_time(visit_time) -> Tuple[int, int]:
+    """(wall clock microseconds, UTC offset seconds or _NAIVE)"""
+    if isinstance(visit_time, str):
+        visit_time = datetime.fromisoformat(visit_time)
+    offset = visit_time.utcoffset()
+    micros = (visit_time.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+    return micros, _NAIVE if offset is None else int(offset.total_seconds())
+
+
+def _unpack_visit_time(micros: int, offset: int) -> datetime:
+    wall = _EPOCH + timedelta(microseconds=micros)
+    if offset == _NAIVE:
+        return wall
+    return wall.replace(tzinfo=timezone(timedelta(seconds=offset)))
+
+
+class _Ids:
+    """Id column: the 16-byte _id_key() of each id; non-UUID ids also kept as strings"""
+
+    def __init__(self):
+        self.raw = bytearray()
+        self.other = {}
+
+    def __len__(self):
+        return len(self.raw) // 16
+
+    def append(self, record_id: str) -> bytes:
+        key = _id_key(record_id)
+        if str(UUID(bytes=key)) != record_id:
+            self.other[len(self)] = record_id
+        self.raw += key
+        return key
+
+    def key(self, position: int) -> bytes:
+        return bytes(self.raw[position * 16:position * 16 + 16])
+
+    def __getitem__(self, position: int) -> str:
+        other = self.other.get(position)
+        if other is not None:
+            return other
+        return str(UUID(bytes=self.key(position)))
+
+
+class _Timestamps:
+    """created_at column: microseconds, odd strings kept as they are"""
+
+    def __init__(self):
+        self.micros = array("q")
+        self.other = {}
+
+    def append(self, text: str) -> None:
+        micros = _pack_timestamp(text)
+        if micros is None:
+            self.other[len(self.micros)] = text
+            micros = 0
+        self.micros.append(micros)
+
+    def __getitem__(self, position: int) -> str:
+        other = self.other.get(position)
+        if other is not None:
+            return other
+        return _unpack_timestamp(self.micros[position])
+
+
+class _Codes:
+    """Interned values of a low-cardinality field and their integer codes"""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Records(Mapping):
+    """Read-only id -> record dict view, like MemoryStorage.leads/visits"""
+
+    def __init__(self, positions: dict, ids: _Ids, decode):
+        self._positions = positions
+        self._ids = ids
+        self._decode = decode
+
+    def __getitem__(self, record_id):
+        position = self._positions.get(_id_key(record_id))
+        if position is None:
+            raise KeyError(record_id)
+        return self._decode(position)
+
+    def __iter__(self):
+        return (self._ids[position] for position in range(len(self._ids)))
+
+    def __len__(self):
+        return len(self._positions)
+
+
+def _page(positions, after, limit, matches, decode):
+    """Walk sorted ``positions`` from cursor ``after`` collecting matches"""
+    page = []
+    start = bisect_left(positions, after)
+    end = len(positions)
+    for i in range(start, end):
+        position = positions[i]
+        if matches(position):
+            page.append(decode(position))
+            if limit is not None and len(page) >= limit:
+                return page, (position + 1 if i + 1 < end else None)
+    return page, None
+
+
+class CompactStorage(CRMStorage):
+    """Leads and visits in columnar arrays; same behavior as MemoryStorage
+
+    A record's position (creation order) indexes every column and is its
+    pagination cursor, as in MemoryStorage. One store-wide lock covers reads
+    and writes; each holds it only for a few array reads or writes.
+    """
+
+    name = "compact"
+    in_memory = True
+
+    LEAD_INDEXES = ("status", "city", "source")
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Lead columns
+        self._lead_ids = _Ids()
+        self._names = []
+        self._phones = []
+        self._codes = {field: _Codes() for field in self.LEAD_INDEXES}
+        self._fields = {field: array("I") for field in self.LEAD_INDEXES}
+        self._lead_notes = {}
+        self._lead_created = _Timestamps()
+        self._versions = array("I")
+        # Visit columns
+        self._visit_ids = _Ids()
+        self._visit_leads = _Ids()
+        self._visit_wall = array("q")
+        self._visit_offsets = array("i")
+        self._visit_ts = array("d")
+        self._visit_notes = {}
+        self._visit_status_codes = _Codes()
+        self._visit_status = array("I")
+        self._visit_created = _Timestamps()
+        # Indexes: id key -> position, phone key -> position(s),
+        # field code -> sorted positions, and visit positions sorted by
+        # (visit_ts, visit_id), overall and per lead
+        self._lead_positions = {}
+        self._visit_positions = {}
+        self._by_phone = {}
+        self._by_field = {field: {} for field in self.LEAD_INDEXES}
+        self._visits_by_time = array("I")
+        self._visit_times_by_lead = {}
+        self.leads = _Records(self._lead_positions, self._lead_ids, self._lead)
+        self.visits = _Records(self._visit_positions, self._visit_ids, self._visit)
+
+    # Records
+
+    def _lead(self, position: int) -> dict:
+        lead = {
+            "name": self._names[position],
+            "phone": self._phones[position],
+            "city": self._codes["city"].values[self._fields["city"][position]],
+            "source": self._codes["source"].values[self._fields["source"][position]],
+            "lead_id": self._lead_ids[position],
+            "status": self._codes["status"].values[self._fields["status"][position]],
+            "created_at": self._lead_created[position],
+            "version": self._versions[position],
+        }
+        notes = self._lead_notes.get(position)
+        if notes:
+            lead["notes"] = notes
+        return lead
+
+    def _visit(self, position: int) -> dict:
+        return {
+            "lead_id": self._visit_leads[position],
+            "visit_time": _unpack_visit_time(self._visit_wall[position], self._visit_offsets[position]),
+            "notes": self._visit_notes.get(position),
+            "visit_id": self._visit_ids[position],
+            "status": self._visit_status_codes.values[self._visit_status[position]],
+            "created_at": self._visit_created[position],
+        }
+
+    def _insert_lead(self, lead: dict) -> None:
+        lead.setdefault("version", 1)
+        position = len(self._names)
+        key = self._lead_ids.append(lead["lead_id"])
+        self._names.append(lead["name"])
+        self._phones.append(lead["phone"])
+        for field in self.LEAD_INDEXES:
+            code = self._codes[field].code(lead.get(field))
+            self._fields[field].append(code)
+            # Positions only grow, so appending keeps every bucket sorted
+            self._by_field[field].setdefault(code, array("I")).append(position)
+        if lead.get("notes"):
+            self._lead_notes[position] = lead["notes"]
+        self._lead_created.append(lead["created_at"])
+        self._versions.append(lead["version"])
+        phone = _phone_key(lead["phone"])
+        existing = self._by_phone.get(phone)
+        if existing is None:
+            self._by_phone[phone] = position
+        elif isinstance(existing, int):
+            self._by_phone[phone] = array("I", (existing, position))
+        else:
+            existing.append(position)
+        # Registered last: readers only find complete records
+        self._lead_positions[key] = position
+
+    def _time_key(self, position: int) -> tuple:
+        """Sort key in the time indexes: (visit_ts, 16-byte visit id key)"""
+        return self._visit_ts[position], self._visit_ids.key(position)
+
+    def _insert_visit(self, visit: dict) -> None:
+        position = len(self._visit_ts)
+        key = self._visit_ids.append(visit["visit_id"])
+        lead_key = self._visit_leads.append(visit["lead_id"])
+        wall, offset = _pack_visit_time(visit["visit_time"])
+        self._visit_wall.append(wall)
+        self._visit_offsets.append(offset)
+        self._visit_ts.append(_visit_ts(visit["visit_time"]))
+        if visit.get("notes") is not None:
+            self._visit_notes[position] = visit["notes"]
+        self._visit_status.append(self._visit_status_codes.code(visit["status"]))
+        self._visit_created.append(visit["created_at"])
+        insort(self._visits_by_time, position, key=self._time_key)
+        by_lead = self._visit_times_by_lead.setdefault(lead_key, array("I"))
+        insort(by_lead, position, key=self._time_key)
+        self._visit_positions[key] = position
+
+    def _phone_positions(self, phone: str):
+        positions = self._by_phone.get(_phone_key(phone), ())
+        return (positions,) if isinstance(positions, int) else positions
+
+    # Leads
+
+    def add_lead(self, lead: dict) -> None:
+        with self._lock:
+            if _id_key(lead["lead_id"]) not in self._lead_positions:
+                self._insert_lead(lead)
+
+    def add_lead_unique(self, lead: dict) -> Tuple[dict, bool]:
+        with self._lock:
+            existing = self._phone_positions(lead["phone"])
+            if existing:
+                return self._lead(existing[0]), False
+            self._insert_lead(lead)
+            return lead, True
+
+    def add_leads(self, leads, unique=False):
+        with self._lock:
+            if unique:
+                return [self.add_lead_unique(lead) for lead in leads]
+            for lead in leads:
+                self.add_lead(lead)
+            return [(lead, True) for lead in leads]
+
+    def get_lead(self, lead_id: str) -> Optional[dict]:
+        with self._lock:
+            position = self._lead_positions.get(_id_key(lead_id))
+            return None if position is None else self._lead(position)
+
+    def find_leads_by_phone(self, phone: str) -> list:
+        with self._lock:
+            return [self._lead(position) for position in self._phone_positions(phone)]
+
+    def update_lead_status(self, lead_id, status, notes=None, expected_version=None):
+        with self._lock:
+            return self._update_lead_status(lead_id, status, notes, expected_version)
+
+    def update_lead_statuses(self, updates):
+        with self._lock:
+            return [self._update_lead_status(*update) for update in updates]
+
+    def _update_lead_status(self, lead_id, status, notes, expected_version=None, version=None):
+        """Caller holds the lock; ``version`` sets it instead of bumping it"""
+        position = self._lead_positions.get(_id_key(lead_id))
+        if position is None:
+            return None
+        current = self._versions[position]
+        if expected_version is not None and expected_version != current:
+            raise VersionConflict(lead_id, expected_version, current)
+        codes, column = self._codes["status"], self._fields["status"]
+        old_code, new_code = column[position], codes.code(status)
+        if new_code != old_code:
+            # Move the lead between status buckets, keeping both sorted
+            by_status = self._by_field["status"]
+            old_bucket = by_status.get(old_code)
+            if old_bucket:
+                i = bisect_left(old_bucket, position)
+                if i < len(old_bucket) and old_bucket[i] == position:
+                    del old_bucket[i]
+                if not old_bucket:
+                    del by_status[old_code]
+            insort(by_status.setdefault(new_code, array("I")), position)
+            column[position] = new_code
+        if notes:
+            self._lead_notes[position] = notes
+        self._versions[position] = current + 1 if version is None else version
+        return codes.values[old_code], self._lead(position)
+
+    def replay_lead_status(self, lead_id, status, notes, version: int) -> bool:
+        """Apply a logged update unless the lead is already at ``version`` or later"""
+        with self._lock:
+            position = self._lead_positions.get(_id_key(lead_id))
+            if position is None or self._versions[position] >= version:
+                return False
+            self._update_lead_status(lead_id, status, notes, version=version)
+            return True
+
+    def _lead_matches(self, position: int, filters: dict) -> bool:
+        for key, value in filters.items():
+            if key == "created_from":
+                if self._lead_created[position] < value:
+                    return False
+            elif key == "created_to":
+                if self._lead_created[position] >= value:
+                    return False
+            elif self._fields[key][position] != self._codes[key].codes.get(value, -1):
+                return False
+        return True
+
+    def list_leads(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, LEAD_FILTERS)
+        with self._lock:
+            # Walk the smallest index bucket among the equality filters
+            positions = range(len(self._names))
+            for field in self.LEAD_INDEXES:
+                if field in filters:
+                    code = self._codes[field].codes.get(filters[field])
+                    bucket = self._by_field[field].get(code, ())
+                    if len(bucket) < len(positions):
+                        positions = bucket
+            return _page(
+                positions, after, limit,
+                lambda position: self._lead_matches(position, filters), self._lead,
+            )
+
+    # Visits
+
+    def add_visit(self, visit: dict) -> None:
+        with self._lock:
+            if _id_key(visit["visit_id"]) not in self._visit_positions:
+                self._insert_visit(visit)
+
+    def add_visits(self, visits):
+        with self._lock:
+            results = []
+            for visit in visits:
+                exists = _id_key(visit["lead_id"]) in self._lead_positions
+                if exists:
+                    self.add_visit(visit)
+                results.append(exists)
+            return results
+
+    def _overlapping(self, lead_id, visit_ts, slot_seconds):
+        """The lead's visits starting less than ``slot_seconds`` from ``visit_ts``"""
+        times = self._visit_times_by_lead.get(_id_key(lead_id), ())
+        i = bisect_left(times, visit_ts - slot_seconds, key=self._visit_ts.__getitem__)
+        found = []
+        while i < len(times) and self._visit_ts[times[i]] < visit_ts + slot_seconds:
+            if self._visit_ts[times[i]] > visit_ts - slot_seconds:
+                found.append(self._visit(times[i]))
+            i += 1
+        return found
+
+    def schedule_visits(self, visits, slot_seconds=0):
+        with self._lock:
+            results = []
+            for visit in visits:
+                if _id_key(visit["lead_id"]) not in self._lead_positions:
+                    results.append(None)
+                    continue
+                overlapping = []
+                if slot_seconds > 0:
+                    overlapping = self._overlapping(
+                        visit["lead_id"], _visit_ts(visit["visit_time"]), slot_seconds
+                    )
+                if not overlapping:
+                    self.add_visit(visit)
+                results.append(overlapping)
+            return results
+
+    def visits_between(self, start, end, lead_id=None, after=None, limit=None):
+        with self._lock:
+            if lead_id is None:
+                keys = self._visits_by_time
+            else:
+                keys = self._visit_times_by_lead.get(_id_key(lead_id), ())
+            by_ts = self._visit_ts.__getitem__
+            lo = bisect_left(keys, start, key=by_ts)
+            if after is not None:
+                after_ts, after_id = after
+                lo = max(lo, bisect_right(keys, (after_ts, _id_key(after_id)), key=self._time_key))
+            hi = bisect_left(keys, end, key=by_ts)
+            stop = hi if limit is None else min(hi, lo + limit)
+            page = [self._visit(position) for position in keys[lo:stop]]
+            if stop < hi:
+                return page, (self._visit_ts[keys[stop - 1]], self._visit_ids[keys[stop - 1]])
+            return page, None
+
+    def _visit_matches(self, position: int, filters: dict) -> bool:
+        for key, value in filters.items():
+            if key == "created_from":
+                if self._visit_created[position] < value:
+                    return False
+            elif key == "created_to":
+                if self._visit_created[position] >= value:
+                    return False
+            elif key == "status":
+                if self._visit_status[position] != self._visit_status_codes.codes.get(value, -1):
+                    return False
+            elif key == "lead_id":
+                if self._visit_leads[position] != value:
+                    return False
+        return True
+
+    def list_visits(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, VISIT_FILTERS)
+        with self._lock:
+            if "lead_id" in filters:
+                # A lead has few visits: sort its time index into creation order
+                positions = sorted(self._visit_times_by_lead.get(_id_key(filters["lead_id"]), ()))
+            else:
+                positions = range(len(self._visit_ts))
+            return _page(
+                positions, after, limit,
+                lambda position: self._visit_matches(position, filters), self._visit,
+            )
+
+    # Snapshots (same row format as MemoryStorage)
+
+    def export_rows(self) -> Tuple[list, list]:
+        """Leads and visits as flat rows in LEAD_COLUMNS/VISIT_COLUMNS order"""
+        # A chunk at a time, so requests are not held up for the whole export
+        leads, visits = [], []
+        for start in range(0, len(self._names), EXPORT_CHUNK):
+            with self._lock:
+                for position in range(start, min(start + EXPORT_CHUNK, len(self._names))):
+                    lead = self._lead(position)
+                    leads.append([lead.get(column) for column in LEAD_COLUMNS])
+        for start in range(0, len(self._visit_ts), EXPORT_CHUNK):
+            with self._lock:
+                for position in range(start, min(start + EXPORT_CHUNK, len(self._visit_ts))):
+                    visit = self._visit(position)
+                    visits.append([
+                        visit["visit_id"],
+                        visit["lead_id"],
+                        visit["visit_time"].isoformat(),
+                        visit["notes"],
+                        visit["status"],
+                        visit["created_at"],
+                    ])
+        return leads, visits
+
+    def import_rows(self, lead_rows, visit_rows) -> None:
+        """Load rows shaped like export_rows(); records already present win"""
+        with self._lock:
+            # Rows from before versions existed have no version column
+            for lead_id, name, phone, city, source, status, notes, created_at, *version in lead_rows:
+                if _id_key(lead_id) in self._lead_positions:
+                    continue
+                self._insert_lead({
+                    "name": name,
+                    "phone": phone,
+                    "city": city,
+                    "source": source,
+                    "lead_id": lead_id,
+                    "status": status,
+                    "created_at": created_at,
+                    "version": version[0] if version else 1,
+                    "notes": notes,
+                })
+            for visit_id, lead_id, visit_time, notes, status, created_at in visit_rows:
+                if _id_key(visit_id) in self._visit_positions:
+                    continue
+                self._insert_visit({
+                    "lead_id": lead_id,
+                    "visit_time": visit_time,
+                    "notes": notes,
+                    "visit_id": visit_id,
+                    "status": status,
+                    "created_at": created_at,
+                })
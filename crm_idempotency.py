@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Callable, Hashable, List, Optional, Tuple
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused with a different request body"""
+
+
+class IdempotencyCache:
+    """Bounded TTL cache of idempotency key -> response for the CRM write endpoints.
+
+    ``run(key, fingerprint, handler)`` calls ``handler`` the first time a key
+    is seen and stores its response; a repeat of the same key within ``ttl``
+    seconds gets the stored response back without calling ``handler`` again.
+    Concurrent requests with the same key are serialised so only one of them
+    does the write. Responses are only stored when ``handler`` returns, so a
+    failed request (e.g. 404) can be retried with the same key.
+
+    Every entry lives for the same ``ttl``, so insertion order is expiry order
+    and expired entries are trimmed from the front; past ``max_keys`` the
+    oldest entries are evicted early.
+    """
+
+    def __init__(self, max_keys: int = 100000, ttl: float = 600.0):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, fingerprint, response)
+        self._key_locks = {}  # key -> [Lock, number of requests using it]
+        self._lock = threading.Lock()
+
+        # Counters for monitoring
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def run(self, key: Hashable, fingerprint: str, handler: Callable) -> Tuple[object, bool]:
+        """Return ``(response, replayed)`` for ``key``, calling ``handler`` at most once"""
+        with self._lock:
+            cached = self._lookup(key, fingerprint)
+            if cached is not None:
+                return cached, True
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                # Another request with this key may have finished while we waited
+                with self._lock:
+                    cached = self._lookup(key, fingerprint)
+                if cached is not None:
+                    return cached, True
+
+                response = handler()
+
+                with self._lock:
+                    now = time.monotonic()
+                    self._entries[key] = (now + self.ttl, fingerprint, response)
+                    self._entries.move_to_end(key)
+                    self._evict(now)
+                    self.misses += 1
+                return response, False
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+    def run_many(
+        self,
+        keys: List[Optional[Hashable]],
+        fingerprints: List[str],
+        handler: Callable,
+        cacheable: Callable = lambda response: True,
+    ) -> List[Tuple[object, bool]]:
+        """``run()`` for a batch: one key per item (None for items without one)
+
+        ``handler(indices)`` is called once with the indices of the items
+        that have no stored response and returns their responses in order.
+        Only responses for which ``cacheable(response)`` is true are stored,
+        so a failed item can be retried with the same key. Item keys share
+        the cache with ``run()``, so a single request and a batch item with
+        the same key are applied at most once between them.
+        """
+        present = [key for key in keys if key is not None]
+        if len(set(present)) != len(present):
+            raise IdempotencyConflict("Idempotency keys within a batch must be unique")
+
+        with self._lock:
+            # Sorted, so batches sharing keys take their locks in the same order
+            key_locks = [
+                (key, self._key_locks.setdefault(key, [threading.Lock(), 0]))
+                for key in sorted(present)
+            ]
+            for _, key_lock in key_locks:
+                key_lock[1] += 1
+
+        try:
+            with ExitStack() as held:
+                for _, key_lock in key_locks:
+                    held.enter_context(key_lock[0])
+
+                results = [None] * len(keys)
+                misses = []
+                with self._lock:
+                    for i, (key, fingerprint) in enumerate(zip(keys, fingerprints)):
+                        cached = None if key is None else self._lookup(key, fingerprint)
+                        if cached is None:
+                            misses.append(i)
+                        else:
+                            results[i] = (cached, True)
+
+                responses = handler(misses) if misses else []
+
+                with self._lock:
+                    now = time.monotonic()
+                    for i, response in zip(misses, responses):
+                        results[i] = (response, False)
+                        if keys[i] is not None and cacheable(response):
+                            self._entries[keys[i]] = (now + self.ttl, fingerprints[i], response)
+                            self._entries.move_to_end(keys[i])
+                            self.misses += 1
+                    self._evict(now)
+                return results
+        finally:
+            with self._lock:
+                for key, key_lock in key_locks:
+                    key_lock[1] -= 1
+                    if key_lock[1] == 0:
+                        del self._key_locks[key]
+
+    def _lookup(self, key, fingerprint):
+        """Stored response for ``key`` or None (caller holds ``_lock``)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_fingerprint, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        self.hits += 1
+        return response
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
@@ -0,0 +1,138 @@
+"""
+Memory per lead for the in-memory storage engines
+
+Fills a fresh store with ``--leads`` leads shaped like the ones mock_crm.py
+creates (and ``--visits-per-lead`` visits each), then reports how many bytes
+the store holds per lead, as traced by tracemalloc after a full collection.
+Every engine is measured in its own subprocess, so one engine's garbage or
+allocator state does not count against the next.
+
+    python crm_memory_bench.py --leads 1000000
+    python crm_memory_bench.py --leads 100000 --visits-per-lead 1 --engines compact
+"""
+
+import argparse
+import gc
+import json
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from crm_storage import create_storage
+
+REPO_DIR = Path(__file__).resolve().parent
+ENGINES = ("memory", "compact")
+
+CITIES = ("Pune", "Mumbai", "Gurgaon", "Bengaluru", "Chennai", "Hyderabad")
+SOURCES = ("Website", "Instagram", "Referral", "Walk-in")
+
+
+def make_lead(rng: random.Random, i: int) -> dict:
+    # Request bodies are parsed per request, so every lead gets its own
+    # city/source string objects, as it would behind the API
+    return {
+        "name": f"Lead {i} {rng.choice(('Sharma', 'Iyer', 'Khan', 'Das'))}",
+        "phone": f"9{rng.randrange(10**9):09d}",
+        "city": rng.choice(CITIES).encode().decode(),
+        "source": rng.choice(SOURCES).encode().decode(),
+        "lead_id": str(uuid4()),
+        "status": "NEW",
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+def make_visit(rng: random.Random, lead_id: str, day: int) -> dict:
+    return {
+        "lead_id": lead_id,
+        "visit_time": datetime(2026, 1, 5, 10) + timedelta(days=day, hours=rng.randrange(8)),
+        "notes": None,
+        "visit_id": str(uuid4()),
+        "status": "SCHEDULED",
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+def measure(engine: str, leads: int, visits_per_lead: int = 0, seed: int = 1) -> dict:
+    """Build one store in this process and return its traced size"""
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    storage = create_storage(engine)
+    lead = None
+    for i in range(leads):
+        lead = make_lead(rng, i)
+        storage.add_lead(lead)
+        for day in range(visits_per_lead):
+            storage.add_visit(make_visit(rng, lead["lead_id"], day))
+    seconds = time.perf_counter() - started
+    del lead
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    storage.close()
+    return {
+        "engine": engine,
+        "leads": leads,
+        "visits": leads * visits_per_lead,
+        "bytes": size,
+        "bytes_per_lead": round(size / leads, 1) if leads else None,
+        "seconds": round(seconds, 2),
+    }
+
+
+def measure_in_subprocess(engine: str, leads: int, visits_per_lead: int, seed: int) -> dict:
+    out = subprocess.run(
+        [
+            sys.executable, str(Path(__file__).resolve()), "--child",
+            "--engines", engine, "--leads", str(leads),
+            "--visits-per-lead", str(visits_per_lead), "--seed", str(seed),
+        ],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def format_report(results: list) -> str:
+    lines = [f"{'engine':<10} {'leads':>10} {'visits':>10} {'MiB':>9} {'bytes/lead':>11} {'build s':>8}"]
+    for r in results:
+        lines.append(
+            f"{r['engine']:<10} {r['leads']:>10} {r['visits']:>10} "
+            f"{r['bytes'] / 2**20:>9.1f} {str(r['bytes_per_lead']):>11} {r['seconds']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--visits-per-lead", type=int, default=0)
+    parser.add_argument("--engines", default=",".join(ENGINES), help="comma-separated engines")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print one JSON line per engine")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    if args.child:
+        print(json.dumps(measure(engines[0], args.leads, args.visits_per_lead, args.seed)))
+        return
+
+    results = [
+        measure_in_subprocess(engine, args.leads, args.visits_per_lead, args.seed)
+        for engine in engines
+    ]
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+    else:
+        print(format_report(results))
+
+
+if __name__ == "__main__":
+    main()
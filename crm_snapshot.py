@@ -0,0 +1,183 @@
+"""
+Snapshot + log replay recovery for the in-memory CRM store
+
+A snapshot is a msgpack file holding every lead and visit plus the byte
+offset reached in each CSV log when it was taken. On startup the snapshot is
+loaded and only the CSV rows written after those offsets are replayed, so a
+restart does not have to re-parse the whole history.
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import msgpack
+
+from event_log import ERROR, WARNING, log_event
+
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class RecoveryStats:
+    leads: int = 0
+    visits: int = 0
+    replayed_rows: int = 0
+    from_snapshot: bool = False
+    seconds: float = 0.0
+
+
+def _csv_tail(path: str, offset: int):
+    """Yield the CSV rows of ``path`` that start at byte ``offset``"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+        if offset == 0:
+            next(reader, None)  # header row
+        yield from reader
+
+
+def write_snapshot(storage, csv_writer, snapshot_path: str, csv_paths: dict) -> int:
+    """Write a snapshot of ``storage``; returns the number of records saved
+
+    ``csv_paths`` maps "leads"/"visits"/"updates" to the CSV log files. The
+    writer is flushed and the log offsets recorded *before* the store is
+    copied, so any row past an offset may already be in the snapshot. Replay
+    is idempotent, so that overlap is harmless; the reverse (a record in the
+    log but in neither the snapshot nor the replayed tail) cannot happen.
+    """
+    csv_writer.flush()
+    offsets = {
+        name: os.path.getsize(path) if os.path.exists(path) else 0
+        for name, path in csv_paths.items()
+    }
+    leads, visits = storage.export_rows()
+
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        msgpack.pack(
+            {
+                "version": SNAPSHOT_VERSION,
+                "taken_at": time.time(),
+                "offsets": offsets,
+                "leads": leads,
+                "visits": visits,
+            },
+            f,
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, snapshot_path)
+    return len(leads) + len(visits)
+
+
+def _load_snapshot(snapshot_path: str) -> Optional[dict]:
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = msgpack.unpack(f, use_list=False)
+    except (OSError, ValueError, msgpack.UnpackException) as e:
+        log_event("storage.snapshot_unreadable", WARNING, path=snapshot_path, error=str(e))
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        log_event("storage.snapshot_version_unknown", WARNING, path=snapshot_path)
+        return None
+    return snapshot
+
+
+def recover(storage, snapshot_path: str, csv_paths: dict) -> RecoveryStats:
+    """Rebuild ``storage`` from the latest snapshot plus the CSV log tail"""
+    started = time.perf_counter()
+    stats = RecoveryStats()
+    offsets = {}
+
+    snapshot = _load_snapshot(snapshot_path)
+    if snapshot is not None:
+        storage.import_rows(snapshot["leads"], snapshot["visits"])
+        offsets = snapshot["offsets"]
+        stats.from_snapshot = True
+
+    def tail(name):
+        path = csv_paths[name]
+        offset = offsets.get(name, 0)
+        if os.path.exists(path) and os.path.getsize(path) < offset:
+            # The log was truncated or replaced after the snapshot
+            log_event("storage.log_truncated", WARNING, path=path, offset=offset)
+            offset = 0
+        return _csv_tail(path, offset)
+
+    # crm_leads.csv: lead_id,name,phone,city,source,status,created_at
+    # (rows of the wrong width are a torn last line from a crash and skipped)
+    lead_rows = [
+        (row[0], row[1], row[2], row[3], row[4] or None, row[5], None, row[6])
+        for row in tail("leads")
+        if len(row) == 7
+    ]
+    # crm_visits.csv: visit_id,lead_id,visit_time,notes,status,created_at
+    visit_rows = [
+        (row[0], row[1], row[2], row[3] or None, row[4], row[5])
+        for row in tail("visits")
+        if len(row) == 6
+    ]
+    storage.import_rows(lead_rows, visit_rows)
+    stats.replayed_rows = len(lead_rows) + len(visit_rows)
+
+    # crm_updates.csv: lead_id,old_status,new_status,notes,updated_at,version.
+    # Rows can be logged out of order when updates race, so a versioned row
+    # is applied only if it is newer than the lead; rows written before
+    # versions existed have 5 columns and are applied in log order.
+    for row in tail("updates"):
+        if len(row) == 6 and row[5].isdigit():
+            storage.replay_lead_status(row[0], row[2], row[3] or None, int(row[5]))
+        elif len(row) == 5:
+            storage.update_lead_status(row[0], row[2], row[3] or None)
+        else:
+            continue
+        stats.replayed_rows += 1
+
+    stats.leads = len(storage.leads)
+    stats.visits = len(storage.visits)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+class SnapshotScheduler:
+    """Takes a snapshot every ``interval`` seconds on a background thread"""
+
+    def __init__(self, storage, csv_writer, snapshot_path: str, csv_paths: dict, interval: float):
+        self.storage = storage
+        self.csv_writer = csv_writer
+        self.snapshot_path = snapshot_path
+        self.csv_paths = csv_paths
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="crm-snapshot", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> int:
+        return write_snapshot(self.storage, self.csv_writer, self.snapshot_path, self.csv_paths)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except OSError as e:
+                log_event("storage.snapshot_failed", ERROR, error=str(e))
@@ -0,0 +1,1082 @@
+"""
+Storage engines for the mock CRM
+
+Every engine stores leads and visits as plain dicts shaped exactly like the
+API responses, so the routes in mock_crm.py do not care which one is active:
+
+- MemoryStorage   - dicts in process memory (the original behavior)
+- CompactStorage  - the same in columnar arrays, for millions of leads (crm_compact.py)
+- SQLiteStorage   - a single SQLite file in WAL mode
+- PostgresStorage - PostgreSQL through a psycopg connection pool
+
+Each lead carries a ``version`` that starts at 1 and goes up by one with
+every status update. Passing ``expected_version`` to update_lead_status()
+makes the update conditional (optimistic concurrency): it raises
+VersionConflict instead of overwriting a change the caller has not seen.
+
+Visits are also ordered by ``visit_time`` (per lead and overall), so
+schedule_visits() can refuse a visit that overlaps one of the lead's
+existing visits and visits_between() answers time-range queries without
+scanning every visit.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str) -> str:
+    """Key used for duplicate detection: digits only, without the +91/0 prefix"""
+    digits = _NON_DIGITS.sub("", phone or "")
+    if len(digits) == 12 and digits.startswith("91"):
+        return digits[2:]
+    if len(digits) == 11 and digits.startswith("0"):
+        return digits[1:]
+    return digits
+
+
+LEAD_FILTERS = ("status", "city", "source", "created_from", "created_to")
+VISIT_FILTERS = ("lead_id", "status", "created_from", "created_to")
+
+
+def _check_filters(filters: dict, allowed) -> dict:
+    """Drop unset filters and reject unknown ones"""
+    unknown = set(filters) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def _matches(record: dict, filters: dict) -> bool:
+    for key, value in filters.items():
+        if key == "created_from":
+            if record["created_at"] < value:
+                return False
+        elif key == "created_to":
+            if record["created_at"] >= value:
+                return False
+        elif record.get(key) != value:
+            return False
+    return True
+
+
+def _sql_where(filters: dict, placeholder: str, seq_column: str, after: int) -> Tuple[str, list]:
+    """WHERE clause for keyset pagination plus checked filters"""
+    clauses = [f"{seq_column} > {placeholder}"]
+    params = [after]
+    for key, value in filters.items():
+        if key == "created_from":
+            clauses.append(f"created_at >= {placeholder}")
+        elif key == "created_to":
+            clauses.append(f"created_at < {placeholder}")
+        else:
+            clauses.append(f"{key} = {placeholder}")
+        params.append(value)
+    return " AND ".join(clauses), params
+
+
+def _sql_page(rows, limit: Optional[int], to_dict) -> Tuple[list, Optional[int]]:
+    """Split limit + 1 (seq, ...) rows into a page and the next cursor"""
+    rows = list(rows)
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1][0]
+    return [to_dict(row[1:]) for row in rows], next_after
+
+
+def _visit_ts(visit_time) -> float:
+    """Sortable epoch seconds for a visit_time datetime or ISO string"""
+    if isinstance(visit_time, str):
+        visit_time = datetime.fromisoformat(visit_time)
+    return visit_time.timestamp()
+
+
+def _sql_time_page(rows, limit: Optional[int]) -> Tuple[list, Optional[tuple]]:
+    """Split limit + 1 (visit_ts, visit_id, ...) rows into a page and the next key"""
+    rows = list(rows)
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1][0], rows[-1][1])
+    return [_visit_row_to_dict(row[1:]) for row in rows], next_after
+
+
+class VersionConflict(Exception):
+    """A conditional update found the lead at a different version"""
+
+    def __init__(self, lead_id: str, expected: int, current: int):
+        super().__init__(f"Lead {lead_id} is at version {current}, not {expected}")
+        self.lead_id = lead_id
+        self.expected = expected
+        self.current = current
+
+
+# Striped locks for MemoryStorage's per-lead read-modify-write
+LOCK_STRIPES = int(os.getenv("CRM_LOCK_STRIPES", "64"))
+
+
+class CRMStorage:
+    """Interface implemented by every storage engine"""
+
+    name = "base"
+    # Held in process memory: rebuilt from snapshot + CSV log on startup
+    in_memory = False
+
+    def add_lead(self, lead: dict) -> None:
+        """Store ``lead``; its ``version`` is set to 1 if missing"""
+        raise NotImplementedError
+
+    def add_lead_unique(self, lead: dict) -> Tuple[dict, bool]:
+        """Add ``lead`` unless one with the same normalized phone exists
+
+        Returns (lead, True) when it was created, or (existing lead, False).
+        The check and the insert are atomic.
+        """
+        raise NotImplementedError
+
+    def get_lead(self, lead_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_leads_by_phone(self, phone: str) -> list:
+        """Every lead whose normalized phone matches, oldest first"""
+        raise NotImplementedError
+
+    def update_lead_status(
+        self, lead_id: str, status: str, notes: Optional[str] = None, expected_version: Optional[int] = None
+    ) -> Optional[Tuple[str, dict]]:
+        """Set a lead's status and bump its version
+
+        Returns (old_status, lead) or None if not found. With
+        ``expected_version`` the update only happens if the lead is still at
+        that version; otherwise VersionConflict is raised.
+        """
+        raise NotImplementedError
+
+    def add_visit(self, visit: dict) -> None:
+        raise NotImplementedError
+
+    # Batch writes. Each one is applied atomically (one transaction or one
+    # lock hold) and returns one result per item, in order.
+
+    def add_leads(self, leads: list, unique: bool = False) -> list:
+        """Add several leads; returns (lead, created) per item like add_lead_unique()"""
+        raise NotImplementedError
+
+    def update_lead_statuses(self, updates: list) -> list:
+        """Apply (lead_id, status, notes) updates; results as update_lead_status()"""
+        raise NotImplementedError
+
+    def add_visits(self, visits: list) -> list:
+        """Add several visits; False marks an item whose lead does not exist"""
+        raise NotImplementedError
+
+    def schedule_visits(self, visits: list, slot_seconds: float = 0) -> list:
+        """Add visits unless they overlap a visit of the same lead
+
+        Every visit occupies ``slot_seconds`` from its visit_time, so two
+        visits overlap when they start less than ``slot_seconds`` apart (0
+        turns the check off). Returns per item None if the lead does not
+        exist, else the overlapping visits; an empty list means it was added.
+        Items are also checked against earlier items of the same batch.
+        """
+        raise NotImplementedError
+
+    def visits_between(
+        self, start: float, end: float, lead_id: Optional[str] = None,
+        after: Optional[tuple] = None, limit: Optional[int] = None,
+    ) -> Tuple[list, Optional[tuple]]:
+        """Visits with ``start <= visit_time < end`` (epoch seconds) in time order
+
+        Ties are ordered by visit_id. ``after`` is the (visit_ts, visit_id)
+        key returned with the previous page; the key for the next page is
+        None on the last one.
+        """
+        raise NotImplementedError
+
+    def list_leads(self, after: int = 0, limit: Optional[int] = None, **filters) -> Tuple[list, Optional[int]]:
+        """One page of leads in creation order, starting after cursor ``after``
+
+        Returns the page and the cursor for the next one (None on the last
+        page). Filters: status, city, source, created_from (inclusive) and
+        created_to (exclusive) as ISO timestamps.
+        """
+        raise NotImplementedError
+
+    def list_visits(self, after: int = 0, limit: Optional[int] = None, **filters) -> Tuple[list, Optional[int]]:
+        """Like list_leads(); filters: lead_id, status, created_from, created_to"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStorage(CRMStorage):
+    """Leads and visits kept in dicts; nothing survives a restart
+
+    Secondary indexes are maintained on every write: normalized phone ->
+    lead ids, status/city/source -> sorted lead positions, and lead id ->
+    visit positions. A lead's position is its index in creation order, which
+    is also its pagination cursor, so filtered listings walk the matching
+    index bucket from the cursor instead of scanning every lead. Visits are
+    also kept as sorted (visit_ts, visit_id) lists, overall and per lead, so
+    a time range is two bisections plus the k visits in it.
+
+    A status update reads and writes the lead under one of ``LOCK_STRIPES``
+    per-lead locks, so updates of different leads don't wait for each
+    other. The store-wide lock is only held for the short index change.
+    Lock order is stripe(s), then the store lock.
+    """
+
+    name = "memory"
+    in_memory = True
+
+    LEAD_INDEXES = ("status", "city", "source")
+
+    def __init__(self):
+        self.leads = {}
+        self.visits = {}
+        # Creation order; a record's pagination cursor is its index + 1
+        self._lead_order = []
+        self._visit_order = []
+        self._lead_positions = {}
+        # Secondary indexes
+        self._by_phone = {}
+        self._by_field = {field: {} for field in self.LEAD_INDEXES}
+        self._visits_by_lead = {}
+        # Sorted (visit_ts, visit_id) keys
+        self._visits_by_time = []
+        self._visit_times_by_lead = {}
+        self._lock = threading.RLock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _insert_lead(self, lead: dict) -> None:
+        lead.setdefault("version", 1)
+        lead_id = lead["lead_id"]
+        position = len(self._lead_order)
+        self._lead_order.append(lead_id)
+        self._lead_positions[lead_id] = position
+        self.leads[lead_id] = lead
+        self._by_phone.setdefault(normalize_phone(lead["phone"]), []).append(lead_id)
+        for field in self.LEAD_INDEXES:
+            # Positions only grow, so appending keeps every bucket sorted
+            self._by_field[field].setdefault(lead.get(field), []).append(position)
+
+    def _insert_visit(self, visit: dict) -> None:
+        position = len(self._visit_order)
+        self._visit_order.append(visit["visit_id"])
+        self.visits[visit["visit_id"]] = visit
+        self._visits_by_lead.setdefault(visit["lead_id"], []).append(position)
+        key = (_visit_ts(visit["visit_time"]), visit["visit_id"])
+        insort(self._visits_by_time, key)
+        insort(self._visit_times_by_lead.setdefault(visit["lead_id"], []), key)
+
+    def add_lead(self, lead: dict) -> None:
+        with self._lock:
+            if lead["lead_id"] not in self.leads:
+                self._insert_lead(lead)
+
+    def add_lead_unique(self, lead: dict) -> Tuple[dict, bool]:
+        with self._lock:
+            existing = self._by_phone.get(normalize_phone(lead["phone"]))
+            if existing:
+                # Status updates write under the store lock too, so this copy is consistent
+                return dict(self.leads[existing[0]]), False
+            self._insert_lead(lead)
+            return lead, True
+
+    def get_lead(self, lead_id: str) -> Optional[dict]:
+        # A copy taken under the lead's stripe: status, notes and version
+        # always belong to the same update, even after another one lands
+        with self._locked([lead_id]):
+            lead = self.leads.get(lead_id)
+            return None if lead is None else dict(lead)
+
+    def find_leads_by_phone(self, phone: str) -> list:
+        with self._lock:
+            lead_ids = list(self._by_phone.get(normalize_phone(phone), ()))
+        with self._locked(lead_ids):
+            return [dict(self.leads[lead_id]) for lead_id in lead_ids]
+
+    @contextmanager
+    def _locked(self, lead_ids):
+        """Hold the stripe locks of ``lead_ids`` (in a fixed order: no deadlocks)"""
+        stripes = sorted({hash(lead_id) % len(self._stripes) for lead_id in lead_ids})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._stripes[stripe])
+            yield
+
+    def update_lead_status(self, lead_id, status, notes=None, expected_version=None):
+        with self._locked([lead_id]):
+            return self._update_lead_status(lead_id, status, notes, expected_version)
+
+    def _update_lead_status(self, lead_id, status, notes, expected_version=None, version=None):
+        """Caller holds the lead's stripe; ``version`` sets it instead of bumping it"""
+        lead = self.leads.get(lead_id)
+        if lead is None:
+            return None
+        current = lead.get("version", 1)
+        if expected_version is not None and expected_version != current:
+            raise VersionConflict(lead_id, expected_version, current)
+        old_status = lead.get("status", "UNKNOWN")
+        with self._lock:
+            if status != old_status:
+                # Move the lead between status buckets, keeping both sorted
+                position = self._lead_positions[lead_id]
+                by_status = self._by_field["status"]
+                old_bucket = by_status.get(old_status)
+                if old_bucket:
+                    i = bisect_left(old_bucket, position)
+                    if i < len(old_bucket) and old_bucket[i] == position:
+                        del old_bucket[i]
+                    if not old_bucket:
+                        del by_status[old_status]
+                insort(by_status.setdefault(status, []), position)
+            lead["status"] = status
+            if notes:
+                lead["notes"] = notes
+            lead["version"] = current + 1 if version is None else version
+            # A copy, so the caller sees this update even if another follows
+            return old_status, dict(lead)
+
+    def replay_lead_status(self, lead_id, status, notes, version: int) -> bool:
+        """Apply a logged update unless the lead is already at ``version`` or later"""
+        with self._locked([lead_id]):
+            lead = self.leads.get(lead_id)
+            if lead is None or lead.get("version", 1) >= version:
+                return False
+            self._update_lead_status(lead_id, status, notes, version=version)
+            return True
+
+    def add_visit(self, visit: dict) -> None:
+        with self._lock:
+            if visit["visit_id"] not in self.visits:
+                self._insert_visit(visit)
+
+    def add_leads(self, leads, unique=False):
+        with self._lock:
+            if unique:
+                return [self.add_lead_unique(lead) for lead in leads]
+            for lead in leads:
+                self.add_lead(lead)
+            return [(lead, True) for lead in leads]
+
+    def update_lead_statuses(self, updates):
+        with self._locked([update[0] for update in updates]):
+            return [self._update_lead_status(*update) for update in updates]
+
+    def add_visits(self, visits):
+        with self._lock:
+            results = []
+            for visit in visits:
+                exists = visit["lead_id"] in self.leads
+                if exists:
+                    self.add_visit(visit)
+                results.append(exists)
+            return results
+
+    def _overlapping(self, lead_id, visit_ts, slot_seconds):
+        """The lead's visits starting less than ``slot_seconds`` from ``visit_ts``"""
+        times = self._visit_times_by_lead.get(lead_id, ())
+        i = bisect_left(times, (visit_ts - slot_seconds,))
+        found = []
+        while i < len(times) and times[i][0] < visit_ts + slot_seconds:
+            if times[i][0] > visit_ts - slot_seconds:
+                found.append(self.visits[times[i][1]])
+            i += 1
+        return found
+
+    def schedule_visits(self, visits, slot_seconds=0):
+        with self._lock:
+            results = []
+            for visit in visits:
+                if visit["lead_id"] not in self.leads:
+                    results.append(None)
+                    continue
+                overlapping = []
+                if slot_seconds > 0:
+                    overlapping = self._overlapping(
+                        visit["lead_id"], _visit_ts(visit["visit_time"]), slot_seconds
+                    )
+                if not overlapping:
+                    self.add_visit(visit)
+                results.append(overlapping)
+            return results
+
+    def visits_between(self, start, end, lead_id=None, after=None, limit=None):
+        with self._lock:
+            if lead_id is None:
+                keys = self._visits_by_time
+            else:
+                keys = self._visit_times_by_lead.get(lead_id, [])
+            lo = bisect_left(keys, (start,))
+            if after is not None:
+                lo = max(lo, bisect_right(keys, tuple(after)))
+            hi = bisect_left(keys, (end,))
+            stop = hi if limit is None else min(hi, lo + limit)
+            page = [dict(self.visits[visit_id]) for _, visit_id in keys[lo:stop]]
+            return page, (keys[stop - 1] if stop < hi else None)
+
+    @staticmethod
+    def _page(positions, order, records, after, limit, filters):
+        """Walk sorted ``positions`` from cursor ``after`` collecting matches
+
+        Runs under ``_lock`` and returns copies, so a status update made
+        while the page is being encoded can't change it.
+        """
+        page = []
+        start = bisect_left(positions, after)
+        end = len(positions)
+        for i in range(start, end):
+            position = positions[i]
+            record = records[order[position]]
+            if _matches(record, filters):
+                page.append(dict(record))
+                if limit is not None and len(page) >= limit:
+                    return page, (position + 1 if i + 1 < end else None)
+        return page, None
+
+    def list_leads(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, LEAD_FILTERS)
+        with self._lock:
+            # Walk the smallest index bucket among the equality filters
+            positions = range(len(self._lead_order))
+            for field in self.LEAD_INDEXES:
+                if field in filters:
+                    bucket = self._by_field[field].get(filters[field], ())
+                    if len(bucket) < len(positions):
+                        positions = bucket
+            return self._page(positions, self._lead_order, self.leads, after, limit, filters)
+
+    def list_visits(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, VISIT_FILTERS)
+        with self._lock:
+            if "lead_id" in filters:
+                positions = self._visits_by_lead.get(filters["lead_id"], ())
+            else:
+                positions = range(len(self._visit_order))
+            return self._page(positions, self._visit_order, self.visits, after, limit, filters)
+
+    def export_rows(self) -> Tuple[list, list]:
+        """Leads and visits as flat rows in LEAD_COLUMNS/VISIT_COLUMNS order"""
+        # list() copies the values in one step, so concurrent inserts cannot
+        # change the dicts while we iterate
+        leads = [
+            [lead.get(column) for column in LEAD_COLUMNS]
+            for lead in list(self.leads.values())
+        ]
+        visits = [
+            [
+                visit["visit_id"],
+                visit["lead_id"],
+                visit["visit_time"].isoformat(),
+                visit.get("notes"),
+                visit["status"],
+                visit["created_at"],
+            ]
+            for visit in list(self.visits.values())
+        ]
+        return leads, visits
+
+    def import_rows(self, lead_rows, visit_rows) -> None:
+        """Load rows shaped like export_rows(); records already present win"""
+        with self._lock:
+            self._import_rows(lead_rows, visit_rows)
+
+    def _import_rows(self, lead_rows, visit_rows) -> None:
+        leads = self.leads
+        # Rows from before versions existed have no version column
+        for lead_id, name, phone, city, source, status, notes, created_at, *version in lead_rows:
+            if lead_id in leads:
+                continue
+            lead = {
+                "name": name,
+                "phone": phone,
+                "city": city,
+                "source": source,
+                "lead_id": lead_id,
+                "status": status,
+                "created_at": created_at,
+                "version": version[0] if version else 1,
+            }
+            if notes:
+                lead["notes"] = notes
+            self._insert_lead(lead)
+
+        visits = self.visits
+        for visit_id, lead_id, visit_time, notes, status, created_at in visit_rows:
+            if visit_id in visits:
+                continue
+            self._insert_visit({
+                "lead_id": lead_id,
+                "visit_time": datetime.fromisoformat(visit_time),
+                "notes": notes,
+                "visit_id": visit_id,
+                "status": status,
+                "created_at": created_at,
+            })
+
+
+LEAD_COLUMNS = ("lead_id", "name", "phone", "city", "source", "status", "notes", "created_at", "version")
+VISIT_COLUMNS = ("visit_id", "lead_id", "visit_time", "notes", "status", "created_at")
+
+
+def _lead_row_to_dict(row) -> dict:
+    lead = dict(zip(LEAD_COLUMNS, row))
+    # Match the in-memory shape: notes only appear once a status update set them
+    if lead["notes"] is None:
+        del lead["notes"]
+    return lead
+
+
+def _lead_insert_params(lead: dict) -> tuple:
+    lead.setdefault("version", 1)
+    return (*(lead.get(column) for column in LEAD_COLUMNS), normalize_phone(lead["phone"]))
+
+
+def _visit_insert_params(visit: dict) -> tuple:
+    return (
+        visit["visit_id"],
+        visit["lead_id"],
+        visit["visit_time"].isoformat(),
+        _visit_ts(visit["visit_time"]),
+        visit.get("notes"),
+        visit["status"],
+        visit["created_at"],
+    )
+
+
+def _visit_row_to_dict(row) -> dict:
+    return dict(zip(VISIT_COLUMNS, row))
+
+
+class SQLiteStorage(CRMStorage):
+    """SQLite engine in WAL mode with one connection per worker thread.
+
+    FastAPI runs the sync route handlers in a threadpool, so each thread gets
+    its own connection (and with it sqlite3's per-connection prepared
+    statement cache). WAL lets readers proceed while a writer commits.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS leads (
+            lead_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            city TEXT NOT NULL,
+            source TEXT,
+            status TEXT NOT NULL,
+            notes TEXT,
+            created_at TEXT NOT NULL,
+            phone_key TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )""",
+        """CREATE TABLE IF NOT EXISTS visits (
+            visit_id TEXT PRIMARY KEY,
+            lead_id TEXT NOT NULL REFERENCES leads(lead_id),
+            visit_time TEXT NOT NULL,
+            visit_ts REAL NOT NULL,
+            notes TEXT,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )""",
+    )
+
+    # Columns added after the first schema, for databases created before them
+    COLUMNS = (
+        ("leads", "phone_key", "TEXT"),
+        ("leads", "version", "INTEGER NOT NULL DEFAULT 1"),
+    )
+
+    # Secondary indexes implicitly end in rowid, so a filtered page is an
+    # index range scan in pagination order
+    INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_leads_phone_key ON leads(phone_key)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_city ON leads(city)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_source ON leads(source)",
+        "CREATE INDEX IF NOT EXISTS idx_visits_lead ON visits(lead_id, visit_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_visits_time ON visits(visit_ts, visit_id)",
+    )
+
+    def __init__(self, path: str = "crm.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            for table, column, column_type in self.COLUMNS:
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            for statement in self.INDEXES:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=10,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=64,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on this thread's connection"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _insert_lead(conn, lead: dict) -> None:
+        conn.execute(
+            "INSERT INTO leads (lead_id, name, phone, city, source, status, notes, created_at, version, phone_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _lead_insert_params(lead),
+        )
+
+    @staticmethod
+    def _insert_visit(conn, visit: dict) -> None:
+        conn.execute(
+            "INSERT INTO visits (visit_id, lead_id, visit_time, visit_ts, notes, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _visit_insert_params(visit),
+        )
+
+    def add_lead(self, lead: dict) -> None:
+        self._insert_lead(self._conn(), lead)
+
+    def add_lead_unique(self, lead: dict) -> Tuple[dict, bool]:
+        return self.add_leads([lead], unique=True)[0]
+
+    def add_leads(self, leads: list, unique: bool = False) -> list:
+        results = []
+        with self._transaction() as conn:
+            for lead in leads:
+                row = None
+                if unique:
+                    row = conn.execute(
+                        "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+                        "FROM leads WHERE phone_key = ? ORDER BY rowid LIMIT 1",
+                        (normalize_phone(lead["phone"]),),
+                    ).fetchone()
+                if row is None:
+                    self._insert_lead(conn, lead)
+                    results.append((lead, True))
+                else:
+                    results.append((_lead_row_to_dict(row), False))
+        return results
+
+    def get_lead(self, lead_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+            "FROM leads WHERE lead_id = ?",
+            (lead_id,),
+        ).fetchone()
+        return _lead_row_to_dict(row) if row else None
+
+    def find_leads_by_phone(self, phone: str) -> list:
+        rows = self._conn().execute(
+            "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+            "FROM leads WHERE phone_key = ? ORDER BY rowid",
+            (normalize_phone(phone),),
+        )
+        return [_lead_row_to_dict(row) for row in rows]
+
+    def update_lead_status(self, lead_id, status, notes=None, expected_version=None):
+        with self._transaction() as conn:
+            return self._update_lead_status(conn, lead_id, status, notes, expected_version)
+
+    def update_lead_statuses(self, updates: list) -> list:
+        with self._transaction() as conn:
+            return [self._update_lead_status(conn, *update) for update in updates]
+
+    @staticmethod
+    def _update_lead_status(conn, lead_id, status, notes, expected_version=None):
+        row = conn.execute(
+            "SELECT status, version FROM leads WHERE lead_id = ?", (lead_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if expected_version is not None and expected_version != row[1]:
+            raise VersionConflict(lead_id, expected_version, row[1])
+        updated = conn.execute(
+            "UPDATE leads SET status = ?, notes = COALESCE(?, notes), version = version + 1 "
+            "WHERE lead_id = ? "
+            "RETURNING lead_id, name, phone, city, source, status, notes, created_at, version",
+            (status, notes or None, lead_id),
+        ).fetchone()
+        return row[0], _lead_row_to_dict(updated)
+
+    def add_visit(self, visit: dict) -> None:
+        self._insert_visit(self._conn(), visit)
+
+    def add_visits(self, visits: list) -> list:
+        results = []
+        with self._transaction() as conn:
+            for visit in visits:
+                exists = conn.execute(
+                    "SELECT 1 FROM leads WHERE lead_id = ?", (visit["lead_id"],)
+                ).fetchone()
+                if exists:
+                    self._insert_visit(conn, visit)
+                results.append(exists is not None)
+        return results
+
+    def schedule_visits(self, visits, slot_seconds=0):
+        results = []
+        # BEGIN IMMEDIATE serializes writers, so check-then-insert cannot race
+        with self._transaction() as conn:
+            for visit in visits:
+                exists = conn.execute(
+                    "SELECT 1 FROM leads WHERE lead_id = ?", (visit["lead_id"],)
+                ).fetchone()
+                if exists is None:
+                    results.append(None)
+                    continue
+                overlapping = []
+                if slot_seconds > 0:
+                    visit_ts = _visit_ts(visit["visit_time"])
+                    overlapping = [_visit_row_to_dict(row) for row in conn.execute(
+                        "SELECT visit_id, lead_id, visit_time, notes, status, created_at FROM visits "
+                        "WHERE lead_id = ? AND visit_ts > ? AND visit_ts < ? ORDER BY visit_ts",
+                        (visit["lead_id"], visit_ts - slot_seconds, visit_ts + slot_seconds),
+                    )]
+                if not overlapping:
+                    self._insert_visit(conn, visit)
+                results.append(overlapping)
+        return results
+
+    def visits_between(self, start, end, lead_id=None, after=None, limit=None):
+        clauses, params = ["visit_ts >= ?", "visit_ts < ?"], [start, end]
+        if lead_id is not None:
+            clauses.append("lead_id = ?")
+            params.append(lead_id)
+        if after is not None:
+            clauses.append("(visit_ts, visit_id) > (?, ?)")
+            params.extend(after)
+        rows = self._conn().execute(
+            "SELECT visit_ts, visit_id, lead_id, visit_time, notes, status, created_at "
+            f"FROM visits WHERE {' AND '.join(clauses)} ORDER BY visit_ts, visit_id LIMIT ?",
+            (*params, -1 if limit is None else limit + 1),
+        )
+        return _sql_time_page(rows, limit)
+
+    def list_leads(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, LEAD_FILTERS)
+        where, params = _sql_where(filters, "?", "rowid", after)
+        rows = self._conn().execute(
+            "SELECT rowid, lead_id, name, phone, city, source, status, notes, created_at, version "
+            f"FROM leads WHERE {where} ORDER BY rowid LIMIT ?",
+            (*params, -1 if limit is None else limit + 1),
+        )
+        return _sql_page(rows, limit, _lead_row_to_dict)
+
+    def list_visits(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, VISIT_FILTERS)
+        where, params = _sql_where(filters, "?", "rowid", after)
+        rows = self._conn().execute(
+            "SELECT rowid, visit_id, lead_id, visit_time, notes, status, created_at "
+            f"FROM visits WHERE {where} ORDER BY rowid LIMIT ?",
+            (*params, -1 if limit is None else limit + 1),
+        )
+        return _sql_page(rows, limit, _visit_row_to_dict)
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class PostgresStorage(CRMStorage):
+    """PostgreSQL engine backed by a psycopg_pool.ConnectionPool.
+
+    Statements are executed with ``prepare=True`` so every pooled connection
+    prepares each query once and reuses the server-side plan afterwards.
+    """
+
+    name = "postgres"
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS leads (
+            seq BIGSERIAL UNIQUE,
+            lead_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            city TEXT NOT NULL,
+            source TEXT,
+            status TEXT NOT NULL,
+            notes TEXT,
+            created_at TEXT NOT NULL,
+            phone_key TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS visits (
+            seq BIGSERIAL UNIQUE,
+            visit_id TEXT PRIMARY KEY,
+            lead_id TEXT NOT NULL REFERENCES leads(lead_id),
+            visit_time TEXT NOT NULL,
+            visit_ts DOUBLE PRECISION NOT NULL,
+            notes TEXT,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )""",
+        # Columns added after the first schema
+        "ALTER TABLE leads ADD COLUMN IF NOT EXISTS phone_key TEXT",
+        "ALTER TABLE leads ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+        # Secondary indexes end in seq so a filtered page is an index range scan
+        "CREATE INDEX IF NOT EXISTS idx_leads_phone_key ON leads(phone_key, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_city ON leads(city, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_source ON leads(source, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_visits_lead ON visits(lead_id, visit_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_visits_lead_seq ON visits(lead_id, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_visits_time ON visits(visit_ts, visit_id)",
+    )
+
+    def __init__(self, conninfo: str, min_size: int = 2, max_size: int = 10):
+        # Only needed for this engine, so import on demand
+        from psycopg_pool import ConnectionPool
+
+        self.pool = ConnectionPool(
+            conninfo, min_size=min_size, max_size=max_size, open=True
+        )
+        with self.pool.connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def add_lead(self, lead: dict) -> None:
+        with self.pool.connection() as conn:
+            self._insert_lead(conn, lead)
+
+    @staticmethod
+    def _insert_lead(conn, lead: dict) -> None:
+        conn.execute(
+            "INSERT INTO leads (lead_id, name, phone, city, source, status, notes, created_at, version, phone_key) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            _lead_insert_params(lead),
+            prepare=True,
+        )
+
+    @staticmethod
+    def _insert_visit(conn, visit: dict) -> None:
+        conn.execute(
+            "INSERT INTO visits (visit_id, lead_id, visit_time, visit_ts, notes, status, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            _visit_insert_params(visit),
+            prepare=True,
+        )
+
+    def add_lead_unique(self, lead: dict) -> Tuple[dict, bool]:
+        return self.add_leads([lead], unique=True)[0]
+
+    def add_leads(self, leads: list, unique: bool = False) -> list:
+        results = []
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                for lead in leads:
+                    row = None
+                    if unique:
+                        phone_key = normalize_phone(lead["phone"])
+                        # Serialize creators of the same phone without locking the table
+                        conn.execute(
+                            "SELECT pg_advisory_xact_lock(hashtext(%s))", (phone_key,), prepare=True
+                        )
+                        row = conn.execute(
+                            "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+                            "FROM leads WHERE phone_key = %s ORDER BY seq LIMIT 1",
+                            (phone_key,),
+                            prepare=True,
+                        ).fetchone()
+                    if row is None:
+                        self._insert_lead(conn, lead)
+                        results.append((lead, True))
+                    else:
+                        results.append((_lead_row_to_dict(row), False))
+        return results
+
+    def find_leads_by_phone(self, phone: str) -> list:
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+                "FROM leads WHERE phone_key = %s ORDER BY seq",
+                (normalize_phone(phone),),
+                prepare=True,
+            ).fetchall()
+        return [_lead_row_to_dict(row) for row in rows]
+
+    def get_lead(self, lead_id: str) -> Optional[dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT lead_id, name, phone, city, source, status, notes, created_at, version "
+                "FROM leads WHERE lead_id = %s",
+                (lead_id,),
+                prepare=True,
+            ).fetchone()
+        return _lead_row_to_dict(row) if row else None
+
+    def update_lead_status(self, lead_id, status, notes=None, expected_version=None):
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                return self._update_lead_status(conn, lead_id, status, notes, expected_version)
+
+    def update_lead_statuses(self, updates: list) -> list:
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                return [self._update_lead_status(conn, *update) for update in updates]
+
+    @staticmethod
+    def _update_lead_status(conn, lead_id, status, notes, expected_version=None):
+        row = conn.execute(
+            "SELECT status, version FROM leads WHERE lead_id = %s FOR UPDATE",
+            (lead_id,),
+            prepare=True,
+        ).fetchone()
+        if row is None:
+            return None
+        if expected_version is not None and expected_version != row[1]:
+            raise VersionConflict(lead_id, expected_version, row[1])
+        updated = conn.execute(
+            "UPDATE leads SET status = %s, notes = COALESCE(%s, notes), version = version + 1 "
+            "WHERE lead_id = %s "
+            "RETURNING lead_id, name, phone, city, source, status, notes, created_at, version",
+            (status, notes or None, lead_id),
+            prepare=True,
+        ).fetchone()
+        return row[0], _lead_row_to_dict(updated)
+
+    def add_visit(self, visit: dict) -> None:
+        with self.pool.connection() as conn:
+            self._insert_visit(conn, visit)
+
+    def add_visits(self, visits: list) -> list:
+        results = []
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                for visit in visits:
+                    exists = conn.execute(
+                        "SELECT 1 FROM leads WHERE lead_id = %s", (visit["lead_id"],), prepare=True
+                    ).fetchone()
+                    if exists:
+                        self._insert_visit(conn, visit)
+                    results.append(exists is not None)
+        return results
+
+    def schedule_visits(self, visits, slot_seconds=0):
+        results = []
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                for visit in visits:
+                    # The lead's row lock serializes schedulers of the same lead
+                    exists = conn.execute(
+                        "SELECT 1 FROM leads WHERE lead_id = %s FOR UPDATE", (visit["lead_id"],), prepare=True
+                    ).fetchone()
+                    if exists is None:
+                        results.append(None)
+                        continue
+                    overlapping = []
+                    if slot_seconds > 0:
+                        visit_ts = _visit_ts(visit["visit_time"])
+                        overlapping = [_visit_row_to_dict(row) for row in conn.execute(
+                            "SELECT visit_id, lead_id, visit_time, notes, status, created_at FROM visits "
+                            "WHERE lead_id = %s AND visit_ts > %s AND visit_ts < %s ORDER BY visit_ts",
+                            (visit["lead_id"], visit_ts - slot_seconds, visit_ts + slot_seconds),
+                            prepare=True,
+                        ).fetchall()]
+                    if not overlapping:
+                        self._insert_visit(conn, visit)
+                    results.append(overlapping)
+        return results
+
+    def visits_between(self, start, end, lead_id=None, after=None, limit=None):
+        clauses, params = ["visit_ts >= %s", "visit_ts < %s"], [start, end]
+        if lead_id is not None:
+            clauses.append("lead_id = %s")
+            params.append(lead_id)
+        if after is not None:
+            clauses.append("(visit_ts, visit_id) > (%s, %s)")
+            params.extend(after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT visit_ts, visit_id, lead_id, visit_time, notes, status, created_at "
+                f"FROM visits WHERE {' AND '.join(clauses)} ORDER BY visit_ts, visit_id LIMIT %s",
+                (*params, None if limit is None else limit + 1),
+                prepare=True,
+            ).fetchall()
+        return _sql_time_page(rows, limit)
+
+    def list_leads(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, LEAD_FILTERS)
+        where, params = _sql_where(filters, "%s", "seq", after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT seq, lead_id, name, phone, city, source, status, notes, created_at, version "
+                f"FROM leads WHERE {where} ORDER BY seq LIMIT %s",
+                (*params, None if limit is None else limit + 1),
+                prepare=True,
+            ).fetchall()
+        return _sql_page(rows, limit, _lead_row_to_dict)
+
+    def list_visits(self, after=0, limit=None, **filters):
+        filters = _check_filters(filters, VISIT_FILTERS)
+        where, params = _sql_where(filters, "%s", "seq", after)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT seq, visit_id, lead_id, visit_time, notes, status, created_at "
+                f"FROM visits WHERE {where} ORDER BY seq LIMIT %s",
+                (*params, None if limit is None else limit + 1),
+                prepare=True,
+            ).fetchall()
+        return _sql_page(rows, limit, _visit_row_to_dict)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+def create_storage(engine: Optional[str] = None) -> CRMStorage:
+    """Build the storage engine selected by CRM_STORAGE (memory|compact|sqlite|postgres)"""
+    engine = (engine or os.getenv("CRM_STORAGE", "memory")).lower()
+    if engine == "memory":
+        return MemoryStorage()
+    if engine == "compact":
+        from crm_compact import CompactStorage
+
+        return CompactStorage()
+    if engine == "sqlite":
+        return SQLiteStorage(os.getenv("CRM_SQLITE_PATH", "crm.db"))
+    if engine == "postgres":
+        return PostgresStorage(
+            os.getenv("CRM_DATABASE_URL", "postgresql://localhost/crm"),
+            min_size=int(os.getenv("CRM_PG_POOL_MIN", "2")),
+            max_size=int(os.getenv("CRM_PG_POOL_MAX", "10")),
+        )
+    raise ValueError(f"Unknown CRM_STORAGE engine: {engine}")
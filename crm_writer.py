@@ -0,0 +1,231 @@
+import csv
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from event_log import ERROR, log_event
+
+# fsync policies
+FSYNC_ALWAYS = "always"      # fsync after every group commit
+FSYNC_INTERVAL = "interval"  # fsync at most once per fsync_interval seconds
+FSYNC_NEVER = "never"        # leave it to the OS page cache
+
+_STOP = object()
+
+
+class _Barrier:
+    """Queue marker that is signalled once every row queued before it is on disk"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        # False if some rows queued before it are still waiting for a retry
+        self.written = True
+
+
+class CSVWriteBehind:
+    """Background group-commit writer for the CRM's append-only CSV files.
+
+    Request handlers call ``append()``, which only puts the row on a bounded
+    queue. A single writer thread collects rows per file and writes them in
+    one batch when ``batch_size`` rows are pending or the oldest pending row
+    has waited ``flush_interval`` seconds, whichever comes first. When the
+    queue is full ``append()`` blocks, which pushes back on callers instead
+    of growing memory without bound.
+
+    A batch that fails to write (``OSError``) is kept and retried every
+    ``retry_interval`` seconds, ahead of newer rows for the same file. Once
+    ``max_retry_rows`` rows are waiting, the writer stops taking rows off
+    the queue until a retry succeeds, so callers block rather than have
+    accepted rows dropped. Rows are only lost if the writer is closed while
+    the disk is still failing (counted in ``rows_dropped``).
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        fsync: str = FSYNC_INTERVAL,
+        fsync_interval: float = 1.0,
+        retry_interval: float = 1.0,
+        max_retry_rows: Optional[int] = None,
+    ):
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.retry_interval = retry_interval
+        self.max_retry_rows = max_retry_rows or max_queue
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._files = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+        # Files whose last write failed and may end in a partial line
+        self._torn = set()
+
+        # Counters for monitoring
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_failures = 0
+        self.rows_pending_retry = 0
+        self.rows_dropped = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="crm-csv-writer", daemon=True
+                )
+                self._thread.start()
+
+    def append(self, path: str, row: list):
+        """Queue one row for ``path``; returns without touching the disk"""
+        self.append_many(path, [row])
+
+    def append_many(self, path: str, rows: list):
+        """Queue several rows for ``path`` as one queue entry"""
+        if not rows:
+            return
+        if self._thread is None:
+            self.start()
+        self._queue.put((path, rows))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row queued so far has been written
+
+        Returns False on timeout, or if a failed write left rows waiting
+        for a retry.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self.rows_pending_retry == 0
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        return barrier.done.wait(timeout) and barrier.written
+
+    def close(self, timeout: Optional[float] = None):
+        """Drain the queue, write everything out and stop the writer thread"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+        for f in self._files.values():
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(f.fileno())
+            f.close()
+        self._files.clear()
+
+    def _run(self):
+        pending: Dict[str, List[list]] = {}
+        pending_count = 0
+        deadline = None
+        barriers = []
+        stopping = False
+        retrying = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if retrying and pending_count >= self.max_retry_rows:
+                # Leave new rows on the queue (append() blocks) until the
+                # rows already accepted are on disk
+                time.sleep(timeout)
+                item = None
+            else:
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, _Barrier):
+                barriers.append(item)
+            elif item is not None:
+                path, rows = item
+                pending.setdefault(path, []).extend(rows)
+                pending_count += len(rows)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            flush_due = (
+                stopping
+                or barriers
+                or (not retrying and pending_count >= self.batch_size)
+                or (deadline is not None and time.monotonic() >= deadline)
+            )
+            if flush_due:
+                if pending:
+                    pending = self._write_batch(pending)
+                pending_count = sum(len(rows) for rows in pending.values())
+                self.rows_pending_retry = pending_count
+                retrying = bool(pending)
+                deadline = time.monotonic() + self.retry_interval if retrying else None
+                for barrier in barriers:
+                    barrier.written = not retrying
+                    barrier.done.set()
+                barriers = []
+
+        if pending_count:
+            self.rows_dropped += pending_count
+            log_event("storage.csv_rows_lost", ERROR, rows=pending_count, paths=sorted(pending))
+
+    def _open(self, path: str):
+        f = self._files.get(path)
+        if f is None:
+            if path in self._torn and os.path.exists(path) and os.path.getsize(path):
+                with open(path, 'rb') as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    ends_mid_line = existing.read(1) != b"\n"
+            else:
+                ends_mid_line = False
+            f = open(path, 'a', newline='', encoding='utf-8')
+            if ends_mid_line:
+                # Finish the partial row a failed write left behind, so the
+                # retried rows start on their own line (replay skips the torn one)
+                f.write("\r\n")
+            self._files[path] = f
+        return f
+
+    def _write_batch(self, pending: Dict[str, List[list]]) -> Dict[str, List[list]]:
+        """Write every pending row; returns the rows of files that failed"""
+        failed = {}
+        now = time.monotonic()
+        sync = self.fsync == FSYNC_ALWAYS or (
+            self.fsync == FSYNC_INTERVAL and now - self._last_fsync >= self.fsync_interval
+        )
+        for path, rows in pending.items():
+            try:
+                f = self._open(path)
+                csv.writer(f).writerows(rows)
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                self.write_failures += 1
+                failed[path] = rows
+                self._torn.add(path)
+                # Reopen next time instead of reusing a handle in an unknown state
+                f = self._files.pop(path, None)
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                log_event(
+                    "storage.csv_write_failed", ERROR,
+                    path=path, rows=len(rows), error=str(e), retry_in=self.retry_interval,
+                )
+                continue
+            if path in self._torn:
+                self._torn.discard(path)
+                log_event("storage.csv_write_recovered", path=path, rows=len(rows))
+            self.rows_written += len(rows)
+        if sync:
+            self._last_fsync = now
+        self.batches_written += 1
+        return failed
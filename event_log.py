@@ -0,0 +1,188 @@
+"""
+Structured, non-blocking event log for the CRM server and the voice bot
+
+``log_event("lead.created", lead_id=..., name=...)`` puts the event on an
+in-memory queue; a background listener thread turns it into a log record,
+formats it and writes it to the sinks. The calling request handler or event loop never
+waits on stdout or the disk. Events are rendered as JSON lines by default,
+or as a short human-readable line with ``EVENT_LOG_FORMAT=pretty``.
+
+Events below WARNING can be sampled (``EVENT_LOG_SAMPLE_RATE``) so a busy
+server logs a fraction of its routine traffic; warnings and errors are
+always kept. If the queue is full the event is dropped and counted rather
+than blocking the caller.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+LOGGER_NAME = "crm.events"
+
+EVENT_LOG_LEVEL = os.getenv("EVENT_LOG_LEVEL", "INFO").upper()
+EVENT_LOG_FORMAT = os.getenv("EVENT_LOG_FORMAT")  # json | pretty (default per process)
+EVENT_LOG_FILE = os.getenv("EVENT_LOG_FILE")  # optional extra JSON lines sink
+EVENT_LOG_SAMPLE_RATE = float(os.getenv("EVENT_LOG_SAMPLE_RATE", "1.0"))
+EVENT_LOG_QUEUE_SIZE = int(os.getenv("EVENT_LOG_QUEUE_SIZE", "10000"))
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_logger = logging.getLogger(LOGGER_NAME)
+_logger.propagate = False
+
+_listener: Optional["_EventListener"] = None
+_queue: Optional[queue.SimpleQueue] = None
+_setup_lock = threading.Lock()
+_level = logging.getLevelName(EVENT_LOG_LEVEL)
+_sample_rate = EVENT_LOG_SAMPLE_RATE
+_dropped = 0
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, event, then the event's fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "event": record.msg,
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=_json_default, ensure_ascii=False)
+
+
+class PrettyFormatter(logging.Formatter):
+    """Console rendering: ``HH:MM:SS 📝 lead.created  lead_id=... name=...``"""
+
+    ICONS = {
+        "lead": "📝",
+        "visit": "📅",
+        "status": "🔄",
+        "tool": "🔧",
+        "server": "🚀",
+        "storage": "💾",
+    }
+
+    def format(self, record):
+        event = record.msg
+        if record.levelno >= ERROR:
+            icon = "❌"
+        elif record.levelno >= WARNING:
+            icon = "⚠️ "
+        else:
+            icon = self.ICONS.get(event.split(".", 1)[0], "•")
+        fields = " ".join(
+            f"{key}={value}" for key, value in getattr(record, "fields", {}).items()
+        )
+        clock = datetime.fromtimestamp(record.created).strftime("%H:%M:%S")
+        return f"{clock} {icon} {event}  {fields}".rstrip()
+
+
+class _EventListener(logging.handlers.QueueListener):
+    """Turns queued ``(created, level, event, fields)`` tuples into records"""
+
+    def prepare(self, item):
+        created, level, event, fields = item
+        record = logging.LogRecord(LOGGER_NAME, level, "", 0, event, None, None)
+        record.created = created
+        record.fields = fields
+        return record
+
+def setup_event_log(
+    fmt: Optional[str] = None,
+    level: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    log_file: Optional[str] = EVENT_LOG_FILE,
+    stream=None,
+    default_format: str = "json",
+):
+    """Start the background listener and its sinks (idempotent)
+
+    ``fmt`` picks the console renderer (``json`` or ``pretty``); when not
+    given, ``EVENT_LOG_FORMAT`` is used, falling back to ``default_format``.
+    ``log_file`` adds a JSON lines file sink next to the console.
+    """
+    global _listener, _queue, _level, _sample_rate
+    with _setup_lock:
+        if _listener is not None:
+            return
+        fmt = fmt or EVENT_LOG_FORMAT or default_format
+        if fmt not in ("json", "pretty"):
+            raise ValueError(f"Unknown event log format: {fmt}")
+
+        console = logging.StreamHandler(stream or sys.stdout)
+        console.setFormatter(PrettyFormatter() if fmt == "pretty" else JSONFormatter())
+        sinks = [console]
+        if log_file:
+            file_sink = logging.FileHandler(log_file, encoding="utf-8")
+            file_sink.setFormatter(JSONFormatter())
+            sinks.append(file_sink)
+
+        _level = logging.getLevelName((level or EVENT_LOG_LEVEL).upper())
+        _sample_rate = EVENT_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        # SimpleQueue is lock-free on put; the size cap is enforced in log_event
+        _queue = queue.SimpleQueue()
+        _listener = _EventListener(_queue, *sinks)
+        _listener.start()
+    atexit.register(shutdown_event_log)
+
+
+def shutdown_event_log():
+    """Write out every queued event and stop the listener thread"""
+    global _listener, _queue
+    with _setup_lock:
+        if _listener is None:
+            return
+        listener, _listener, _queue = _listener, None, None
+        listener.stop()
+        for sink in listener.handlers:
+            sink.close()
+
+
+def dropped_events() -> int:
+    """Events discarded because the queue was full"""
+    return _dropped
+
+
+def log_event(event: str, level: int = INFO, sample: Optional[float] = None, **fields):
+    """Record ``event`` with ``fields``; returns without doing any I/O
+
+    ``sample`` overrides the global sample rate for this event. Events at
+    WARNING and above are never sampled out.
+    """
+    global _dropped
+    if level < _level:
+        return
+    if level < WARNING:
+        rate = _sample_rate if sample is None else sample
+        if rate < 1.0 and random.random() >= rate:
+            return
+    q = _queue
+    if q is None:
+        # Not set up (tests, library use): hand it to stdlib logging directly
+        record = logging.LogRecord(LOGGER_NAME, level, "", 0, event, None, None)
+        record.fields = fields
+        _logger.handle(record)
+        return
+    if q.qsize() >= EVENT_LOG_QUEUE_SIZE:
+        _dropped += 1
+        return
+    q.put((time.time(), level, event, fields))
@@ -0,0 +1,181 @@
+"""
+Playback jitter buffer for model audio
+
+Model audio arrives in bursts of variable-size chunks, usually faster than
+real time. ``JitterBuffer`` stores it in a preallocated ring of
+``max_ms`` of audio, so memory is bounded: when a write doesn't fit, the
+writer waits for playback to free space (an overrun) and no audio is lost,
+so writes belong in their own task rather than the one reading the session.
+Buffered audio is only discarded by ``clear()``, on barge-in.
+
+Sinks that play in real time (the sound card) pull fixed ``frame_ms``
+frames with ``read()``. Playback starts once ``target_ms`` of audio is
+buffered (or has been waited for), which absorbs network jitter; if the
+buffer runs dry mid-playback the frame is padded with silence (an underrun)
+and the buffer re-primes. Other sinks take whatever is buffered with
+``read_available()``.
+"""
+
+import asyncio
+import os
+
+from audio_io import CHANNELS, RECEIVE_SAMPLE_RATE, SAMPLE_WIDTH
+
+JITTER_FRAME_MS = float(os.getenv("JITTER_FRAME_MS", "20"))
+JITTER_TARGET_MS = float(os.getenv("JITTER_TARGET_MS", "120"))
+JITTER_MAX_MS = float(os.getenv("JITTER_MAX_MS", "5000"))
+
+
+class JitterBuffer:
+    """Bounded ring buffer of PCM between ``receive_audio`` and the sink"""
+
+    def __init__(
+        self,
+        sample_rate: int = RECEIVE_SAMPLE_RATE,
+        frame_ms: float = JITTER_FRAME_MS,
+        target_ms: float = JITTER_TARGET_MS,
+        max_ms: float = JITTER_MAX_MS,
+    ):
+        self.sample_rate = sample_rate
+        self.bytes_per_second = sample_rate * SAMPLE_WIDTH * CHANNELS
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH * CHANNELS
+        self.target_bytes = max(self.frame_bytes, self._to_bytes(target_ms))
+        self.capacity = max(self.target_bytes + self.frame_bytes, self._to_bytes(max_ms))
+
+        self._ring = bytearray(self.capacity)
+        self._start = 0  # read position
+        self._size = 0  # bytes buffered
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()  # set when a read frees space
+        self._cleared = 0  # bumped by clear(), so a waiting write drops its audio
+        self.playing = False
+        self._draining = False  # no more audio coming for now
+
+        # Counters for monitoring
+        self.frames_played = 0
+        self.underruns = 0
+        self.overruns = 0
+        self.bytes_dropped = 0
+        self.peak_bytes = 0
+
+    def _to_bytes(self, ms: float) -> int:
+        frames = int(self.sample_rate * ms / 1000)
+        return frames * SAMPLE_WIDTH * CHANNELS
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def latency(self) -> float:
+        """Seconds of audio waiting to be played"""
+        return self._size / self.bytes_per_second
+
+    async def write(self, data: bytes):
+        """Append audio, waiting for playback to make room if the ring is full
+
+        Audio larger than the free space goes in piece by piece as it plays
+        out. If ``clear()`` is called while waiting, the rest is dropped.
+        """
+        data = memoryview(data)
+        cleared = self._cleared
+        if len(data) > self.capacity - self._size:
+            self.overruns += 1
+        while len(data) > 0:
+            while self._size == self.capacity:
+                self._space.clear()
+                await self._space.wait()
+                if self._cleared != cleared:
+                    self.bytes_dropped += len(data)
+                    return
+            n = min(len(data), self.capacity - self._size)
+            self._put(data[:n])
+            data = data[n:]
+
+    def flush(self):
+        """End of a response: play out what is buffered without waiting for
+        the target latency, and don't count running dry as an underrun"""
+        self._draining = True
+        self._ready.set()
+
+    def clear(self):
+        """Discard everything buffered (e.g. the model was interrupted)"""
+        self.bytes_dropped += self._size
+        self._start = 0
+        self._size = 0
+        self.playing = False
+        self._draining = False
+        self._cleared += 1
+        self._space.set()
+
+    async def read(self) -> bytes:
+        """The next ``frame_bytes`` of audio for a real-time sink"""
+        if not self.playing:
+            await self._prime()
+        if self._size >= self.frame_bytes:
+            self.frames_played += 1
+            return self._take(self.frame_bytes)
+
+        # Ran dry: finish with silence and wait for the buffer to refill
+        if not self._draining:
+            self.underruns += 1
+        self._draining = False
+        self.playing = False
+        self.frames_played += 1
+        return self._take(self._size).ljust(self.frame_bytes, b"\x00")
+
+    async def read_available(self) -> bytes:
+        """Everything buffered, as soon as there is anything"""
+        await self._wait_for_data()
+        return self._take(self._size)
+
+    async def _wait_for_data(self):
+        while self._size == 0:
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def _prime(self):
+        """Wait for ``target_bytes``, or for the target latency to pass"""
+        await self._wait_for_data()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.target_bytes / self.bytes_per_second
+        while self._size < self.target_bytes and not self._draining:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        self.playing = True
+
+    def _put(self, data: memoryview):
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._ring[end:end + first] = data[:first]
+        self._ring[:len(data) - first] = data[first:]
+        self._size += len(data)
+        self.peak_bytes = max(self.peak_bytes, self._size)
+        self._draining = False
+        self._ready.set()
+
+    def _take(self, n: int) -> bytes:
+        end = self._start + n
+        if end <= self.capacity:
+            out = bytes(self._ring[self._start:end])
+        else:
+            out = bytes(self._ring[self._start:]) + bytes(self._ring[:end - self.capacity])
+        self._start = end % self.capacity
+        self._size -= n
+        self._space.set()
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "latency_ms": round(self.latency * 1000, 1),
+            "peak_latency_ms": round(self.peak_bytes / self.bytes_per_second * 1000, 1),
+            "frames_played": self.frames_played,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "dropped_ms": round(self.bytes_dropped / self.bytes_per_second * 1000, 1),
+        }
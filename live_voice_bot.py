@@ -1,167 +1,310 @@
+import time
+
+_import_started = time.perf_counter()
+
 import os
 import asyncio
 import traceback
-import requests
+import hashlib
+import json
+import random
+import threading
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from functools import cache
+from collections import deque
+from uuid import uuid4
 from dotenv import load_dotenv
 load_dotenv()
-import pyaudio
 from datetime import datetime
 
-from google import genai
-from google.genai import types
+from websockets.exceptions import ConnectionClosed
+
+from audio_io import AudioSink, AudioSource, create_sink, create_source
+from jitter_buffer import JitterBuffer
+from vad import ACTIVITY_START, VAD_DROP, VAD_MODE, ActivityMarker, create_vad
+from crm_client import AsyncCRMClient, CircuitBreaker, CRMError, latency_budget
+from event_log import DEBUG, WARNING, log_event, setup_event_log, shutdown_event_log
+from metrics import METRICS_PORT, REGISTRY, counter, gauge, histogram, serve_metrics
+
+
+# Per-turn deadline for CRM tool calls, retries included (seconds)
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "4"))
 
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-SEND_SAMPLE_RATE = 16000
-RECEIVE_SAMPLE_RATE = 24000
-CHUNK_SIZE = 1024
+# Reconnect after a dropped Live API connection for up to this long
+RECONNECT_MAX_SECONDS = float(os.getenv("RECONNECT_MAX_SECONDS", "30"))
+# Caller audio kept while reconnecting (oldest dropped beyond this)
+RECONNECT_BUFFER_SECONDS = float(os.getenv("RECONNECT_BUFFER_SECONDS", "5"))
+# Websocket close codes after which reconnecting can succeed
+RECONNECT_CLOSE_CODES = {1000, 1001, 1006, 1011, 1012, 1013, 1014}
 
 MODEL = "models/gemini-live-2.5-flash-preview"
 CRM_BASE_URL = os.getenv("CRM_BASE_URL", "http://localhost:8001")
 
-client = genai.Client(
-    http_options={"api_version": "v1beta"},
-    api_key=os.getenv("GEMINI_API_KEY"),
-)
+# "local" talks to local_live.py instead of Gemini (offline benchmarks)
+LIVE_BACKEND = os.getenv("LIVE_BACKEND", "gemini")
+
+# Seconds spent in each startup phase (logged as "startup.ready")
+STARTUP_TIMES = {}
+_startup_lock = threading.Lock()
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Add the time spent in the block to ``STARTUP_TIMES[name]``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMES[name] = STARTUP_TIMES.get(name, 0.0) + time.perf_counter() - started
+
+
+def get_client():
+    """The Live API client (``client``), created on first use
+
+    Importing ``google.genai`` alone takes most of a second, so it is not
+    loaded until a session connects or ``warm_up()`` runs. A ``client`` set
+    on the module (e.g. by tests) takes precedence.
+    """
+    global client
+    with _startup_lock:
+        if "client" not in globals():
+            with startup_phase("live_client"):
+                if LIVE_BACKEND == "local":
+                    from local_live import LOCAL_LIVE_URL, LocalLiveClient
+
+                    client = LocalLiveClient(LOCAL_LIVE_URL)
+                else:
+                    from google import genai
+
+                    client = genai.Client(
+                        http_options={"api_version": "v1beta"},
+                        api_key=os.getenv("GEMINI_API_KEY"),
+                    )
+    return client
+
+# Shared CRM client - one keep-alive connection pool for every tool call
+crm = AsyncCRMClient(base_url=CRM_BASE_URL)
 
 # CRM API Functions
-def create_lead(name: str, phone: str, city: str, source: str = None) -> dict:
+def lead_payload(name: str, phone: str, city: str, source: str = None) -> dict:
+    payload = {
+        "name": name,
+        "phone": phone,
+        "city": city
+    }
+    if source:
+        payload["source"] = source
+    return payload
+
+def visit_payload(lead_id: str, visit_time: str, notes: str = None) -> dict:
+    payload = {
+        "lead_id": lead_id,
+        "visit_time": visit_time
+    }
+    if notes:
+        payload["notes"] = notes
+    return payload
+
+def status_payload(status: str, notes: str = None) -> dict:
+    payload = {
+        "status": status.upper()
+    }
+    if notes:
+        payload["notes"] = notes
+    return payload
+
+async def create_lead(
+    name: str, phone: str, city: str, source: str = None, idempotency_key: str = None
+) -> dict:
     """Create a new lead in the CRM system"""
     try:
-        url = f"{CRM_BASE_URL}/crm/leads"
-        payload = {
-            "name": name,
-            "phone": phone,
-            "city": city
-        }
-        if source:
-            payload["source"] = source
-
-        response = requests.post(url, json=payload, timeout=5)
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"error": f"Failed to create lead: {response.text}"}
+        return await crm.create_lead(lead_payload(name, phone, city, source), idempotency_key)
+    except CRMError as e:
+        return {"error": f"Failed to create lead: {e.text}"}
     except Exception as e:
         return {"error": str(e)}
 
-def schedule_visit(lead_id: str, visit_time: str, notes: str = None) -> dict:
+async def schedule_visit(
+    lead_id: str, visit_time: str, notes: str = None, idempotency_key: str = None
+) -> dict:
     """Schedule a visit for a lead"""
     try:
-        url = f"{CRM_BASE_URL}/crm/visits"
-        payload = {
-            "lead_id": lead_id,
-            "visit_time": visit_time
-        }
-        if notes:
-            payload["notes"] = notes
-
-        response = requests.post(url, json=payload, timeout=5)
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"error": f"Failed to schedule visit: {response.text}"}
+        return await crm.schedule_visit(visit_payload(lead_id, visit_time, notes), idempotency_key)
+    except CRMError as e:
+        return {"error": f"Failed to schedule visit: {e.text}"}
     except Exception as e:
         return {"error": str(e)}
 
-def update_lead_status(lead_id: str, status: str, notes: str = None) -> dict:
+async def update_lead_status(
+    lead_id: str, status: str, notes: str = None, idempotency_key: str = None
+) -> dict:
     """Update the status of a lead"""
     try:
-        url = f"{CRM_BASE_URL}/crm/leads/{lead_id}/status"
-        payload = {
-            "status": status.upper()
-        }
-        if notes:
-            payload["notes"] = notes
+        return await crm.update_lead_status(
+            lead_id, status_payload(status, notes), idempotency_key
+        )
+    except CRMError as e:
+        return {"error": f"Failed to update lead status: {e.text}"}
+    except Exception as e:
+        return {"error": str(e)}
 
-        response = requests.post(url, json=payload, timeout=5)
+# Batched CRM API Functions - one request for several calls of the same tool.
+# Each takes a list of argument tuples for the single-call function above (and
+# optionally one idempotency key per item) and returns one result per item.
+# The keys travel with the items and the CRM stores each item's result under
+# its own key, so if the batch fails as a whole (one invalid item rejects it
+# with 422, or the request errors out) the items are retried one by one with
+# the same keys: an item the batch already wrote is replayed, not written
+# twice, and only the items that really failed report an error. Items without
+# keys are only retried one by one after a 422, when nothing was written.
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"error": f"Failed to update lead status: {response.text}"}
+def _with_keys(payloads: list, keys: list) -> list:
+    if not keys:
+        return payloads
+    return [{**payload, "idempotency_key": key} for payload, key in zip(payloads, keys)]
+
+def _batch_results(results: list, action: str) -> list:
+    return [
+        {"error": f"Failed to {action}: {result['error']}"} if "error" in result else result
+        for result in results
+    ]
+
+async def _batch_fallback(e: Exception, single, items: list, keys: list, action: str) -> list:
+    rejected = isinstance(e, CRMError) and e.status_code == 422
+    error = f"Failed to {action}: {e.text}" if isinstance(e, CRMError) else str(e)
+    if not (keys or rejected):
+        return [{"error": error} for _ in items]
+    log_event("tool.batch_fallback", WARNING, action=action, calls=len(items), error=error)
+    return await _call_singly(single, items, keys)
+
+async def _call_singly(single, items: list, keys: list = None) -> list:
+    """Run the single-call function once per item, reusing the item keys"""
+    keys = keys or [None] * len(items)
+    return await asyncio.gather(
+        *(single(*item, idempotency_key=key) for item, key in zip(items, keys))
+    )
+
+async def create_leads(items: list, keys: list = None) -> list:
+    """Create several leads in one CRM request"""
+    try:
+        results = await crm.create_leads(_with_keys([lead_payload(*item) for item in items], keys))
+        return _batch_results(results, "create lead")
     except Exception as e:
-        return {"error": str(e)}
+        return await _batch_fallback(e, create_lead, items, keys, "create lead")
 
-# Tool definitions for Gemini - CRM Functions Only
-tools = [
-    types.Tool(
-        function_declarations=[
-            types.FunctionDeclaration(
-                name="createLead",
-                description="Creates a new lead in the CRM system with name, phone, city, and optional source",
-                parameters=types.Schema(
-                    type=types.Type.OBJECT,
-                    properties={
-                        "name": types.Schema(
-                            type=types.Type.STRING,
-                            description="Full name of the lead"
-                        ),
-                        "phone": types.Schema(
-                            type=types.Type.STRING,
-                            description="Phone number in Indian format (e.g., 9876543210)"
-                        ),
-                        "city": types.Schema(
-                            type=types.Type.STRING,
-                            description="City of the lead (e.g., Mumbai, Delhi, Gurgaon)"
-                        ),
-                        "source": types.Schema(
-                            type=types.Type.STRING,
-                            description="Optional source of the lead (e.g., Instagram, Referral, Website)"
-                        ),
-                    },
-                    required=["name", "phone", "city"]
+async def schedule_visits(items: list, keys: list = None) -> list:
+    """Schedule several visits in one CRM request"""
+    try:
+        results = await crm.schedule_visits(_with_keys([visit_payload(*item) for item in items], keys))
+        return _batch_results(results, "schedule visit")
+    except Exception as e:
+        return await _batch_fallback(e, schedule_visit, items, keys, "schedule visit")
+
+async def update_lead_statuses(items: list, keys: list = None) -> list:
+    """Update several lead statuses in one CRM request"""
+    try:
+        results = await crm.update_lead_statuses(_with_keys(
+            [{"lead_id": lead_id, **status_payload(status, notes)} for lead_id, status, notes in items],
+            keys,
+        ))
+        return _batch_results(results, "update lead status")
+    except Exception as e:
+        return await _batch_fallback(e, update_lead_status, items, keys, "update lead status")
+
+@cache
+def get_tools() -> list:
+    """Tool definitions for Gemini - CRM Functions Only (built once)"""
+    from google.genai import types
+
+    return [
+        types.Tool(
+            function_declarations=[
+                types.FunctionDeclaration(
+                    name="createLead",
+                    description="Creates a new lead in the CRM system with name, phone, city, and optional source",
+                    parameters=types.Schema(
+                        type=types.Type.OBJECT,
+                        properties={
+                            "name": types.Schema(
+                                type=types.Type.STRING,
+                                description="Full name of the lead"
+                            ),
+                            "phone": types.Schema(
+                                type=types.Type.STRING,
+                                description="Phone number in Indian format (e.g., 9876543210)"
+                            ),
+                            "city": types.Schema(
+                                type=types.Type.STRING,
+                                description="City of the lead (e.g., Mumbai, Delhi, Gurgaon)"
+                            ),
+                            "source": types.Schema(
+                                type=types.Type.STRING,
+                                description="Optional source of the lead (e.g., Instagram, Referral, Website)"
+                            ),
+                        },
+                        required=["name", "phone", "city"]
+                    ),
                 ),
-            ),
-            types.FunctionDeclaration(
-                name="scheduleVisit",
-                description="Schedules a visit for an existing lead at a specified time",
-                parameters=types.Schema(
-                    type=types.Type.OBJECT,
-                    properties={
-                        "lead_id": types.Schema(
-                            type=types.Type.STRING,
-                            description="UUID of the lead to schedule visit for"
-                        ),
-                        "visit_time": types.Schema(
-                            type=types.Type.STRING,
-                            description="ISO 8601 datetime string (e.g., 2025-10-02T17:00:00+05:30)"
-                        ),
-                        "notes": types.Schema(
-                            type=types.Type.STRING,
-                            description="Optional notes about the visit"
-                        ),
-                    },
-                    required=["lead_id", "visit_time"]
+                types.FunctionDeclaration(
+                    name="scheduleVisit",
+                    description="Schedules a visit for an existing lead at a specified time",
+                    parameters=types.Schema(
+                        type=types.Type.OBJECT,
+                        properties={
+                            "lead_id": types.Schema(
+                                type=types.Type.STRING,
+                                description="UUID of the lead to schedule visit for"
+                            ),
+                            "visit_time": types.Schema(
+                                type=types.Type.STRING,
+                                description="ISO 8601 datetime string (e.g., 2025-10-02T17:00:00+05:30)"
+                            ),
+                            "notes": types.Schema(
+                                type=types.Type.STRING,
+                                description="Optional notes about the visit"
+                            ),
+                        },
+                        required=["lead_id", "visit_time"]
+                    ),
                 ),
-            ),
-            types.FunctionDeclaration(
-                name="updateLeadStatus",
-                description="Updates the status of an existing lead in the CRM",
-                parameters=types.Schema(
-                    type=types.Type.OBJECT,
-                    properties={
-                        "lead_id": types.Schema(
-                            type=types.Type.STRING,
-                            description="UUID of the lead to update"
-                        ),
-                        "status": types.Schema(
-                            type=types.Type.STRING,
-                            description="New status: NEW, IN_PROGRESS, FOLLOW_UP, WON, or LOST"
-                        ),
-                        "notes": types.Schema(
-                            type=types.Type.STRING,
-                            description="Optional notes about the status update"
-                        ),
-                    },
-                    required=["lead_id", "status"]
+                types.FunctionDeclaration(
+                    name="updateLeadStatus",
+                    description="Updates the status of an existing lead in the CRM",
+                    parameters=types.Schema(
+                        type=types.Type.OBJECT,
+                        properties={
+                            "lead_id": types.Schema(
+                                type=types.Type.STRING,
+                                description="UUID of the lead to update"
+                            ),
+                            "status": types.Schema(
+                                type=types.Type.STRING,
+                                description="New status: NEW, IN_PROGRESS, FOLLOW_UP, WON, or LOST"
+                            ),
+                            "notes": types.Schema(
+                                type=types.Type.STRING,
+                                description="Optional notes about the status update"
+                            ),
+                        },
+                        required=["lead_id", "status"]
+                    ),
                 ),
-            ),
-        ]
-    ),
-]
+            ]
+        ),
+    ]
+
+# Model tool name -> CRM function (single call, and batched)
+TOOL_FUNCTIONS = {
+    "createLead": create_lead,
+    "scheduleVisit": schedule_visit,
+    "updateLeadStatus": update_lead_status,
+}
+BATCH_TOOL_FUNCTIONS = {
+    "createLead": create_leads,
+    "scheduleVisit": schedule_visits,
+    "updateLeadStatus": update_lead_statuses,
+}
 
 SYSTEM_INSTRUCTION = """You are a professional CRM assistant helping manage leads, visits, and customer relationships. Your role is to:
 
@@ -200,164 +343,657 @@ SYSTEM_INSTRUCTION = """You are a professional CRM assistant helping manage lead
 
 Remember: You are a helpful CRM assistant. Be accurate, clear, and always speak phone numbers DIGIT BY DIGIT."""
 
-CONFIG = types.LiveConnectConfig(
-    response_modalities=["AUDIO"],
-    speech_config=types.SpeechConfig(
-        voice_config=types.VoiceConfig(
-            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Zephyr")
+@cache
+def get_config():
+    """The session's ``LiveConnectConfig`` (``CONFIG``), built once"""
+    from google.genai import types
+
+    with startup_phase("live_config"):
+        return types.LiveConnectConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="Zephyr")
+                )
+            ),
+            system_instruction=SYSTEM_INSTRUCTION,
+            context_window_compression=types.ContextWindowCompressionConfig(
+                trigger_tokens=25600,
+                sliding_window=types.SlidingWindow(target_tokens=12800),
+            ),
+            tools=get_tools(),
         )
-    ),
-    system_instruction=SYSTEM_INSTRUCTION,
-    context_window_compression=types.ContextWindowCompressionConfig(
-        trigger_tokens=25600,
-        sliding_window=types.SlidingWindow(target_tokens=12800),
-    ),
-    tools=tools,
+
+
+def warm_up():
+    """Load the Live API client and config ahead of the first connect"""
+    get_client()
+    get_config()
+
+
+def __getattr__(name):
+    # client, tools and CONFIG are built on first access
+    if name == "client":
+        return get_client()
+    if name == "tools":
+        return get_tools()
+    if name == "CONFIG":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Latency histograms (exposed on /metrics when METRICS_PORT is set)
+CAPTURE_TO_SEND = histogram(
+    "voice_capture_to_send_seconds", "Microphone chunk captured -> sent to the Live API"
+)
+RESPONSE_LATENCY = histogram(
+    "voice_response_latency_seconds", "Caller stopped speaking -> first model audio received"
+)
+PLAYBACK_START = histogram(
+    "voice_playback_start_seconds", "First model audio of a response received -> playback started"
+)
+TOOL_TURN = histogram(
+    "voice_tool_turn_seconds", "Tool calls received -> send_tool_response done"
+)
+BARGE_IN = histogram(
+    "voice_barge_in_seconds", "Caller started speaking -> model playback stopped"
 )
 
-pya = pyaudio.PyAudio()
+
+RECONNECT_GAP = histogram(
+    "voice_reconnect_gap_seconds", "Live API connection lost -> session resumed"
+)
+
+
+# model_audio marker: the turn is complete, play out what is buffered
+_TURN_COMPLETE = object()
+
+
+@dataclass
+class UserText:
+    """Typed caller text on out_queue, sent as a complete turn"""
+    text: str
+
+
+class SessionGoingAway(Exception):
+    """The server announced it will close the connection soon (GoAway)"""
+
+
+def connection_lost(exc: BaseException) -> bool:
+    """True if ``exc`` means the Live API connection dropped (worth reconnecting)"""
+    if isinstance(exc, BaseExceptionGroup):
+        return all(connection_lost(e) for e in exc.exceptions)
+    from google.genai import errors
+
+    if isinstance(exc, errors.APIError):
+        return exc.code in RECONNECT_CLOSE_CODES
+    return isinstance(exc, (ConnectionClosed, OSError, asyncio.TimeoutError, SessionGoingAway))
+
+
+def tool_call_histogram(name):
+    return histogram("voice_tool_call_seconds", "CRM tool call duration by tool", tool=name)
+
+
+# CRM client health, read from the shared client on every scrape
+for _state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+    gauge(
+        "crm_circuit_breaker_state", "CRM circuit breaker state (1 for the current one)",
+        lambda state=_state: int(crm.breaker.state == state), state=_state,
+    )
+counter("crm_circuit_breaker_opened_total", "Times the CRM circuit breaker opened", lambda: crm.breaker.times_opened)
+counter("crm_circuit_breaker_rejected_total", "CRM calls failed fast by the open breaker", lambda: crm.breaker.rejected)
+counter("crm_retries_total", "CRM call retries", lambda: crm.retries)
 
 
 class AudioLoop:
-    def __init__(self):
-        self.audio_in_queue = None
+    """One voice session: caller audio from ``source``, model audio to ``sink``
+
+    The sound card is used unless another source/sink is given (see
+    ``audio_io``). With an interactive source (a live microphone) the session
+    runs until the user types 'q'; otherwise it ends with the source.
+
+    If the Live API connection drops, the session reconnects with the latest
+    session-resumption handle, so the conversation carries on where it was.
+    Caller audio captured during the gap (up to ``RECONNECT_BUFFER_SECONDS``)
+    is sent once the connection is back.
+    """
+
+    def __init__(self, source: AudioSource = None, sink: AudioSink = None, vad_mode: str = VAD_MODE):
+        self.playback = None
         self.out_queue = None
+        self.model_audio = None  # model audio on its way into playback
         self.session = None
-        self.audio_stream = None
+        self.source = source or create_source()
+        self.sink = sink or create_sink()
+        # Client-side VAD between capture and out_queue (None when VAD_MODE=off)
+        self.vad = create_vad(vad_mode, self.source.sample_rate)
+        # Scopes the tool-call idempotency keys to this run of the bot
+        self.session_key = uuid4().hex
+        self.speech_started_at = None  # onset of the caller's latest utterance
+        self._write_task = None  # sink write in flight
+        self._awaiting_response = False  # caller spoke since the last response
+        self._in_response = False  # model audio of the current turn has arrived
+        self.connected = asyncio.Event()
+        self.resumption_handle = None  # latest handle from session_resumption_update
+        self._gap = deque()  # (captured, item) not sent while disconnected
+        self._gap_bytes = 0
+        self._gap_limit = int(RECONNECT_BUFFER_SECONDS * self.source.sample_rate) * 2
+        self._response_audio_at = None  # when it arrived, until playback starts
+        self.devices_started = False  # source and sink opened by start_up()
+
+        # Counters for monitoring
+        self.interruptions = 0
+        self.barge_in_ms = deque(maxlen=256)  # speech onset -> playback stopped
+        self.reconnects = 0
+        self.gap_dropped_bytes = 0
+
+    def idempotency_key(self, fc) -> str:
+        """CRM Idempotency-Key for a tool call
+
+        Re-sending the same call (e.g. a retry after a timeout) reuses the
+        key, so the CRM replays its first response instead of writing twice.
+        Calls without an id fall back to a hash of the tool name and args.
+        """
+        if fc.id:
+            return f"{self.session_key}:{fc.id}"
+        args = json.dumps(fc.args or {}, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{fc.name}:{args}".encode()).hexdigest()
+        return f"{self.session_key}:{digest}"
+
+    @staticmethod
+    def tool_arguments(fc) -> tuple:
+        """Positional arguments for the CRM function behind ``fc``"""
+        args = fc.args or {}
+        if fc.name == "createLead":
+            return (
+                args.get("name", ""),
+                args.get("phone", ""),
+                args.get("city", ""),
+                args.get("source"),
+            )
+        if fc.name == "scheduleVisit":
+            return (
+                args.get("lead_id", ""),
+                args.get("visit_time", ""),
+                args.get("notes"),
+            )
+        if fc.name == "updateLeadStatus":
+            return (
+                args.get("lead_id", ""),
+                args.get("status", ""),
+                args.get("notes"),
+            )
+        return ()
+
+    async def execute_function_call(self, fc, timeout: float = None):
+        """Run one CRM function call, bounded by ``timeout`` (TOOL_CALL_TIMEOUT)"""
+        if timeout is None:
+            timeout = TOOL_CALL_TIMEOUT
+        function = TOOL_FUNCTIONS.get(fc.name)
+        if function is None:
+            log_event("tool.unknown", WARNING, name=fc.name)
+            return [(fc, None)]
+
+        started = asyncio.get_running_loop().time()
+        try:
+            with latency_budget(timeout):
+                result = await asyncio.wait_for(
+                    function(*self.tool_arguments(fc), idempotency_key=self.idempotency_key(fc)),
+                    timeout,
+                )
+        except asyncio.TimeoutError:
+            result = {"error": f"{fc.name} timed out after {TOOL_CALL_TIMEOUT}s"}
+            log_event("tool.timeout", WARNING, name=fc.name, args=fc.args, **crm.stats())
+        else:
+            log_event(
+                "tool.called",
+                name=fc.name,
+                args=fc.args,
+                result=result,
+                ms=round((asyncio.get_running_loop().time() - started) * 1000, 1),
+            )
+        finally:
+            tool_call_histogram(fc.name).observe(asyncio.get_running_loop().time() - started)
+
+        return [(fc, result)]
+
+    async def execute_batch(self, name, fcs):
+        """Run several calls of the same tool as one batch CRM request
+
+        If the batch request times out, each call is retried on its own in
+        whatever is left of the batch's TOOL_CALL_TIMEOUT, so the turn keeps
+        its deadline; with nothing left the calls report the timeout. The
+        calls keep their idempotency keys, which the batch sent per item, so
+        the CRM replays any item the batch did write.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = None
+        try:
+            with latency_budget(TOOL_CALL_TIMEOUT):
+                results = await asyncio.wait_for(
+                    BATCH_TOOL_FUNCTIONS[name](
+                        [self.tool_arguments(fc) for fc in fcs],
+                        [self.idempotency_key(fc) for fc in fcs],
+                    ),
+                    TOOL_CALL_TIMEOUT,
+                )
+        except asyncio.TimeoutError:
+            log_event("tool.timeout", WARNING, name=name, calls=len(fcs), **crm.stats())
+        else:
+            log_event(
+                "tool.batch_called",
+                name=name,
+                args=[fc.args for fc in fcs],
+                results=results,
+                ms=round((asyncio.get_running_loop().time() - started) * 1000, 1),
+            )
+        finally:
+            tool_call_histogram(name).observe(asyncio.get_running_loop().time() - started)
+
+        if results is None:
+            remaining = started + TOOL_CALL_TIMEOUT - loop.time()
+            if remaining <= 0:
+                return [(fc, {"error": f"{name} timed out after {TOOL_CALL_TIMEOUT}s"}) for fc in fcs]
+            retried = await asyncio.gather(*(self.execute_function_call(fc, remaining) for fc in fcs))
+            return [outcome for outcomes in retried for outcome in outcomes]
+        return list(zip(fcs, results))
 
     async def handle_tool_calls(self, tool_call):
-        """Handle CRM function calls from the model"""
+        """Handle CRM function calls from the model
+
+        Independent calls run concurrently, each with its own deadline, so a
+        turn costs the slowest call rather than the sum of all of them. A call
+        that misses its deadline is answered with a timeout error while the
+        others still return their results. Several calls of the same tool in
+        one turn are sent to the CRM as a single batch request.
+        """
+        from google.genai import types
+
         function_responses = []
+        started = time.monotonic()
 
+        calls_by_name = {}
         for fc in tool_call.function_calls:
-            print(f"\nTool called: {fc.name}")
-            print(f"Parameters: {fc.args}")
-
-            result = None
-
-            # Execute CRM functions
-            if fc.name == "createLead":
-                name = fc.args.get("name", "")
-                phone = fc.args.get("phone", "")
-                city = fc.args.get("city", "")
-                source = fc.args.get("source")
-                result = create_lead(name, phone, city, source)
-                print(f"Create lead result: {result}")
-
-            elif fc.name == "scheduleVisit":
-                lead_id = fc.args.get("lead_id", "")
-                visit_time = fc.args.get("visit_time", "")
-                notes = fc.args.get("notes")
-                result = schedule_visit(lead_id, visit_time, notes)
-                print(f"Schedule visit result: {result}")
-
-            elif fc.name == "updateLeadStatus":
-                lead_id = fc.args.get("lead_id", "")
-                status = fc.args.get("status", "")
-                notes = fc.args.get("notes")
-                result = update_lead_status(lead_id, status, notes)
-                print(f"Update lead status result: {result}")
-
-            # Create function response
-            function_response = types.FunctionResponse(
-                id=fc.id,
-                name=fc.name,
-                response=result or {"error": "Function not implemented"}
-            )
-            function_responses.append(function_response)
+            calls_by_name.setdefault(fc.name, []).append(fc)
+
+        pending = []
+        for name, fcs in calls_by_name.items():
+            if len(fcs) > 1 and name in BATCH_TOOL_FUNCTIONS:
+                pending.append(self.execute_batch(name, fcs))
+            else:
+                pending.extend(self.execute_function_call(fc) for fc in fcs)
+
+        for next_done in asyncio.as_completed(pending):
+            for fc, result in await next_done:
+                # Create function response
+                function_response = types.FunctionResponse(
+                    id=fc.id,
+                    name=fc.name,
+                    response=result or {"error": "Function not implemented"}
+                )
+                function_responses.append(function_response)
 
         # Send all function responses back to the model
         await self.session.send_tool_response(function_responses=function_responses)
+        TOOL_TURN.observe(time.monotonic() - started)
 
     async def send_text(self):
         while True:
             text = await asyncio.to_thread(input, "message > ")
             if text.lower() == "q":
                 break
-            await self.session.send(input=text or ".", end_of_turn=True)
+            await self.send_user_text(text)
+
+    async def send_user_text(self, text):
+        """Queue typed text behind the caller's audio; kept across reconnects like it"""
+        await self.out_queue.put((time.monotonic(), UserText(text or ".")))
 
     async def send_realtime(self):
+        """Send caller audio and text, holding it in the gap buffer while disconnected"""
         while True:
-            msg = await self.out_queue.get()
+            entry = await self.out_queue.get()
+            if entry is not None:  # None: reconnected, flush the gap
+                self._gap.append(entry)
+                self._gap_bytes += self._entry_bytes(entry)
+            if not self.connected.is_set():
+                self._trim_gap()
+                continue
+            while self._gap:
+                try:
+                    await self.send_uplink(*self._gap[0])
+                except Exception as e:
+                    if not connection_lost(e):
+                        raise
+                    # receive_audio sees the same failure and reconnects
+                    break
+                self._gap_bytes -= self._entry_bytes(self._gap.popleft())
+
+    async def send_uplink(self, captured, msg):
+        if isinstance(msg, ActivityMarker):
+            await self.send_activity(msg)
+        elif isinstance(msg, UserText):
+            await self.session.send(input=msg.text, end_of_turn=True)
+        else:
             await self.session.send(input=msg)
+            CAPTURE_TO_SEND.observe(time.monotonic() - captured)
+
+    @staticmethod
+    def _entry_bytes(entry) -> int:
+        msg = entry[1]
+        return len(msg["data"]) if isinstance(msg, dict) else 0
+
+    def _trim_gap(self):
+        """Drop the oldest buffered audio beyond ``RECONNECT_BUFFER_SECONDS``
+
+        Typed text is never dropped; it stays at the front of the buffer.
+        """
+        texts = []
+        while self._gap_bytes > self._gap_limit:
+            entry = self._gap.popleft()
+            if isinstance(entry[1], UserText):
+                texts.append(entry)
+                continue
+            dropped = self._entry_bytes(entry)
+            self._gap_bytes -= dropped
+            self.gap_dropped_bytes += dropped
+        self._gap.extendleft(reversed(texts))
+
+    async def send_activity(self, marker: ActivityMarker):
+        """Speech start/end from the VAD; sent to the model in ``drop`` mode,
+        where silence is not forwarded for the server to detect turns in"""
+        log_event(f"vad.speech_{marker.kind}", DEBUG)
+        if self.vad.mode != VAD_DROP:
+            return
+        from google.genai import types
+
+        if marker.kind == ACTIVITY_START:
+            await self.session.send_realtime_input(activity_start=types.ActivityStart())
+        else:
+            await self.session.send_realtime_input(activity_end=types.ActivityEnd())
 
     async def listen_audio(self):
-        mic_info = pya.get_default_input_device_info()
-        self.audio_stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=SEND_SAMPLE_RATE,
-            input=True,
-            input_device_index=mic_info["index"],
-            frames_per_buffer=CHUNK_SIZE,
-        )
-        kwargs = {"exception_on_overflow": False} if __debug__ else {}
-        
-        while True:
-            data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, **kwargs)
-            await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
+        if not self.devices_started:
+            await self.source.start()
+        while (data := await self.source.read()) is not None:
+            captured = time.monotonic()
+            if self.vad is None:
+                await self.out_queue.put((captured, {"data": data, "mime_type": "audio/pcm"}))
+                continue
+            for item in self.vad.process(data):
+                if isinstance(item, bytes):
+                    item = {"data": item, "mime_type": "audio/pcm"}
+                elif item.kind == ACTIVITY_START:
+                    self.speech_started_at = item.at
+                await self.out_queue.put((captured, item))
+            if self.vad.active:
+                self._awaiting_response = True
 
     async def receive_audio(self):
         """Background task to read from websocket and handle tool calls"""
         while True:
             turn = self.session.receive()
             async for response in turn:
+                # Keep the latest handle for resuming this conversation
+                update = response.session_resumption_update
+                if update and update.resumable and update.new_handle:
+                    self.resumption_handle = update.new_handle
+                if response.go_away:
+                    raise SessionGoingAway(response.go_away.time_left)
+
+                # The caller spoke over the model: stop talking now
+                if response.server_content and response.server_content.interrupted:
+                    await self.interrupt_playback()
+
                 # Handle tool calls
                 if response.tool_call:
                     await self.handle_tool_calls(response.tool_call)
                     continue
                 
-                # Handle audio data
+                # Handle audio data; never waits, so the messages above are
+                # seen even while playback is full
                 if data := response.data:
-                    self.audio_in_queue.put_nowait(data)
+                    if not self._in_response:
+                        self.response_started()
+                    self.model_audio.put_nowait(data)
                     continue
                 
                 # Handle text responses
                 if text := response.text:
-                    print(text, end="")
+                    await self.handle_text(text)
+
+            # Turn complete: play out what is left of the answer
+            self.model_audio.put_nowait(_TURN_COMPLETE)
+            self._in_response = False
+
+    async def feed_playback(self):
+        """Move model audio into the jitter buffer, waiting while it is full"""
+        while True:
+            data = await self.model_audio.get()
+            if data is _TURN_COMPLETE:
+                self.playback.flush()
+            else:
+                await self.playback.write(data)
+
+    def response_started(self):
+        """First audio of a model response has arrived"""
+        now = time.monotonic()
+        self._in_response = True
+        self._response_audio_at = now
+        if self._awaiting_response and self.vad.last_speech_at is not None:
+            RESPONSE_LATENCY.observe(now - self.vad.last_speech_at)
+        self._awaiting_response = False
+
+    async def handle_text(self, text):
+        print(text, end="")
 
-            # Handle interruptions - empty audio queue
-            while not self.audio_in_queue.empty():
-                self.audio_in_queue.get_nowait()
+    async def interrupt_playback(self):
+        """Barge-in: drop buffered model audio and abort the write in flight"""
+        while not self.model_audio.empty():
+            data = self.model_audio.get_nowait()
+            if data is not _TURN_COMPLETE:
+                self.playback.bytes_dropped += len(data)
+        self.playback.clear()  # also drops the audio of a write waiting for space
+        self._in_response = False
+        self._response_audio_at = None
+        if self._write_task is not None:
+            self._write_task.cancel()
+        await self.sink.interrupt()
+        stopped = time.monotonic()
+
+        self.interruptions += 1
+        fields = {}
+        if self.speech_started_at is not None:
+            BARGE_IN.observe(stopped - self.speech_started_at)
+            barge_in_ms = round((stopped - self.speech_started_at) * 1000, 1)
+            self.barge_in_ms.append(barge_in_ms)
+            fields["barge_in_ms"] = barge_in_ms
+            self.speech_started_at = None
+        log_event("playback.interrupted", session_id=self.session_key, **fields)
+        await self.handle_interrupted()
+
+    async def handle_interrupted(self):
+        pass
 
     async def play_audio(self):
-        stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=RECEIVE_SAMPLE_RATE,
-            output=True,
-        )
+        if not self.devices_started:
+            await self.sink.start()
         while True:
-            bytestream = await self.audio_in_queue.get()
-            await asyncio.to_thread(stream.write, bytestream)
+            if self.sink.realtime:
+                frame = await self.playback.read()
+            else:
+                frame = await self.playback.read_available()
+            if self._response_audio_at is not None:
+                PLAYBACK_START.observe(time.monotonic() - self._response_audio_at)
+                self._response_audio_at = None
+            self._write_task = asyncio.create_task(self.sink.write(frame))
+            try:
+                await self._write_task
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # Only the write was cancelled, by interrupt_playback()
+            finally:
+                self._write_task = None
 
-    async def run(self):
+    def start_tasks(self, tg):
+        """Start the session's tasks; the session ends when the returned one does"""
+        listen_task = tg.create_task(self.listen_audio())
+        tg.create_task(self.send_realtime())
+        tg.create_task(self.stay_connected())
+        tg.create_task(self.feed_playback())
+        tg.create_task(self.play_audio())
+        if self.source.interactive:
+            return tg.create_task(self.send_text())
+        return listen_task
+
+    def live_config(self):
+        from google.genai import types
+
+        # Ask for resumption handles; after a reconnect, resume with the latest
+        update = {"session_resumption": types.SessionResumptionConfig(handle=self.resumption_handle)}
+        if self.vad is not None and self.vad.mode == VAD_DROP:
+            # Turns are delimited by our activity markers, not by server-side VAD
+            update["realtime_input_config"] = types.RealtimeInputConfig(
+                automatic_activity_detection=types.AutomaticActivityDetection(disabled=True)
+            )
+        return get_config().model_copy(update=update)
+
+    async def stay_connected(self):
+        """Run receive_audio on a Live API connection, reconnecting if it drops"""
+        lost_at = None
+        attempt = 0
+        while True:
+            resuming = self.resumption_handle is not None
+            established = False
+            try:
+                async with get_client().aio.live.connect(model=MODEL, config=self.live_config()) as session:
+                    established = True
+                    self.session = session
+                    self.connected.set()
+                    if lost_at is not None:
+                        self.reconnected(lost_at, resuming)
+                        lost_at, attempt = None, 0
+                    with suppress(asyncio.QueueFull):
+                        self.out_queue.put_nowait(None)  # wake send_realtime
+                    await self.receive_audio()
+            except Exception as e:
+                self.connected.clear()
+                if not connection_lost(e):
+                    if not (resuming and not established):
+                        raise
+                    # The handle was refused (e.g. expired): start a new conversation
+                    log_event("session.resume_failed", WARNING, session_id=self.session_key, error=repr(e))
+                    self.resumption_handle = None
+
+                now = time.monotonic()
+                if lost_at is None:
+                    lost_at = now
+                    log_event("session.disconnected", WARNING, session_id=self.session_key, error=repr(e))
+                elif now - lost_at > RECONNECT_MAX_SECONDS:
+                    raise
+
+                # A GoAway is a planned handover: reconnect straight away
+                if isinstance(e, SessionGoingAway) and attempt == 0:
+                    delay = 0
+                else:
+                    delay = min(2.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def reconnected(self, lost_at: float, resumed: bool):
+        gap = time.monotonic() - lost_at
+        self.reconnects += 1
+        RECONNECT_GAP.observe(gap)
+        log_event(
+            "session.reconnected",
+            session_id=self.session_key,
+            resumed=resumed,
+            gap_ms=round(gap * 1000, 1),
+            buffered_ms=round(self._gap_bytes / (2 * self.source.sample_rate) * 1000, 1),
+            dropped_ms=round(self.gap_dropped_bytes / (2 * self.source.sample_rate) * 1000, 1),
+        )
+
+    async def run_session(self):
+        """One Live API session; shared resources (CRM pool, event log) stay open"""
         try:
-            async with (
-                client.aio.live.connect(model=MODEL, config=CONFIG) as session,
-                asyncio.TaskGroup() as tg,
-            ):
-                self.session = session
-                self.audio_in_queue = asyncio.Queue()
+            async with asyncio.TaskGroup() as tg:
+                self.playback = JitterBuffer(self.sink.sample_rate)
                 self.out_queue = asyncio.Queue(maxsize=5)
+                self.model_audio = asyncio.Queue()
 
-                send_text_task = tg.create_task(self.send_text())
-                tg.create_task(self.send_realtime())
-                tg.create_task(self.listen_audio())
-                tg.create_task(self.receive_audio())
-                tg.create_task(self.play_audio())
-
-                await send_text_task
-                raise asyncio.CancelledError("User requested exit")
+                await self.start_tasks(tg)
+                raise asyncio.CancelledError("Session ended")
 
         except asyncio.CancelledError:
             pass
         except ExceptionGroup as EG:
-            if self.audio_stream:
-                self.audio_stream.close()
             traceback.print_exception(EG)
+        finally:
+            await self.source.close()
+            await self.sink.close()
+            if self.vad is not None:
+                log_event("vad.stats", session_id=self.session_key, **self.vad.stats.as_dict())
+            if self.playback is not None:
+                log_event(
+                    "playback.stats",
+                    session_id=self.session_key,
+                    interruptions=self.interruptions,
+                    **self.playback.stats(),
+                )
+            if self.reconnects:
+                log_event(
+                    "session.reconnect_stats",
+                    session_id=self.session_key,
+                    reconnects=self.reconnects,
+                    dropped_ms=round(self.gap_dropped_bytes / (2 * self.source.sample_rate) * 1000, 1),
+                )
+
+    async def start_up(self):
+        """Open the audio devices while the Live API client loads in a thread"""
+        warming = asyncio.create_task(asyncio.to_thread(warm_up))
+        with startup_phase("devices"):
+            await asyncio.gather(self.source.start(), self.sink.start())
+        self.devices_started = True
+        await warming
+        log_event(
+            "startup.ready",
+            ready_ms=round((time.perf_counter() - _import_started) * 1000, 1),
+            **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in STARTUP_TIMES.items()},
+        )
+
+    async def run(self):
+        metrics_server = await serve_metrics() if METRICS_PORT else None
+        try:
+            await self.start_up()
+            await self.run_session()
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            log_latency_stats()
+            await crm.aclose()
+            shutdown_event_log()
+
+
+def log_latency_stats():
+    """Log p50/p95/p99 of every voice latency histogram"""
+    log_event(
+        "latency.stats",
+        **{
+            name.removeprefix("voice_").removesuffix("_seconds"): REGISTRY.summary(name)
+            for name in (
+                "voice_capture_to_send_seconds",
+                "voice_response_latency_seconds",
+                "voice_playback_start_seconds",
+                "voice_tool_turn_seconds",
+                "voice_tool_call_seconds",
+                "voice_barge_in_seconds",
+                "voice_reconnect_gap_seconds",
+            )
+        },
+    )
+
+
+STARTUP_TIMES["import"] = time.perf_counter() - _import_started
 
 
 if __name__ == "__main__":
@@ -385,5 +1021,9 @@ if __name__ == "__main__":
     print("\nType 'q' to quit\n")
     print("=" * 60)
 
+    # Tool-call events go through the background event log, rendered for the
+    # console by default (EVENT_LOG_FORMAT=json for machine-readable lines)
+    setup_event_log(default_format="pretty")
+
     main = AudioLoop()
     asyncio.run(main.run())
\ No newline at end of file
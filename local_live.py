@@ -0,0 +1,378 @@
+"""
+Local stand-in for the Gemini Live API, for offline end-to-end benchmarks
+
+``python local_live.py`` serves a websocket endpoint that speaks the Live
+API's JSON message format (``setup`` / ``realtimeInput`` / ``toolResponse``
+in, ``setupComplete`` / ``serverContent`` / ``toolCall`` /
+``sessionResumptionUpdate`` out). Point the bot at it with
+``LIVE_BACKEND=local`` (and ``LOCAL_LIVE_URL``); ``LocalLiveClient`` then
+takes the place of ``genai.Client``.
+
+The server listens to the caller's audio. A turn ends after
+``turn_silence_ms`` without speech, on an ``activityEnd``, or on a typed
+message. The next scripted turn then plays back. A turn is a list of
+steps:
+
+- ``{"tool_call": "createLead", "args": {...}}`` sends a tool call and waits
+  for the response. ``"{lead_id}"``-style placeholders in later args are
+  filled from earlier tool responses. If no response comes within
+  ``TOOL_RESPONSE_TIMEOUT`` seconds, the call is cancelled
+  (``toolCallCancellation``) and the turn ends with an error text.
+- ``{"audio_ms": 1200, "chunk_ms": 40, "pace": 1.0}`` sends model audio in
+  chunks, paced at ``pace`` x real time (0 sends it all at once).
+- ``{"text": "..."}`` sends model text.
+- ``{"delay_ms": 300}`` waits, e.g. to model thinking time.
+- ``{"interrupt": true}`` reports an interruption.
+
+If the caller starts speaking while audio is being sent, the server reports
+an interruption and drops the rest of the turn, like the real API does.
+Scripts are JSON files (``LOCAL_LIVE_SCRIPT``); ``DEFAULT_SCRIPT`` walks
+through the three CRM tools.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import numpy as np
+from google.genai import types
+from websockets.asyncio.client import connect as ws_connect
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from audio_io import RECEIVE_SAMPLE_RATE, SEND_SAMPLE_RATE
+from event_log import log_event, setup_event_log, shutdown_event_log
+
+LOCAL_LIVE_HOST = os.getenv("LOCAL_LIVE_HOST", "127.0.0.1")
+LOCAL_LIVE_PORT = int(os.getenv("LOCAL_LIVE_PORT", "8766"))
+LOCAL_LIVE_URL = os.getenv("LOCAL_LIVE_URL", f"ws://{LOCAL_LIVE_HOST}:{LOCAL_LIVE_PORT}")
+LOCAL_LIVE_SCRIPT = os.getenv("LOCAL_LIVE_SCRIPT", "")
+
+# Caller audio louder than this counts as speech
+SPEECH_DBFS = -45.0
+TOOL_RESPONSE_TIMEOUT = 10.0
+
+DEFAULT_SCRIPT = {
+    "turn_silence_ms": 500,
+    "turns": [
+        [
+            {"delay_ms": 150},
+            {
+                "tool_call": "createLead",
+                "args": {"name": "Asha Rao", "phone": "9876543210", "city": "Pune", "source": "Website"},
+            },
+            {"audio_ms": 1200},
+        ],
+        [
+            {"delay_ms": 150},
+            {
+                "tool_call": "scheduleVisit",
+                "args": {"lead_id": "{lead_id}", "visit_time": "2026-11-02T10:00:00", "notes": "Site visit"},
+            },
+            {"audio_ms": 1000},
+        ],
+        [
+            {"delay_ms": 150},
+            {"tool_call": "updateLeadStatus", "args": {"lead_id": "{lead_id}", "status": "IN_PROGRESS"}},
+            {"audio_ms": 800},
+        ],
+    ],
+}
+
+
+def load_script(path: str = LOCAL_LIVE_SCRIPT) -> dict:
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path) as f:
+        return json.load(f)
+
+
+def _tone(ms: float, rate: int = RECEIVE_SAMPLE_RATE) -> bytes:
+    t = np.arange(int(rate * ms / 1000)) / rate
+    return (np.sin(2 * np.pi * 220 * t) * 6000).astype("<i2").tobytes()
+
+
+def _is_speech(pcm: bytes) -> bool:
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if not len(samples):
+        return False
+    rms = float(np.sqrt(np.mean(samples * samples)))
+    return 20 * np.log10(rms + 1e-10) > SPEECH_DBFS
+
+
+def _fill(value, known: dict):
+    """Substitute ``{name}`` placeholders from earlier tool responses"""
+    if isinstance(value, str):
+        try:
+            return value.format_map(known)
+        except (KeyError, ValueError):
+            return value
+    if isinstance(value, dict):
+        return {k: _fill(v, known) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, known) for v in value]
+    return value
+
+
+class LocalLiveSession:
+    """Server side of one connection: tracks caller turns and plays the script"""
+
+    def __init__(self, websocket, script: dict, server: "LocalLiveServer"):
+        self.websocket = websocket
+        self.turns = itertools.cycle(script["turns"])
+        self.turn_silence = script.get("turn_silence_ms", 500) / 1000
+        self.server = server
+        self.known = {}  # fields from tool responses, for placeholders
+        self.tool_responses = {}  # call id -> Future
+        self.resumption = False
+        self.speaking = False
+        self.last_speech_at = 0.0
+        self.turn_ended = asyncio.Event()
+        self.responding = None  # task playing the current turn
+        self.call_ids = itertools.count(1)
+
+    async def send(self, message: dict):
+        await self.websocket.send(json.dumps(message))
+
+    async def run(self):
+        setup = json.loads(await self.websocket.recv()).get("setup", {})
+        self.resumption = "sessionResumption" in setup
+        await self.send({"setupComplete": {}})
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(self.detect_turns()), tg.create_task(self.respond())]
+            async for raw in self.websocket:
+                await self.handle(json.loads(raw))
+            for task in tasks:  # caller hung up
+                task.cancel()
+
+    async def handle(self, message: dict):
+        if realtime := message.get("realtimeInput"):
+            for chunk in realtime.get("mediaChunks", []) + [realtime.get("audio") or {}]:
+                if data := chunk.get("data"):
+                    self.server.audio_bytes += len(data) * 3 // 4
+                    if _is_speech(base64.b64decode(data)):
+                        await self.speech()
+            if "activityStart" in realtime:
+                await self.speech()
+            if "activityEnd" in realtime:
+                self.end_turn()
+        elif content := message.get("clientContent"):
+            if content.get("turnComplete"):
+                self.end_turn()
+        elif tool_response := message.get("toolResponse"):
+            for response in tool_response.get("functionResponses", []):
+                future = self.tool_responses.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response.get("response") or {})
+
+    async def speech(self):
+        self.last_speech_at = time.monotonic()
+        if not self.speaking:
+            self.speaking = True
+            if self.responding is not None and not self.responding.done():
+                # Barge-in: the caller talks over the model
+                self.responding.cancel()
+                await self.send({"serverContent": {"interrupted": True}})
+                self.server.interruptions += 1
+
+    def end_turn(self):
+        self.speaking = False
+        self.turn_ended.set()
+
+    async def detect_turns(self):
+        while True:
+            await asyncio.sleep(0.02)
+            if self.speaking and time.monotonic() - self.last_speech_at > self.turn_silence:
+                self.end_turn()
+
+    async def respond(self):
+        while True:
+            await self.turn_ended.wait()
+            self.turn_ended.clear()
+            self.responding = asyncio.create_task(self.play_turn(next(self.turns)))
+            try:
+                await self.responding
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+            except asyncio.TimeoutError:
+                # The client never answered a tool call: end the turn with an error
+                self.server.tool_timeouts += 1
+                await self.send({"serverContent": {"modelTurn": {"parts": [{"text": "Tool call timed out"}]}}})
+            self.server.turns += 1
+            await self.send({"serverContent": {"turnComplete": True}})
+            if self.resumption:
+                await self.send({
+                    "sessionResumptionUpdate": {"newHandle": f"local-{self.server.turns}", "resumable": True}
+                })
+
+    async def play_turn(self, steps: list):
+        for step in steps:
+            if "delay_ms" in step:
+                await asyncio.sleep(step["delay_ms"] / 1000)
+            elif "tool_call" in step:
+                await self.tool_call(step["tool_call"], _fill(step.get("args", {}), self.known))
+            elif "audio_ms" in step:
+                await self.play_audio(step["audio_ms"], step.get("chunk_ms", 40), step.get("pace", 1.0))
+            elif "text" in step:
+                await self.send({"serverContent": {"modelTurn": {"parts": [{"text": step["text"]}]}}})
+            elif step.get("interrupt"):
+                await self.send({"serverContent": {"interrupted": True}})
+                self.server.interruptions += 1
+
+    async def tool_call(self, name: str, args: dict):
+        call_id = f"call-{next(self.call_ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self.tool_responses[call_id] = future
+        started = time.monotonic()
+        await self.send({"toolCall": {"functionCalls": [{"id": call_id, "name": name, "args": args}]}})
+        try:
+            response = await asyncio.wait_for(future, TOOL_RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.tool_responses.pop(call_id, None)
+            await self.send({"toolCallCancellation": {"ids": [call_id]}})
+            raise
+        self.server.tool_calls += 1
+        self.server.tool_seconds += time.monotonic() - started
+        if isinstance(response, dict):
+            self.known.update({k: v for k, v in response.items() if isinstance(v, (str, int, float))})
+
+    async def play_audio(self, ms: float, chunk_ms: float, pace: float):
+        pcm = _tone(ms)
+        step = int(RECEIVE_SAMPLE_RATE * chunk_ms / 1000) * 2
+        for i in range(0, len(pcm), step):
+            chunk = base64.b64encode(pcm[i:i + step]).decode()
+            await self.send({
+                "serverContent": {
+                    "modelTurn": {"parts": [{"inlineData": {"mimeType": "audio/pcm;rate=24000", "data": chunk}}]}
+                }
+            })
+            if pace:
+                await asyncio.sleep(chunk_ms / 1000 / pace)
+
+
+class LocalLiveServer:
+    """Websocket server running a LocalLiveSession per connection"""
+
+    def __init__(self, script: dict = None):
+        self.script = script or load_script()
+
+        # Counters for monitoring
+        self.sessions = 0
+        self.turns = 0
+        self.tool_calls = 0
+        self.tool_seconds = 0.0
+        self.tool_timeouts = 0
+        self.interruptions = 0
+        self.audio_bytes = 0
+
+    async def handle(self, websocket):
+        self.sessions += 1
+        try:
+            await LocalLiveSession(websocket, self.script, self).run()
+        except* ConnectionClosed:
+            pass  # caller hung up mid-send
+
+    def stats(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "turns": self.turns,
+            "tool_calls": self.tool_calls,
+            "tool_ms": round(self.tool_seconds / self.tool_calls * 1000, 1) if self.tool_calls else None,
+            "tool_timeouts": self.tool_timeouts,
+            "interruptions": self.interruptions,
+            "caller_audio_seconds": round(self.audio_bytes / (2 * SEND_SAMPLE_RATE), 1),
+        }
+
+    def serve(self, host: str = LOCAL_LIVE_HOST, port: int = LOCAL_LIVE_PORT):
+        """``async with server.serve(...) as ws_server:``"""
+        return serve(self.handle, host, port, max_size=None)
+
+
+class LocalLiveConnection:
+    """Client side: the subset of the genai live session used by AudioLoop"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def _send(self, message: dict):
+        await self.websocket.send(json.dumps(message))
+
+    async def send(self, input=None, end_of_turn=False):
+        if isinstance(input, dict):
+            blob = {"mimeType": input["mime_type"], "data": base64.b64encode(input["data"]).decode()}
+            await self._send({"realtimeInput": {"mediaChunks": [blob]}})
+        else:
+            turn = {"role": "user", "parts": [{"text": input}]}
+            await self._send({"clientContent": {"turns": [turn], "turnComplete": end_of_turn}})
+
+    async def send_realtime_input(self, activity_start=None, activity_end=None, audio=None):
+        realtime = {}
+        if activity_start is not None:
+            realtime["activityStart"] = {}
+        if activity_end is not None:
+            realtime["activityEnd"] = {}
+        if audio is not None:
+            realtime["audio"] = audio.model_dump(mode="json", by_alias=True, exclude_none=True)
+        await self._send({"realtimeInput": realtime})
+
+    async def send_tool_response(self, function_responses):
+        responses = [
+            r.model_dump(mode="json", by_alias=True, exclude_none=True) for r in function_responses
+        ]
+        await self._send({"toolResponse": {"functionResponses": responses}})
+
+    async def receive(self):
+        """Messages up to the end of the current turn, like genai's receive()"""
+        while True:
+            message = types.LiveServerMessage.model_validate_json(await self.websocket.recv())
+            yield message
+            if message.server_content and message.server_content.turn_complete:
+                return
+
+
+class LocalLiveClient:
+    """Stands in for ``genai.Client`` (``client.aio.live.connect``)"""
+
+    def __init__(self, url: str = LOCAL_LIVE_URL):
+        self.url = url
+        self.aio = SimpleNamespace(live=SimpleNamespace(connect=self.connect))
+
+    @asynccontextmanager
+    async def connect(self, model: str, config: types.LiveConnectConfig):
+        setup = {"model": model, **config.model_dump(mode="json", by_alias=True, exclude_none=True)}
+        async with ws_connect(self.url, max_size=None) as websocket:
+            await websocket.send(json.dumps({"setup": setup}))
+            await websocket.recv()  # setupComplete
+            yield LocalLiveConnection(websocket)
+
+
+async def main(host: str, port: int, script_path: str):
+    server = LocalLiveServer(load_script(script_path))
+    async with server.serve(host, port):
+        log_event("local_live.listening", host=host, port=port)
+        try:
+            await asyncio.Future()
+        finally:
+            log_event("local_live.stats", **server.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini Live stand-in")
+    parser.add_argument("--host", default=LOCAL_LIVE_HOST)
+    parser.add_argument("--port", type=int, default=LOCAL_LIVE_PORT)
+    parser.add_argument("--script", default=LOCAL_LIVE_SCRIPT, help="JSON script (default: built-in)")
+    args = parser.parse_args()
+    setup_event_log(default_format="pretty")
+    try:
+        asyncio.run(main(args.host, args.port, args.script))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_event_log()
@@ -0,0 +1,280 @@
+"""
+Latency histograms with Prometheus text exposition
+
+``histogram(name, help, **labels)`` returns the histogram for that name and
+label set, created on first use in the process-wide ``REGISTRY``.
+``observe(seconds)`` is a bisect and two additions, cheap enough for
+per-chunk audio paths. ``quantile(q)`` estimates p50/p95/p99 from the
+buckets (the same interpolation as PromQL's ``histogram_quantile``) for
+logs; ``REGISTRY.render()`` produces the text served on ``/metrics``.
+``gauge()`` and ``counter()`` register a function that is read at scrape
+time, for state another object already keeps (e.g. the CRM circuit breaker).
+
+``MetricsMiddleware`` times every HTTP request of an ASGI app, and
+``serve_metrics()`` runs a minimal ``/metrics`` HTTP endpoint for processes
+that have no web server of their own (the voice bot and gateway).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from event_log import log_event
+
+# Port for the bot's / gateway's /metrics endpoint; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Seconds; fine enough to tell a 5 ms CRM call from a 20 ms one and a
+# 300 ms voice response from an 800 ms one
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25,
+    0.35, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (one label set)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        with self._lock:
+            counts = list(self._counts)
+        total = 0
+        out = []
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile, interpolating linearly within a bucket"""
+        buckets = self.cumulative()
+        total = buckets[-1][1]
+        if total == 0:
+            return None
+        rank = q * total
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in buckets:
+            if count >= rank:
+                if bound == float("inf"):
+                    return lower_bound  # beyond the largest bucket
+                in_bucket = count - lower_count
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / in_bucket
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+    def summary(self) -> dict:
+        """Count and p50/p95/p99 in milliseconds, for log events"""
+        out = {"count": self.count}
+        for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            value = self.quantile(q)
+            out[name] = None if value is None else round(value * 1000, 1)
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _label_set(labels: dict) -> LabelSet:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """Histograms by name and label set, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._help: Dict[str, str] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        # name -> ("gauge" | "counter", {label set: function read at scrape time})
+        self._sampled: Dict[str, Tuple[str, Dict[LabelSet, Callable[[], float]]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str = "", buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        key = _label_set(labels)
+        family = self._histograms.get(name)
+        if family is not None:
+            found = family.get(key)
+            if found is not None:
+                return found
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            self._help.setdefault(name, help)
+            return family.setdefault(key, Histogram(buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], **labels):
+        """Report ``read()`` as a gauge on every scrape"""
+        self._register_sampled("gauge", name, help, read, labels)
+
+    def counter(self, name: str, help: str, read: Callable[[], float], **labels):
+        """Report ``read()`` (a running total) as a counter on every scrape"""
+        self._register_sampled("counter", name, help, read, labels)
+
+    def _register_sampled(self, kind, name, help, read, labels):
+        with self._lock:
+            self._help.setdefault(name, help)
+            family = self._sampled.setdefault(name, (kind, {}))[1]
+            family[_label_set(labels)] = read
+
+    def get(self, name: str, **labels) -> Optional[Histogram]:
+        key = _label_set(labels)
+        return self._histograms.get(name, {}).get(key)
+
+    def summary(self, name: str) -> dict:
+        """p50/p95/p99 of every label set of ``name``, keyed by label values"""
+        family = self._histograms.get(name, {})
+        return {
+            ",".join(v for _, v in key) or name: histogram.summary()
+            for key, histogram in list(family.items())
+        }
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._sampled.clear()
+            self._help.clear()
+
+    def render(self) -> str:
+        lines = []
+        for name, family in sorted(self._histograms.items()):
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(family.items()):
+                labels = [f'{k}="{_escape(v)}"' for k, v in key]
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = ",".join(labels + [f'le="{le}"'])
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {count}")
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {histogram.sum}")
+                lines.append(f"{name}_count{suffix} {histogram.count}")
+        for name, (kind, family) in sorted(self._sampled.items()):
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, read in sorted(family.items()):
+                labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                suffix = "{" + labels + "}" if labels else ""
+                lines.append(f"{name}{suffix} {read()}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+
+def histogram(name: str, help: str = "", **labels) -> Histogram:
+    return REGISTRY.histogram(name, help, **labels)
+
+
+def gauge(name: str, help: str, read: Callable[[], float], **labels):
+    REGISTRY.gauge(name, help, read, **labels)
+
+
+def counter(name: str, help: str, read: Callable[[], float], **labels):
+    REGISTRY.counter(name, help, read, **labels)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording ``http_request_duration_seconds`` per route
+
+    Requests are labelled with the route template (``/crm/leads/{lead_id}``),
+    not the raw path, so the number of label sets stays bounded.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.registry.histogram(
+                "http_request_duration_seconds",
+                "HTTP request latency by route",
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            ).observe(time.perf_counter() - start)
+
+
+async def _handle_scrape(reader, writer, registry):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # skip headers
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, body, content_type = "200 OK", registry.render().encode(), CONTENT_TYPE
+        else:
+            status, body, content_type = "404 Not Found", b"Not found\n", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_metrics(
+    host: str = METRICS_HOST,
+    port: int = METRICS_PORT,
+    registry: MetricsRegistry = REGISTRY,
+) -> asyncio.AbstractServer:
+    """Serve ``GET /metrics`` on ``host:port`` until the server is closed"""
+    server = await asyncio.start_server(lambda r, w: _handle_scrape(r, w, registry), host, port)
+    log_event("metrics.listening", host=host, port=server.sockets[0].getsockname()[1])
+    return server
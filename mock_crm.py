@@ -1,18 +1,84 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from uuid import uuid4
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+from contextlib import asynccontextmanager
+from functools import partial
+import base64
+import hashlib
 import csv
+import json
 import os
 from pathlib import Path
 
-app = FastAPI(title="Mock CRM")
+import anyio.to_thread
+
+from crm_idempotency import IdempotencyCache, IdempotencyConflict
+from crm_snapshot import SnapshotScheduler, recover
+from crm_storage import VersionConflict, create_storage
+from crm_writer import CSVWriteBehind
+from event_log import WARNING, log_event, setup_event_log, shutdown_event_log
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
 
 # CSV file paths
 LEADS_CSV = "crm_leads.csv"
 VISITS_CSV = "crm_visits.csv"
 UPDATES_CSV = "crm_updates.csv"
+CSV_PATHS = {"leads": LEADS_CSV, "visits": VISITS_CSV, "updates": UPDATES_CSV}
+
+# Snapshot of the in-memory store used for fast restarts
+SNAPSHOT_PATH = os.getenv("CRM_SNAPSHOT_PATH", "crm_snapshot.msgpack")
+SNAPSHOT_INTERVAL = float(os.getenv("CRM_SNAPSHOT_INTERVAL", "300"))
+
+# Length of a visit; a lead's visits may not start closer together (0 = no check)
+VISIT_SLOT_MINUTES = float(os.getenv("CRM_VISIT_SLOT_MINUTES", "60"))
+
+# Threads running the sync route handlers (anyio's default is 40)
+WORKER_THREADS = int(os.getenv("CRM_WORKER_THREADS", "0"))
+
+# Write-behind CSV persistence (rows are group-committed by a background thread)
+csv_writer = CSVWriteBehind(
+    max_queue=int(os.getenv("CRM_WRITE_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("CRM_FLUSH_BATCH_SIZE", "256")),
+    flush_interval=float(os.getenv("CRM_FLUSH_INTERVAL_MS", "50")) / 1000,
+    fsync=os.getenv("CRM_FSYNC", "interval"),
+)
+
+# Structured event log (JSON lines on stdout; EVENT_LOG_FORMAT=pretty for humans)
+setup_event_log()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WORKER_THREADS:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    csv_writer.start()
+    if storage.in_memory:
+        # Rebuild the store from the last snapshot plus the CSV log tail
+        stats = recover(storage, SNAPSHOT_PATH, CSV_PATHS)
+        log_event(
+            "storage.recovered",
+            leads=stats.leads,
+            visits=stats.visits,
+            seconds=round(stats.seconds, 3),
+            source="snapshot" if stats.from_snapshot else "log",
+            replayed_rows=stats.replayed_rows,
+        )
+        snapshots.start()
+    yield
+    if storage.in_memory:
+        snapshots.stop()
+        snapshots.snapshot()
+    # Drain every queued row before the process exits
+    csv_writer.close()
+    storage.close()
+    shutdown_event_log()
+
+app = FastAPI(title="Mock CRM", lifespan=lifespan)
+# Latency histogram per route, served in Prometheus format on /metrics
+app.add_middleware(MetricsMiddleware)
 
 # Initialize CSV files with headers if they don't exist
 def initialize_csv_files():
@@ -21,19 +87,19 @@ def initialize_csv_files():
         with open(LEADS_CSV, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['lead_id', 'name', 'phone', 'city', 'source', 'status', 'created_at'])
-        print(f"✓ Created {LEADS_CSV}")
+        log_event("storage.csv_created", path=LEADS_CSV)
 
     if not os.path.exists(VISITS_CSV):
         with open(VISITS_CSV, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             writer.writerow(['visit_id', 'lead_id', 'visit_time', 'notes', 'status', 'created_at'])
-        print(f"✓ Created {VISITS_CSV}")
+        log_event("storage.csv_created", path=VISITS_CSV)
 
     if not os.path.exists(UPDATES_CSV):
         with open(UPDATES_CSV, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(['lead_id', 'old_status', 'new_status', 'notes', 'updated_at'])
-        print(f"✓ Created {UPDATES_CSV}")
+            writer.writerow(['lead_id', 'old_status', 'new_status', 'notes', 'updated_at', 'version'])
+        log_event("storage.csv_created", path=UPDATES_CSV)
 
 # Initialize CSV files on startup
 initialize_csv_files()
@@ -54,150 +120,609 @@ class LeadStatusUpdate(BaseModel):
     status: str = Field(pattern="^(NEW|IN_PROGRESS|FOLLOW_UP|WON|LOST)$")
     notes: Optional[str] = None
 
-# In-memory stores
-LEADS = {}
-VISITS = {}
+# Batch requests are validated as a whole: one bad item rejects the batch with 422.
+# An item may carry its own idempotency_key, shared with the single-item endpoint.
+MAX_BATCH_SIZE = 1000
+
+class LeadBatchItem(LeadCreate):
+    idempotency_key: Optional[str] = None
+
+class LeadBatch(BaseModel):
+    leads: List[LeadBatchItem] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class VisitBatchItem(VisitCreate):
+    idempotency_key: Optional[str] = None
+
+class VisitBatch(BaseModel):
+    visits: List[VisitBatchItem] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class LeadStatusBatchItem(LeadStatusUpdate):
+    lead_id: str
+    idempotency_key: Optional[str] = None
+
+class LeadStatusBatch(BaseModel):
+    updates: List[LeadStatusBatchItem] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+# Default for ?dedup= on POST /crm/leads: return the existing lead for a known phone
+DEDUP_LEADS = os.getenv("CRM_DEDUP_LEADS", "false").lower() in ("1", "true", "yes")
+
+# Lead/visit store - memory (default), sqlite or postgres via CRM_STORAGE
+storage = create_storage()
+snapshots = SnapshotScheduler(storage, csv_writer, SNAPSHOT_PATH, CSV_PATHS, SNAPSHOT_INTERVAL)
+
+# Idempotency-Key support for the write endpoints: a retried request with the
+# same key and body gets the first response back instead of writing again
+idempotency = IdempotencyCache(
+    max_keys=int(os.getenv("CRM_IDEMPOTENCY_MAX_KEYS", "100000")),
+    ttl=float(os.getenv("CRM_IDEMPOTENCY_TTL", "600")),
+)
+
+def idempotent(
+    response: Response, key: Optional[str], scope: str, body: BaseModel, handler,
+    if_match: Optional[str] = None,
+):
+    """Run ``handler`` once per Idempotency-Key; replays get the stored response
+
+    The key is bound to the body and the If-Match header, so reusing it with
+    either changed is a conflict rather than a replay.
+    """
+    if not key:
+        return handler()
+    try:
+        result, replayed = idempotency.run((scope, key), request_fingerprint(body, if_match), handler)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        log_event("request.replayed", scope=scope, idempotency_key=key)
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def request_fingerprint(body: BaseModel, if_match: Optional[str] = None) -> str:
+    request = body.model_dump_json()
+    if if_match is not None:
+        request += "\nIf-Match: " + if_match
+    return hashlib.sha256(request.encode()).hexdigest()
+
+def idempotent_items(items: list, scope, single_model, store_items) -> dict:
+    """Run a batch once per item idempotency_key; returns ``{"results": [...]}``
+
+    Each item is keyed and fingerprinted as the single-item request it
+    stands for (``scope(item)``, body ``single_model``), so retrying it on
+    its own after a failed or timed-out batch replays the batch's result
+    instead of writing again. ``store_items`` gets the items that still
+    need writing; error results are not stored.
+    """
+    keys = [(scope(item), item.idempotency_key) if item.idempotency_key else None for item in items]
+    fingerprints = [
+        request_fingerprint(single_model(**item.model_dump(exclude={"idempotency_key"})))
+        for item in items
+    ]
+    try:
+        outcomes = idempotency.run_many(
+            keys, fingerprints,
+            lambda indices: store_items([items[i] for i in indices]),
+            cacheable=lambda result: "error" not in result,
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    replayed = sum(1 for _, was_replayed in outcomes if was_replayed)
+    if replayed:
+        log_event("request.replayed", scope=scope(items[0]), items=replayed)
+    return {"results": [result for result, _ in outcomes]}
 
 @app.post("/crm/leads")
-def create_lead(payload: LeadCreate):
+def create_lead(
+    payload: LeadCreate,
+    response: Response,
+    dedup: bool = DEDUP_LEADS,
+    idempotency_key: Optional[str] = Header(None),
+):
+    return idempotent(
+        response, idempotency_key, f"/crm/leads?dedup={dedup}", payload,
+        partial(store_lead, payload, dedup),
+    )
+
+def store_lead(payload: LeadCreate, dedup: bool):
     lead_id = str(uuid4())
     created_at = datetime.now().isoformat()
 
     lead_data = {
-        **payload.dict(),
+        **payload.model_dump(),
         "lead_id": lead_id,
         "status": "NEW",
         "created_at": created_at
     }
-    LEADS[lead_id] = lead_data
-
-    # Print to terminal
-    print("\n" + "="*60)
-    print("📝 NEW LEAD CREATED")
-    print("="*60)
-    print(f"Lead ID    : {lead_id}")
-    print(f"Name       : {payload.name}")
-    print(f"Phone      : {payload.phone}")
-    print(f"City       : {payload.city}")
-    print(f"Source     : {payload.source or 'N/A'}")
-    print(f"Status     : NEW")
-    print(f"Created At : {created_at}")
-    print("="*60 + "\n")
+    if dedup:
+        # Return the existing lead for this phone instead of creating another
+        lead, created = storage.add_lead_unique(lead_data)
+        if not created:
+            log_event("lead.duplicate", lead_id=lead["lead_id"], phone=payload.phone)
+            return {"lead_id": lead["lead_id"], "status": lead["status"], "duplicate": True}
+    else:
+        storage.add_lead(lead_data)
+
+    log_event(
+        "lead.created",
+        lead_id=lead_id,
+        name=payload.name,
+        phone=payload.phone,
+        city=payload.city,
+        source=payload.source,
+    )
 
     # Save to CSV
-    with open(LEADS_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            lead_id,
-            payload.name,
-            payload.phone,
-            payload.city,
-            payload.source or '',
-            "NEW",
-            created_at
-        ])
-
+    csv_writer.append(LEADS_CSV, [
+        lead_id,
+        payload.name,
+        payload.phone,
+        payload.city,
+        payload.source or '',
+        "NEW",
+        created_at
+    ])
+
+    if dedup:
+        return {"lead_id": lead_id, "status": "NEW", "duplicate": False}
     return {"lead_id": lead_id, "status": "NEW"}
 
 @app.post("/crm/visits")
-def create_visit(payload: VisitCreate):
-    if payload.lead_id not in LEADS:
-        print(f"\n❌ ERROR: Lead {payload.lead_id} not found!\n")
+def create_visit(
+    payload: VisitCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    return idempotent(
+        response, idempotency_key, "/crm/visits", payload,
+        partial(store_visit, payload),
+    )
+
+def store_visit(payload: VisitCreate):
+    lead = storage.get_lead(payload.lead_id)
+    if lead is None:
+        log_event("visit.lead_not_found", WARNING, lead_id=payload.lead_id)
         raise HTTPException(status_code=404, detail="Lead not found")
 
     visit_id = str(uuid4())
     created_at = datetime.now().isoformat()
 
     visit_data = {
-        **payload.dict(),
+        **payload.model_dump(),
         "visit_id": visit_id,
         "status": "SCHEDULED",
         "created_at": created_at
     }
-    VISITS[visit_id] = visit_data
-
-    # Get lead info for display
-    lead = LEADS[payload.lead_id]
-
-    # Print to terminal
-    print("\n" + "="*60)
-    print("📅 VISIT SCHEDULED")
-    print("="*60)
-    print(f"Visit ID   : {visit_id}")
-    print(f"Lead ID    : {payload.lead_id}")
-    print(f"Lead Name  : {lead.get('name', 'N/A')}")
-    print(f"Visit Time : {payload.visit_time}")
-    print(f"Notes      : {payload.notes or 'N/A'}")
-    print(f"Status     : SCHEDULED")
-    print(f"Created At : {created_at}")
-    print("="*60 + "\n")
+    overlapping = storage.schedule_visits([visit_data], VISIT_SLOT_MINUTES * 60)[0]
+    if overlapping is None:
+        log_event("visit.lead_not_found", WARNING, lead_id=payload.lead_id)
+        raise HTTPException(status_code=404, detail="Lead not found")
+    if overlapping:
+        log_event(
+            "visit.overlap",
+            WARNING,
+            lead_id=payload.lead_id,
+            visit_time=payload.visit_time,
+            conflicts=[visit["visit_id"] for visit in overlapping],
+        )
+        raise HTTPException(status_code=409, detail=overlap_detail(overlapping))
+
+    log_event(
+        "visit.scheduled",
+        visit_id=visit_id,
+        lead_id=payload.lead_id,
+        lead_name=lead.get("name"),
+        visit_time=payload.visit_time,
+        notes=payload.notes,
+    )
 
     # Save to CSV
-    with open(VISITS_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            visit_id,
-            payload.lead_id,
-            str(payload.visit_time),
-            payload.notes or '',
-            "SCHEDULED",
-            created_at
-        ])
+    csv_writer.append(VISITS_CSV, [
+        visit_id,
+        payload.lead_id,
+        str(payload.visit_time),
+        payload.notes or '',
+        "SCHEDULED",
+        created_at
+    ])
 
     return {"visit_id": visit_id, "status": "SCHEDULED"}
 
-@app.post("/crm/leads/{lead_id}/status")
-def update_lead_status(lead_id: str, payload: LeadStatusUpdate):
-    if lead_id not in LEADS:
-        print(f"\n❌ ERROR: Lead {lead_id} not found!\n")
-        raise HTTPException(status_code=404, detail="Lead not found")
+def overlap_detail(overlapping: list) -> dict:
+    """409 body naming the visits a new one would overlap"""
+    return {
+        "error": f"Lead already has a visit within {VISIT_SLOT_MINUTES:g} minutes of this time",
+        "conflicts": [
+            {"visit_id": visit["visit_id"], "visit_time": jsonable_encoder(visit["visit_time"])}
+            for visit in overlapping
+        ],
+    }
 
-    # Get old status for logging
-    old_status = LEADS[lead_id].get("status", "UNKNOWN")
-    updated_at = datetime.now().isoformat()
+def etag(version: int) -> str:
+    """ETag of a lead: its version"""
+    return f'"{version}"'
 
-    # Update lead
-    LEADS[lead_id]["status"] = payload.status
-    if payload.notes:
-        LEADS[lead_id]["notes"] = payload.notes
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """Lead version required by an If-Match header (``"3"``, ``W/"3"``); None for ``*`` or no header"""
+    if value is None or value.strip() == "*":
+        return None
+    tag = value.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match header: {value}")
+    return int(tag)
 
-    # Get lead info for display
-    lead = LEADS[lead_id]
+@app.post("/crm/leads/{lead_id}/status")
+def update_lead_status(
+    lead_id: str,
+    payload: LeadStatusUpdate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    if_match: Optional[str] = Header(None),
+):
+    """Update a lead's status; with If-Match, only if the lead is still at that version (else 412)"""
+    expected_version = parse_if_match(if_match)
+    result = idempotent(
+        response, idempotency_key, f"/crm/leads/{lead_id}/status", payload,
+        partial(store_lead_status, lead_id, payload, expected_version),
+        if_match=if_match,
+    )
+    response.headers["ETag"] = etag(result["version"])
+    return result
+
+def store_lead_status(lead_id: str, payload: LeadStatusUpdate, expected_version: Optional[int] = None):
+    updated_at = datetime.now().isoformat()
 
-    # Print to terminal
-    print("\n" + "="*60)
-    print("🔄 LEAD STATUS UPDATED")
-    print("="*60)
-    print(f"Lead ID      : {lead_id}")
-    print(f"Lead Name    : {lead.get('name', 'N/A')}")
-    print(f"Old Status   : {old_status}")
-    print(f"New Status   : {payload.status}")
-    print(f"Notes        : {payload.notes or 'N/A'}")
-    print(f"Updated At   : {updated_at}")
-    print("="*60 + "\n")
+    # Update lead, keeping the old status for logging
+    try:
+        updated = storage.update_lead_status(lead_id, payload.status, payload.notes, expected_version)
+    except VersionConflict as e:
+        log_event("status.version_conflict", WARNING, lead_id=lead_id, expected=e.expected, current=e.current)
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": etag(e.current)})
+    if updated is None:
+        log_event("status.lead_not_found", WARNING, lead_id=lead_id)
+        raise HTTPException(status_code=404, detail="Lead not found")
+    old_status, lead = updated
+
+    log_event(
+        "status.updated",
+        lead_id=lead_id,
+        lead_name=lead.get("name"),
+        old_status=old_status,
+        new_status=payload.status,
+        notes=payload.notes,
+        version=lead["version"],
+    )
+
+    # Save to CSV; the version orders the updates of a lead on replay
+    csv_writer.append(UPDATES_CSV, [
+        lead_id,
+        old_status,
+        payload.status,
+        payload.notes or '',
+        updated_at,
+        lead["version"]
+    ])
+
+    return {"lead_id": lead_id, "status": payload.status, "version": lead["version"]}
+
+# Batch endpoints - one storage transaction and one CSV queue entry per batch
+@app.post("/crm/leads/batch")
+def create_leads_batch(
+    payload: LeadBatch,
+    response: Response,
+    dedup: bool = DEDUP_LEADS,
+    idempotency_key: Optional[str] = Header(None),
+):
+    return idempotent(
+        response, idempotency_key, f"/crm/leads/batch?dedup={dedup}", payload,
+        partial(
+            idempotent_items, payload.leads, lambda item: f"/crm/leads?dedup={dedup}", LeadCreate,
+            partial(store_leads_batch, dedup=dedup),
+        ),
+    )
+
+def store_leads_batch(items: List[LeadBatchItem], dedup: bool) -> list:
+    created_at = datetime.now().isoformat()
+    new_leads = [
+        {
+            **item.model_dump(exclude={"idempotency_key"}),
+            "lead_id": str(uuid4()),
+            "status": "NEW",
+            "created_at": created_at
+        }
+        for item in items
+    ]
+
+    results = []
+    rows = []
+    for lead, created in storage.add_leads(new_leads, unique=dedup):
+        result = {"lead_id": lead["lead_id"], "status": lead["status"]}
+        if dedup:
+            result["duplicate"] = not created
+        results.append(result)
+        if created:
+            rows.append([
+                lead["lead_id"],
+                lead["name"],
+                lead["phone"],
+                lead["city"],
+                lead["source"] or '',
+                "NEW",
+                created_at
+            ])
+
+    log_event("lead.batch_created", created=len(rows), duplicates=len(results) - len(rows))
+
+    csv_writer.append_many(LEADS_CSV, rows)
+    return results
+
+@app.post("/crm/visits/batch")
+def create_visits_batch(
+    payload: VisitBatch,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    return idempotent(
+        response, idempotency_key, "/crm/visits/batch", payload,
+        partial(
+            idempotent_items, payload.visits, lambda item: "/crm/visits", VisitCreate,
+            store_visits_batch,
+        ),
+    )
+
+def store_visits_batch(items: List[VisitBatchItem]) -> list:
+    created_at = datetime.now().isoformat()
+    new_visits = [
+        {
+            **item.model_dump(exclude={"idempotency_key"}),
+            "visit_id": str(uuid4()),
+            "status": "SCHEDULED",
+            "created_at": created_at
+        }
+        for item in items
+    ]
+
+    results = []
+    rows = []
+    outcomes = storage.schedule_visits(new_visits, VISIT_SLOT_MINUTES * 60)
+    for visit, overlapping in zip(new_visits, outcomes):
+        if overlapping is None:
+            results.append({"lead_id": visit["lead_id"], "error": "Lead not found", "status_code": 404})
+            continue
+        if overlapping:
+            results.append({"lead_id": visit["lead_id"], **overlap_detail(overlapping), "status_code": 409})
+            continue
+        results.append({"visit_id": visit["visit_id"], "status": "SCHEDULED"})
+        rows.append([
+            visit["visit_id"],
+            visit["lead_id"],
+            str(visit["visit_time"]),
+            visit["notes"] or '',
+            "SCHEDULED",
+            created_at
+        ])
 
-    # Save to CSV
-    with open(UPDATES_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            lead_id,
+    log_event("visit.batch_scheduled", scheduled=len(rows), failed=len(results) - len(rows))
+
+    csv_writer.append_many(VISITS_CSV, rows)
+    return results
+
+@app.post("/crm/leads/status/batch")
+def update_lead_status_batch(
+    payload: LeadStatusBatch,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    return idempotent(
+        response, idempotency_key, "/crm/leads/status/batch", payload,
+        partial(
+            idempotent_items, payload.updates, lambda item: f"/crm/leads/{item.lead_id}/status",
+            LeadStatusUpdate, store_lead_status_batch,
+        ),
+    )
+
+def store_lead_status_batch(items: List[LeadStatusBatchItem]) -> list:
+    updated_at = datetime.now().isoformat()
+    outcomes = storage.update_lead_statuses(
+        [(item.lead_id, item.status, item.notes) for item in items]
+    )
+
+    results = []
+    rows = []
+    for item, updated in zip(items, outcomes):
+        if updated is None:
+            results.append({"lead_id": item.lead_id, "error": "Lead not found", "status_code": 404})
+            continue
+        old_status, lead = updated
+        results.append({"lead_id": item.lead_id, "status": item.status, "version": lead["version"]})
+        rows.append([
+            item.lead_id,
             old_status,
-            payload.status,
-            payload.notes or '',
-            updated_at
+            item.status,
+            item.notes or '',
+            updated_at,
+            lead["version"]
         ])
 
-    return {"lead_id": lead_id, "status": payload.status}
+    log_event("status.batch_updated", updated=len(rows), failed=len(results) - len(rows))
+
+    csv_writer.append_many(UPDATES_CSV, rows)
+    return results
+
+# Listing / pagination
+LEAD_FIELDS = ("lead_id", "name", "phone", "city", "source", "status", "notes", "created_at", "version")
+VISIT_FIELDS = ("visit_id", "lead_id", "visit_time", "notes", "status", "created_at")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(after: int) -> str:
+    return base64.urlsafe_b64encode(str(after).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Opaque cursor -> position to continue after (0 = from the start)"""
+    if not cursor:
+        return 0
+    try:
+        after = int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if after < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> Optional[list]:
+    """Comma-separated field projection; None means every field"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def timestamp_filter(value: Optional[datetime]) -> Optional[str]:
+    """created_at is stored as a naive local ISO string, so compare in that form"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def list_response(key: str, fetch, after: int, limit: int, names: Optional[list], fmt: str):
+    """One JSON page with next_cursor, or every remaining record as NDJSON"""
+    def project(record):
+        return record if names is None else {name: record.get(name) for name in names}
+
+    if fmt == "ndjson":
+        def stream():
+            cursor = after
+            while True:
+                # One page in memory at a time, written out as one chunk
+                page, cursor = fetch(after=cursor, limit=limit)
+                if page:
+                    yield "".join(
+                        json.dumps(project(record), default=_json_default) + "\n"
+                        for record in page
+                    )
+                if cursor is None:
+                    break
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    page, next_after = fetch(after=after, limit=limit)
+    return {
+        key: [project(record) for record in page],
+        "next_cursor": encode_cursor(next_after) if next_after is not None else None,
+    }
 
 @app.get("/crm/leads")
-def list_leads():
-    """List all leads (for debugging)"""
-    return {"leads": list(LEADS.values())}
+def list_leads(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    city: Optional[str] = None,
+    source: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """List leads a page at a time (cursor from the previous page's next_cursor)"""
+    fetch = partial(
+        storage.list_leads,
+        status=status,
+        city=city,
+        source=source,
+        created_from=timestamp_filter(created_from),
+        created_to=timestamp_filter(created_to),
+    )
+    return list_response(
+        "leads", fetch, decode_cursor(cursor), limit, parse_fields(fields, LEAD_FIELDS), format
+    )
 
 @app.get("/crm/visits")
-def list_visits():
-    """List all visits (for debugging)"""
-    return {"visits": list(VISITS.values())}
+def list_visits(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    lead_id: Optional[str] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """List visits a page at a time (cursor from the previous page's next_cursor)"""
+    fetch = partial(
+        storage.list_visits,
+        lead_id=lead_id,
+        status=status,
+        created_from=timestamp_filter(created_from),
+        created_to=timestamp_filter(created_to),
+    )
+    return list_response(
+        "visits", fetch, decode_cursor(cursor), limit, parse_fields(fields, VISIT_FIELDS), format
+    )
+
+def encode_time_cursor(after: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(after)).encode()).decode().rstrip("=")
+
+def decode_time_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Opaque cursor -> (visit_ts, visit_id) key to continue after"""
+    if not cursor:
+        return None
+    try:
+        visit_ts, visit_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(visit_ts), str(visit_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/crm/visits/range")
+def list_visits_in_range(
+    start: datetime,
+    end: datetime,
+    lead_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """Visits with start <= visit_time < end in time order, from the visit_time index"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    page, next_after = storage.visits_between(
+        start.timestamp(), end.timestamp(), lead_id=lead_id, after=decode_time_cursor(cursor), limit=limit
+    )
+    return {
+        "visits": page,
+        "next_cursor": encode_time_cursor(next_after) if next_after is not None else None,
+    }
+
+@app.get("/crm/leads/lookup")
+def lookup_leads(phone: str):
+    """Find leads by phone number (index lookup; +91/0 prefixes and spaces ignored)"""
+    return {"leads": storage.find_leads_by_phone(phone)}
+
+@app.get("/crm/leads/{lead_id}")
+def get_lead(lead_id: str, response: Response):
+    """One lead; its ETag is the version to send as If-Match with a status update"""
+    lead = storage.get_lead(lead_id)
+    if lead is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    response.headers["ETag"] = etag(lead["version"])
+    return lead
+
+@app.get("/crm/leads/{lead_id}/visits")
+def list_lead_visits(lead_id: str):
+    """Every visit scheduled for one lead"""
+    if storage.get_lead(lead_id) is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    visits, _ = storage.list_visits(lead_id=lead_id)
+    return {"visits": visits}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -208,5 +733,6 @@ if __name__ == "__main__":
     print(f"  Leads CSV    : {LEADS_CSV}")
     print(f"  Visits CSV   : {VISITS_CSV}")
     print(f"  Updates CSV  : {UPDATES_CSV}")
+    print(f"  Storage      : {storage.name}")
     print("="*60 + "\n")
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,154 @@
+"""
+Telephony audio front-end: 8 kHz G.711 (μ-law / A-law) callers
+
+Phone calls arrive as 8 kHz G.711, but the Live API takes 16 kHz and
+returns 24 kHz 16-bit PCM. ``TelephonySource`` wraps a source of G.711
+bytes and decodes and resamples it to 16 kHz; ``TelephonySink`` wraps a
+sink of G.711 bytes and resamples model audio from 24 kHz to 8 kHz and
+encodes it.
+
+Codec conversion is a NumPy table lookup over the whole chunk (the tables
+are built once, vectorized, and match the ITU-T G.711 reference encoder).
+Resampling uses streaming soxr resamplers that keep their filter state
+across chunks, so chunk boundaries are seamless.
+"""
+
+import numpy as np
+import soxr
+
+from audio_io import RECEIVE_SAMPLE_RATE, SEND_SAMPLE_RATE, AudioSink, AudioSource
+
+TELEPHONY_SAMPLE_RATE = 8000
+
+ULAW = "ulaw"
+ALAW = "alaw"
+CODECS = (ULAW, ALAW)
+
+
+def _ulaw_decode_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+
+def _alaw_decode_table() -> np.ndarray:
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = ((a & 0x0F) << 4) + np.where(seg == 0, 8, 0x108)
+    t = np.where(seg > 1, t << np.maximum(seg - 1, 0), t)
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+
+def _ulaw_encode_table() -> np.ndarray:
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    mag = np.minimum(np.abs(pcm), 8159) + 0x21
+    seg = np.searchsorted([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], mag)
+    uval = (seg << 4) | ((mag >> (seg + 1)) & 0x0F)
+    uval = np.where(seg >= 8, 0x7F, uval)
+    return _by_uint16((uval ^ mask).astype(np.uint8))
+
+
+def _alaw_encode_table() -> np.ndarray:
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    mag = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF], mag)
+    aval = (seg << 4) | (np.where(seg < 2, mag >> 1, mag >> seg) & 0x0F)
+    aval = np.where(seg >= 8, 0x7F, aval)
+    return _by_uint16((aval ^ mask).astype(np.uint8))
+
+
+def _by_uint16(table: np.ndarray) -> np.ndarray:
+    """Reindex a table built over -32768..32767 by the samples' uint16 bit pattern"""
+    return np.roll(table, -32768)
+
+
+_DECODE = {ULAW: _ulaw_decode_table(), ALAW: _alaw_decode_table()}
+_ENCODE = {ULAW: _ulaw_encode_table(), ALAW: _alaw_encode_table()}
+
+
+def decode(data: bytes, codec: str) -> np.ndarray:
+    """G.711 bytes -> int16 samples"""
+    return _DECODE[codec][np.frombuffer(data, dtype=np.uint8)]
+
+
+def encode(samples: np.ndarray, codec: str) -> bytes:
+    """int16 samples -> G.711 bytes"""
+    return _ENCODE[codec][samples.astype(np.int16, copy=False).view(np.uint16)].tobytes()
+
+
+class StreamResampler:
+    """Streaming int16 resampler; filter state carries over between chunks"""
+
+    def __init__(self, in_rate: int, out_rate: int):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self._stream = soxr.ResampleStream(in_rate, out_rate, 1, dtype="int16")
+
+    def process(self, samples: np.ndarray, last: bool = False) -> np.ndarray:
+        return self._stream.resample_chunk(samples, last=last)
+
+    def reset(self):
+        """Forget buffered input (e.g. after a barge-in)"""
+        self._stream.clear()
+
+
+class TelephonySource(AudioSource):
+    """16 kHz PCM from a source of 8 kHz G.711 bytes"""
+
+    def __init__(self, source: AudioSource, codec: str = ULAW, sample_rate: int = SEND_SAMPLE_RATE):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown telephony codec: {codec}")
+        self.source = source
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.interactive = source.interactive
+        self._resampler = StreamResampler(TELEPHONY_SAMPLE_RATE, sample_rate)
+        self._ended = False
+
+    async def start(self):
+        await self.source.start()
+
+    async def read(self):
+        while not self._ended:
+            data = await self.source.read()
+            if data is None:
+                self._ended = True
+                tail = self._resampler.process(np.zeros(0, dtype=np.int16), last=True)
+                return tail.tobytes() if len(tail) else None
+            pcm = self._resampler.process(decode(data, self.codec))
+            if len(pcm):
+                return pcm.tobytes()
+        return None
+
+    async def close(self):
+        await self.source.close()
+
+
+class TelephonySink(AudioSink):
+    """Feeds 24 kHz model audio to a sink of 8 kHz G.711 bytes"""
+
+    def __init__(self, sink: AudioSink, codec: str = ULAW, sample_rate: int = RECEIVE_SAMPLE_RATE):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown telephony codec: {codec}")
+        self.sink = sink
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.realtime = sink.realtime
+        self._resampler = StreamResampler(sample_rate, TELEPHONY_SAMPLE_RATE)
+
+    async def start(self):
+        await self.sink.start()
+
+    async def write(self, data: bytes):
+        pcm = self._resampler.process(np.frombuffer(data, dtype="<i2"))
+        if len(pcm):
+            await self.sink.write(encode(pcm, self.codec))
+
+    async def interrupt(self):
+        self._resampler.reset()
+        await self.sink.interrupt()
+
+    async def close(self):
+        await self.sink.close()
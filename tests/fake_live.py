@@ -0,0 +1,28 @@
+"""
+Stand-ins for Live API server messages, for the fake sessions in the tests
+"""
+
+from types import SimpleNamespace
+
+
+def server_message(
+    data=None,
+    text=None,
+    tool_call=None,
+    interrupted=False,
+    resumption_handle=None,
+    go_away=False,
+):
+    """A LiveServerMessage-shaped object with only the given parts set"""
+    return SimpleNamespace(
+        data=data,
+        text=text,
+        tool_call=tool_call,
+        server_content=SimpleNamespace(interrupted=True) if interrupted else None,
+        session_resumption_update=(
+            SimpleNamespace(new_handle=resumption_handle, resumable=True)
+            if resumption_handle
+            else None
+        ),
+        go_away=SimpleNamespace(time_left="1s") if go_away else None,
+    )
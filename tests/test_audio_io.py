@@ -0,0 +1,182 @@
+"""
+Unit tests for the audio sources/sinks and a headless AudioLoop run
+"""
+
+import asyncio
+import os
+import time
+import wave
+from contextlib import asynccontextmanager
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot
+from tests.fake_live import server_message
+from audio_io import (
+    MemorySink,
+    MemorySource,
+    NullSink,
+    RawFileSink,
+    RawFileSource,
+    WavFileSink,
+    WavFileSource,
+    create_sink,
+    create_source,
+)
+
+
+async def read_all(source):
+    await source.start()
+    chunks = []
+    while (chunk := await source.read()) is not None:
+        chunks.append(chunk)
+    await source.close()
+    return chunks
+
+
+def test_memory_source_chunks():
+    """A memory source yields chunk_size frames at a time, then None"""
+    pcm = bytes(range(256)) * 20
+    chunks = asyncio.run(read_all(MemorySource(pcm, chunk_size=100)))
+    assert b"".join(chunks) == pcm
+    assert all(len(chunk) == 200 for chunk in chunks[:-1])
+
+
+def test_memory_source_realtime_pacing():
+    """realtime delivers audio no faster than it would be spoken"""
+    pcm = b"\x00\x00" * 1600  # 0.1 s at 16 kHz
+    started = time.monotonic()
+    asyncio.run(read_all(MemorySource(pcm, chunk_size=400, realtime=True)))
+    assert time.monotonic() - started >= 0.09
+
+
+def test_wav_roundtrip(tmp_path):
+    """Audio written by WavFileSink reads back through WavFileSource"""
+    path = str(tmp_path / "out.wav")
+    pcm = bytes(range(200)) * 16
+
+    async def record():
+        sink = WavFileSink(path, sample_rate=16000)
+        await sink.start()
+        await sink.write(pcm)
+        await sink.close()
+
+    asyncio.run(record())
+    with wave.open(path, "rb") as f:
+        assert (f.getnchannels(), f.getsampwidth(), f.getframerate()) == (1, 2, 16000)
+
+    source = WavFileSource(path, realtime=False, tail_seconds=0.5)
+    data = b"".join(asyncio.run(read_all(source)))
+    assert data == pcm + b"\x00" * 16000
+
+
+def test_wav_rate_mismatch(tmp_path):
+    """A WAV file at the wrong rate is rejected up front"""
+    path = str(tmp_path / "in.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\x00\x00" * 10)
+    with pytest.raises(ValueError):
+        WavFileSource(path)
+
+
+def test_raw_roundtrip(tmp_path):
+    """Raw PCM files round-trip unchanged"""
+    path = str(tmp_path / "out.pcm")
+    pcm = bytes(range(100)) * 10
+
+    async def record():
+        sink = RawFileSink(path)
+        await sink.start()
+        await sink.write(pcm)
+        await sink.close()
+
+    asyncio.run(record())
+    assert b"".join(asyncio.run(read_all(RawFileSource(path, realtime=False, tail_seconds=0)))) == pcm
+
+
+def test_factory_specs(tmp_path):
+    """Sources and sinks are selected by spec string"""
+    path = str(tmp_path / "a.pcm")
+    open(path, "wb").close()
+    assert isinstance(create_source(f"raw:{path}"), RawFileSource)
+    assert isinstance(create_sink("null"), NullSink)
+    assert isinstance(create_sink(f"wav:{tmp_path / 'b.wav'}"), WavFileSink)
+    with pytest.raises(ValueError):
+        create_source("microphone")
+
+
+class EchoLiveSession:
+    """Fake Live session that sends every audio chunk straight back"""
+
+    def __init__(self):
+        self.responses = asyncio.Queue()
+
+    async def send(self, input, end_of_turn=False):
+        await self.responses.put(server_message(data=input["data"]))
+
+    async def receive(self):
+        while True:
+            yield await self.responses.get()
+
+
+def test_headless_audio_loop(monkeypatch):
+    """An AudioLoop driven by a memory source runs without a sound card"""
+
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        yield EchoLiveSession()
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    pcm = bytes(range(256)) * 64
+    sink = MemorySink()
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(pcm, tail_seconds=0.1, realtime=True), sink=sink, vad_mode="off"
+    )
+
+    asyncio.run(loop.run_session())
+
+    # The speech is echoed in full; the silent tail keeps the session open for it
+    assert bytes(sink.data[:len(pcm)]) == pcm
+
+
+class PacedSink(MemorySink):
+    """A sink that plays in real time, like a sound card"""
+
+    realtime = True
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    async def write(self, data: bytes):
+        self.writes.append(len(data))
+        await super().write(data)
+        await asyncio.sleep(len(data) / (2 * self.sample_rate))
+
+
+def test_realtime_sink_gets_constant_frames(monkeypatch):
+    """Real-time sinks are fed fixed-size frames from the jitter buffer"""
+
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        yield EchoLiveSession()
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    pcm = bytes(range(1, 256)) * 48
+    sink = PacedSink()
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(pcm, sample_rate=24000, tail_seconds=0.5, realtime=True),
+        sink=sink,
+        vad_mode="off",
+    )
+
+    asyncio.run(loop.run_session())
+
+    assert set(sink.writes) == {loop.playback.frame_bytes}
+    assert bytes(sink.data[:len(pcm)]) == pcm
+    assert loop.playback.overruns == 0
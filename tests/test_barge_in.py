@@ -0,0 +1,136 @@
+"""
+Barge-in: playback stops as soon as the server reports an interruption
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+
+import numpy as np
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot  # noqa: E402
+from tests.fake_live import server_message  # noqa: E402
+from audio_io import MemorySink, MemorySource  # noqa: E402
+from jitter_buffer import JitterBuffer  # noqa: E402
+
+RATE = 16000
+
+
+def tone(seconds):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * 220 * t) * 0.3 * 32767).astype("<i2").tobytes()
+
+
+def silence(seconds):
+    return b"\x00" * (int(seconds * RATE) * 2)
+
+
+INTERRUPTED = server_message(interrupted=True)
+
+
+class TalkativeLiveSession:
+    """Answers the first utterance with 5 s of audio; interrupts on the second"""
+
+    def __init__(self):
+        self.responses = asyncio.Queue()
+        self.utterances = 0
+
+    async def send(self, input=None, end_of_turn=False):
+        pass
+
+    async def send_realtime_input(self, activity_start=None, activity_end=None, **kwargs):
+        if activity_end is not None and self.utterances == 1:
+            for _ in range(50):  # 100 ms chunks at 24 kHz, sent at once
+                await self.responses.put(server_message(data=b"\x01\x00" * 2400))
+        if activity_start is not None:
+            self.utterances += 1
+            if self.utterances == 2:
+                await self.responses.put(INTERRUPTED)
+
+    async def receive(self):
+        while True:
+            yield await self.responses.get()
+
+
+class SpeakerSink(MemorySink):
+    """Plays in real time, like a sound card"""
+
+    realtime = True
+
+    async def write(self, data: bytes):
+        await asyncio.sleep(len(data) / (2 * self.sample_rate))
+        await super().write(data)
+
+
+class WebSocketLikeSink(MemorySink):
+    """Writes that take a while, and a hook that records interrupts"""
+
+    def __init__(self):
+        super().__init__()
+        self.interrupted = 0
+
+    async def write(self, data: bytes):
+        await asyncio.sleep(10)  # never finishes unless aborted
+        await super().write(data)
+
+    async def interrupt(self):
+        self.interrupted += 1
+
+
+def run_call(monkeypatch, sink):
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        yield TalkativeLiveSession()
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    pcm = tone(0.3) + silence(0.6) + tone(0.3) + silence(1.0)
+    loop = live_voice_bot.AudioLoop(source=MemorySource(pcm, realtime=True), sink=sink, vad_mode="drop")
+    loop.vad.hangover = 0.2
+    asyncio.run(loop.run_session())
+    return loop
+
+
+def test_interruption_stops_playback(monkeypatch):
+    sink = SpeakerSink()
+    histograms = (live_voice_bot.RESPONSE_LATENCY, live_voice_bot.PLAYBACK_START, live_voice_bot.BARGE_IN)
+    before = [h.count for h in histograms]
+    loop = run_call(monkeypatch, sink)
+
+    # One answer: one response latency, one playback start, one barge-in
+    assert [h.count - n for h, n in zip(histograms, before)] == [1, 1, 1]
+
+    assert loop.interruptions == 1
+    assert len(loop.barge_in_ms) == 1
+    # Only the audio played before the caller spoke again reached the speaker,
+    # not the 5 s answer
+    played = len(sink.data) / (2 * sink.sample_rate)
+    assert 0 < played < 1.0
+    assert len(loop.playback) == 0
+
+
+def test_interruption_aborts_write_in_flight(monkeypatch):
+    sink = WebSocketLikeSink()
+    loop = run_call(monkeypatch, sink)
+
+    assert loop.interruptions == 1
+    assert sink.interrupted == 1
+    assert sink.data == b""
+    assert loop.barge_in_ms[0] < 500
+
+
+def test_interruption_while_playback_is_full(monkeypatch):
+    """A full jitter buffer holds back the answer's audio, not the interruption"""
+    monkeypatch.setattr(live_voice_bot, "JitterBuffer", partial(JitterBuffer, max_ms=200))
+    sink = SpeakerSink()
+    loop = run_call(monkeypatch, sink)
+
+    assert loop.interruptions == 1
+    assert loop.barge_in_ms[0] < 500
+    assert loop.playback.overruns >= 1
+    played = len(sink.data) / (2 * sink.sample_rate)
+    assert 0 < played < 1.0
+    assert len(loop.playback) == 0
+    assert loop.model_audio.empty()
@@ -0,0 +1,143 @@
+"""
+Unit tests for the batch endpoints
+Tests /crm/leads/batch, /crm/visits/batch and /crm/leads/status/batch
+"""
+
+import pytest
+import requests
+from uuid import UUID
+
+
+# Base URL for mock CRM
+BASE_URL = "http://localhost:8001"
+
+
+@pytest.fixture
+def created_leads():
+    """Fixture to create three leads in one batch"""
+    payload = {
+        "leads": [
+            {"name": "Batch Lead 1", "phone": "9000000001", "city": "Mumbai", "source": "Website"},
+            {"name": "Batch Lead 2", "phone": "9000000002", "city": "Delhi"},
+            {"name": "Batch Lead 3", "phone": "9000000003", "city": "Pune"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/leads/batch", json=payload)
+    assert response.status_code == 200
+
+    return [result["lead_id"] for result in response.json()["results"]]
+
+
+def test_create_leads_batch(created_leads):
+    """Test creating several leads in one request"""
+    assert len(created_leads) == 3
+    assert len(set(created_leads)) == 3
+
+    for lead_id in created_leads:
+        UUID(lead_id)
+        response = requests.get(f"{BASE_URL}/crm/leads/{lead_id}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "NEW"
+
+
+def test_create_leads_batch_invalid_item():
+    """Test that one invalid item rejects the whole batch"""
+    payload = {
+        "leads": [
+            {"name": "Valid Lead", "phone": "9000000004", "city": "Mumbai"},
+            {"name": "Missing Phone", "city": "Delhi"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/leads/batch", json=payload)
+
+    assert response.status_code == 422
+
+
+def test_create_leads_batch_empty():
+    """Test that an empty batch is rejected"""
+    response = requests.post(f"{BASE_URL}/crm/leads/batch", json={"leads": []})
+
+    assert response.status_code == 422
+
+
+def test_create_leads_batch_dedup():
+    """Test that dedup marks repeated phones within a batch as duplicates"""
+    payload = {
+        "leads": [
+            {"name": "Dedup One", "phone": "5123456789", "city": "Mumbai"},
+            {"name": "Dedup Two", "phone": "+91 51234 56789", "city": "Mumbai"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/leads/batch", params={"dedup": "true"}, json=payload)
+
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert second["duplicate"] is True
+    assert second["lead_id"] == first["lead_id"]
+
+
+def test_schedule_visits_batch_partial_failure(created_leads):
+    """Test per-item results when one visit references an unknown lead"""
+    fake_lead_id = "00000000-0000-0000-0000-000000000000"
+    payload = {
+        "visits": [
+            {"lead_id": created_leads[0], "visit_time": "2025-10-05T15:00:00+05:30"},
+            {"lead_id": fake_lead_id, "visit_time": "2025-10-05T16:00:00+05:30"},
+            {"lead_id": created_leads[1], "visit_time": "2025-10-06T11:00:00+05:30", "notes": "Site visit"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/visits/batch", json=payload)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["status"] == "SCHEDULED"
+    assert results[1]["status_code"] == 404
+    assert "not found" in results[1]["error"].lower()
+    assert results[2]["status"] == "SCHEDULED"
+
+
+def test_update_status_batch(created_leads):
+    """Test updating several lead statuses in one request"""
+    fake_lead_id = "00000000-0000-0000-0000-000000000000"
+    payload = {
+        "updates": [
+            {"lead_id": created_leads[0], "status": "WON", "notes": "Booked unit A2"},
+            {"lead_id": created_leads[1], "status": "LOST"},
+            {"lead_id": fake_lead_id, "status": "WON"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/leads/status/batch", json=payload)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0] == {"lead_id": created_leads[0], "status": "WON", "version": 2}
+    assert results[1] == {"lead_id": created_leads[1], "status": "LOST", "version": 2}
+    assert results[2]["status_code"] == 404
+
+    assert requests.get(f"{BASE_URL}/crm/leads/{created_leads[0]}").json()["status"] == "WON"
+
+
+def test_update_status_batch_invalid_status(created_leads):
+    """Test that an invalid status anywhere in the batch rejects it"""
+    payload = {
+        "updates": [
+            {"lead_id": created_leads[0], "status": "WON"},
+            {"lead_id": created_leads[1], "status": "won"},
+        ]
+    }
+
+    response = requests.post(f"{BASE_URL}/crm/leads/status/batch", json=payload)
+
+    assert response.status_code == 422
+    assert requests.get(f"{BASE_URL}/crm/leads/{created_leads[0]}").json()["status"] == "NEW"
+
+
+if __name__ == "__main__":
+    print("Running Batch Tests...")
+    print("Make sure mock CRM server is running on port 8001!")
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,65 @@
+"""
+CRM benchmark suite: traffic mixes, percentiles and stored results
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import crm_bench
+
+
+def test_parse_mix_named_and_custom():
+    assert crm_bench.parse_mix("write") == {"create": 4, "visit": 3, "status": 3}
+    assert crm_bench.parse_mix("create=3,list=1,get") == {"create": 3, "list": 1, "get": 1}
+    with pytest.raises(ValueError):
+        crm_bench.parse_mix("create=2,delete=1")
+    with pytest.raises(ValueError):
+        crm_bench.parse_mix("create=0")
+
+
+def test_percentile_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert crm_bench.percentile(values, 0.5) == 0.05
+    assert crm_bench.percentile(values, 0.99) == 0.099
+    assert crm_bench.percentile([0.2], 0.99) == 0.2
+    assert crm_bench.percentile([], 0.5) is None
+
+
+def test_compare_uses_last_comparable_run():
+    def result(rps, p99, concurrency=8, label=None):
+        return {
+            "transport": "asgi", "storage": "memory", "mix": "default",
+            "concurrency": concurrency, "rps": rps, "latency": {"p99_ms": p99}, "label": label,
+        }
+
+    previous = [result(1000, 10, label="old"), result(500, 5, concurrency=1), result(800, 20, label="base")]
+    change = crm_bench.compare(result(400, 30), previous)
+    assert change == {"against": "base", "rps_pct": -50.0, "p99_pct": 50.0}
+    assert crm_bench.compare(result(400, 30, concurrency=64), previous) is None
+
+
+def test_asgi_benchmark_runs_the_mix_and_stores_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results_path = tmp_path / "results.jsonl"
+
+    results = asyncio.run(crm_bench.benchmark(
+        transport="asgi", concurrency=[1, 4], mix="default", requests=60,
+        seed_count=5, label="test", results_path=str(results_path),
+    ))
+
+    assert [r["concurrency"] for r in results] == [1, 4]
+    for r in results:
+        assert r["requests"] == 60
+        assert r["errors"] == 0
+        assert r["rps"] > 0
+        assert r["latency"]["p50_ms"] <= r["latency"]["p95_ms"] <= r["latency"]["p99_ms"]
+        assert set(r["ops"]) == {"create", "visit", "status", "list", "get"}
+        assert sum(op["count"] for op in r["ops"].values()) == 60
+
+    stored = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert [s["concurrency"] for s in stored] == [1, 4]
+    assert stored[0]["label"] == "test"
+    assert stored[0]["transport"] == "asgi"
+    assert "rps" in crm_bench.format_report(results).splitlines()[0]
@@ -0,0 +1,114 @@
+"""
+Unit tests for the CRM client's retries and circuit breaker
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from tenacity import wait_fixed
+
+import crm_client
+from crm_client import AsyncCRMClient, CircuitBreaker, CircuitOpenError, CRMError, latency_budget
+
+
+def make_client(responses, **kwargs):
+    """Client whose requests are answered from ``responses`` in order"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        outcome = responses[min(len(calls), len(responses)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={"lead_id": "L1", "status": "NEW"})
+
+    kwargs.setdefault("retry_backoff", 0.001)
+    client = AsyncCRMClient(
+        base_url="http://crm.test", transport=httpx.MockTransport(handler), **kwargs
+    )
+    return client, calls
+
+
+def test_keyed_call_retried_on_5xx():
+    """A keyed write is retried after a 503 and succeeds"""
+    client, calls = make_client([503, 200])
+
+    result = asyncio.run(client.create_lead({"name": "A"}, idempotency_key="k1"))
+
+    assert result["lead_id"] == "L1"
+    assert len(calls) == 2
+    assert all(call.headers["Idempotency-Key"] == "k1" for call in calls)
+    assert client.retries == 1
+
+
+def test_unkeyed_call_not_retried_after_send():
+    """Without a key a 503 is not retried (the write may have happened)"""
+    client, calls = make_client([503, 200])
+
+    with pytest.raises(CRMError):
+        asyncio.run(client.create_lead({"name": "A"}))
+    assert len(calls) == 1
+
+
+def test_unkeyed_call_retried_when_not_sent():
+    """Connection failures are retried even without a key"""
+    client, calls = make_client([httpx.ConnectError("refused"), 200])
+
+    assert asyncio.run(client.create_lead({"name": "A"}))["status"] == "NEW"
+    assert len(calls) == 2
+
+
+def test_client_errors_not_retried():
+    """4xx answers are final"""
+    client, calls = make_client([404])
+
+    with pytest.raises(CRMError) as e:
+        asyncio.run(client.schedule_visit({"lead_id": "x"}, idempotency_key="k2"))
+    assert e.value.status_code == 404
+    assert len(calls) == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_stop_at_latency_budget(monkeypatch):
+    """Backoff never sleeps past the caller's deadline"""
+    # Fixed 0.2 s backoff instead of the random jitter, so the schedule is known:
+    # attempt, sleep to 0.2 s, attempt, then a sleep to 0.4 s would pass the deadline
+    monkeypatch.setattr(crm_client, "wait_random_exponential", lambda multiplier, max: wait_fixed(max))
+    client, calls = make_client([503], retry_attempts=10, retry_backoff=0.2, retry_backoff_max=0.2)
+
+    async def call():
+        with latency_budget(0.3):
+            return await client.create_lead({"name": "A"}, idempotency_key="k3")
+
+    started = time.monotonic()
+    with pytest.raises(CRMError):
+        asyncio.run(call())
+    # Slack for the attempts themselves, which run after the last sleep
+    assert time.monotonic() - started < 0.3 + 0.1
+    assert len(calls) == 2
+
+
+def test_circuit_opens_and_recovers():
+    """Repeated failures open the circuit; after reset_timeout one trial closes it"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    client, calls = make_client([500, 500, 200], retry_attempts=1, breaker=breaker)
+
+    async def call():
+        return await client.create_lead({"name": "A"}, idempotency_key="k4")
+
+    for _ in range(2):
+        with pytest.raises(CRMError):
+            asyncio.run(call())
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(call())
+    assert len(calls) == 2
+    assert client.stats()["breaker"]["rejected"] == 1
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert asyncio.run(call())["lead_id"] == "L1"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,21 @@
+"""
+Memory benchmark for the in-memory storage engines
+"""
+
+import crm_memory_bench
+
+
+def test_compact_engine_uses_less_memory_per_lead():
+    memory = crm_memory_bench.measure("memory", 3000, visits_per_lead=1)
+    compact = crm_memory_bench.measure("compact", 3000, visits_per_lead=1)
+
+    assert (memory["leads"], memory["visits"]) == (3000, 3000)
+    assert compact["bytes_per_lead"] < memory["bytes_per_lead"] / 2
+    report = crm_memory_bench.format_report([memory, compact])
+    assert "bytes/lead" in report.splitlines()[0]
+
+
+def test_empty_store():
+    result = crm_memory_bench.measure("compact", 0)
+    assert (result["leads"], result["bytes_per_lead"]) == (0, None)
+    assert "None" in crm_memory_bench.format_report([result])
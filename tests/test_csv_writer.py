@@ -0,0 +1,96 @@
+"""
+Unit tests for the write-behind CSV writer used by the mock CRM
+"""
+
+import csv
+
+import pytest
+
+from crm_writer import CSVWriteBehind
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_rows_written_after_flush(tmp_path):
+    """Rows queued with append() are on disk once flush() returns"""
+    path = tmp_path / "leads.csv"
+    writer = CSVWriteBehind(flush_interval=10)
+
+    writer.append(str(path), ["1", "Rohan Sharma", "9876543210"])
+    writer.append(str(path), ["2", "O'Brien, & Sons", "9123456789"])
+    assert writer.flush(timeout=5)
+
+    assert read_rows(path) == [
+        ["1", "Rohan Sharma", "9876543210"],
+        ["2", "O'Brien, & Sons", "9123456789"],
+    ]
+    writer.close()
+
+
+def test_rows_grouped_per_file(tmp_path):
+    """A batch spanning several files writes each row to its own file"""
+    leads = tmp_path / "leads.csv"
+    visits = tmp_path / "visits.csv"
+    writer = CSVWriteBehind(batch_size=1000, flush_interval=10, fsync="always")
+
+    for i in range(50):
+        writer.append(str(leads), [f"lead-{i}"])
+        writer.append(str(visits), [f"visit-{i}"])
+    writer.close()
+
+    assert read_rows(leads) == [[f"lead-{i}"] for i in range(50)]
+    assert read_rows(visits) == [[f"visit-{i}"] for i in range(50)]
+    assert writer.rows_written == 100
+
+
+def test_close_drains_queue(tmp_path):
+    """close() writes every pending row before stopping"""
+    path = tmp_path / "updates.csv"
+    writer = CSVWriteBehind(max_queue=16, batch_size=4, flush_interval=10, fsync="never")
+
+    for i in range(100):
+        writer.append(str(path), [i])
+    writer.close()
+
+    assert len(read_rows(path)) == 100
+
+
+def test_unknown_fsync_policy():
+    """An invalid fsync policy is rejected up front"""
+    with pytest.raises(ValueError):
+        CSVWriteBehind(fsync="sometimes")
+
+
+def test_failed_write_is_retried(tmp_path):
+    """Rows whose write fails are kept and written once the disk recovers"""
+    path = tmp_path / "missing" / "leads.csv"
+    writer = CSVWriteBehind(flush_interval=10, retry_interval=0.05)
+
+    writer.append(str(path), ["1", "Rohan Sharma"])
+    assert not writer.flush(timeout=5)
+    assert writer.write_failures >= 1
+    assert writer.rows_pending_retry == 1
+
+    writer.append(str(path), ["2", "Priya Iyer"])
+    path.parent.mkdir()
+    assert writer.flush(timeout=5)
+
+    assert read_rows(path) == [["1", "Rohan Sharma"], ["2", "Priya Iyer"]]
+    assert writer.rows_pending_retry == 0
+    assert writer.rows_dropped == 0
+    writer.close()
+
+
+def test_close_counts_rows_it_could_not_write(tmp_path):
+    """Rows still failing when the writer stops are counted, not silently lost"""
+    path = tmp_path / "missing" / "leads.csv"
+    writer = CSVWriteBehind(flush_interval=10, retry_interval=0.05)
+
+    for i in range(3):
+        writer.append(str(path), [i])
+    writer.close()
+
+    assert writer.rows_dropped == 3
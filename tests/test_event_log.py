@@ -0,0 +1,75 @@
+"""
+Unit tests for the structured event log
+"""
+
+import io
+import json
+
+import pytest
+
+import event_log
+from event_log import WARNING, log_event, setup_event_log, shutdown_event_log
+
+
+@pytest.fixture
+def stream():
+    buf = io.StringIO()
+    yield buf
+    shutdown_event_log()
+
+
+def test_json_lines(stream):
+    """Each event is one JSON object with ts, level, event and its fields"""
+    setup_event_log(fmt="json", stream=stream, log_file=None)
+    log_event("lead.created", lead_id="L1", name="Rohan Sharma", source=None)
+    shutdown_event_log()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["event"] == "lead.created"
+    assert entry["level"] == "INFO"
+    assert entry["lead_id"] == "L1"
+    assert entry["source"] is None
+    assert "ts" in entry
+
+
+def test_pretty_renderer(stream):
+    """The pretty sink renders one readable line per event"""
+    setup_event_log(fmt="pretty", stream=stream, log_file=None)
+    log_event("visit.scheduled", visit_id="V1", lead_id="L1")
+    shutdown_event_log()
+
+    line = stream.getvalue().strip()
+    assert "📅 visit.scheduled" in line
+    assert "visit_id=V1 lead_id=L1" in line
+
+
+def test_level_and_sampling(stream):
+    """Events below the level are dropped; sampling never drops warnings"""
+    setup_event_log(fmt="json", level="INFO", sample_rate=0.0, stream=stream, log_file=None)
+    log_event("debug.noise", event_log.DEBUG)
+    log_event("lead.created", lead_id="L1")
+    log_event("visit.lead_not_found", WARNING, lead_id="L2")
+    log_event("lead.created", sample=1.0, lead_id="L3")
+    shutdown_event_log()
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(e["event"], e["lead_id"]) for e in events] == [
+        ("visit.lead_not_found", "L2"),
+        ("lead.created", "L3"),
+    ]
+
+
+def test_file_sink(stream, tmp_path):
+    """log_file adds a JSON lines sink next to the console"""
+    path = tmp_path / "events.jsonl"
+    setup_event_log(fmt="pretty", stream=stream, log_file=str(path))
+    log_event("status.updated", lead_id="L1", new_status="WON")
+    shutdown_event_log()
+
+    assert json.loads(path.read_text())["new_status"] == "WON"
+
+
+def test_unknown_format():
+    """An invalid console format is rejected up front"""
+    with pytest.raises(ValueError):
+        setup_event_log(fmt="xml")
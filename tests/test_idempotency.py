@@ -0,0 +1,203 @@
+"""
+Unit tests for Idempotency-Key support on the CRM write endpoints
+"""
+
+import threading
+import time
+from uuid import uuid4
+
+import pytest
+import requests
+
+from crm_idempotency import IdempotencyCache, IdempotencyConflict
+
+
+# Base URL for mock CRM
+BASE_URL = "http://localhost:8001"
+
+
+def post(path, payload, key):
+    return requests.post(f"{BASE_URL}{path}", json=payload, headers={"Idempotency-Key": key})
+
+
+@pytest.fixture
+def lead_id():
+    response = requests.post(
+        f"{BASE_URL}/crm/leads",
+        json={"name": "Idempotent Lead", "phone": "9111111111", "city": "Mumbai"},
+    )
+    assert response.status_code == 200
+    return response.json()["lead_id"]
+
+
+def test_create_lead_replayed():
+    """Repeating a create with the same key returns the same lead"""
+    key = str(uuid4())
+    payload = {"name": "Retry Lead", "phone": "9222222222", "city": "Pune"}
+
+    first = post("/crm/leads", payload, key)
+    second = post("/crm/leads", payload, key)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+def test_schedule_visit_replayed(lead_id):
+    """A retried visit does not schedule a second one"""
+    key = str(uuid4())
+    payload = {"lead_id": lead_id, "visit_time": "2025-10-06T10:00:00+05:30"}
+
+    first = post("/crm/visits", payload, key)
+    second = post("/crm/visits", payload, key)
+    assert second.json()["visit_id"] == first.json()["visit_id"]
+
+    visits = requests.get(f"{BASE_URL}/crm/leads/{lead_id}/visits").json()["visits"]
+    assert len(visits) == 1
+
+
+def test_key_reused_with_different_body():
+    """The same key with a different body is rejected"""
+    key = str(uuid4())
+    post("/crm/leads", {"name": "A", "phone": "9333333333", "city": "Pune"}, key)
+    response = post("/crm/leads", {"name": "B", "phone": "9333333333", "city": "Pune"}, key)
+    assert response.status_code == 422
+
+
+def test_key_reused_with_different_if_match(lead_id):
+    """The same key and body with a different If-Match is rejected, not replayed"""
+    key = str(uuid4())
+    url = f"{BASE_URL}/crm/leads/{lead_id}/status"
+    first = requests.post(url, json={"status": "WON"}, headers={"Idempotency-Key": key, "If-Match": '"1"'})
+    assert first.status_code == 200
+
+    retry = requests.post(url, json={"status": "WON"}, headers={"Idempotency-Key": key, "If-Match": '"1"'})
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+
+    other = requests.post(url, json={"status": "WON"}, headers={"Idempotency-Key": key, "If-Match": '"7"'})
+    assert other.status_code == 422
+
+
+def test_failed_request_not_cached(lead_id):
+    """A 404 is not stored, so the same key can succeed later"""
+    key = str(uuid4())
+    missing = post("/crm/visits", {"lead_id": str(uuid4()), "visit_time": "2025-10-06T10:00:00"}, key)
+    assert missing.status_code == 404
+
+    payload = {"status": "WON"}
+    assert post(f"/crm/leads/{lead_id}/status", payload, key).status_code == 200
+
+
+def test_batch_replayed():
+    """Batch endpoints honour the key for the whole batch"""
+    key = str(uuid4())
+    payload = {"leads": [{"name": "Batch Retry", "phone": "9444444444", "city": "Delhi"}]}
+
+    first = post("/crm/leads/batch", payload, key)
+    second = post("/crm/leads/batch", payload, key)
+    assert second.json() == first.json()
+    assert second.headers.get("Idempotent-Replayed") == "true"
+
+
+def test_batch_item_replayed_by_single_retry(lead_id):
+    """An item written by a batch is replayed when retried on its own with its key"""
+    lead_key, status_key = str(uuid4()), str(uuid4())
+    lead = {"name": "Batch Item", "phone": "9555555555", "city": "Pune"}
+
+    batch = post("/crm/leads/batch", {"leads": [{**lead, "idempotency_key": lead_key}]}, str(uuid4()))
+    single = post("/crm/leads", lead, lead_key)
+    assert single.json() == batch.json()["results"][0]
+    assert single.headers.get("Idempotent-Replayed") == "true"
+
+    update = {"status": "IN_PROGRESS"}
+    batch = requests.post(
+        f"{BASE_URL}/crm/leads/status/batch",
+        json={"updates": [{"lead_id": lead_id, **update, "idempotency_key": status_key}]},
+    )
+    single = post(f"/crm/leads/{lead_id}/status", update, status_key)
+    assert single.json() == batch.json()["results"][0]
+    assert requests.get(f"{BASE_URL}/crm/leads/{lead_id}").json()["version"] == 2
+
+
+def test_batch_skips_items_already_written(lead_id):
+    """A batch replays items whose keys a single request already used"""
+    key = str(uuid4())
+    visit = {"lead_id": lead_id, "visit_time": "2026-03-02T10:00:00"}
+    first = post("/crm/visits", visit, key).json()
+
+    response = requests.post(
+        f"{BASE_URL}/crm/visits/batch",
+        json={"visits": [
+            {**visit, "idempotency_key": key},
+            {"lead_id": lead_id, "visit_time": "2026-03-03T10:00:00", "idempotency_key": str(uuid4())},
+        ]},
+    )
+
+    results = response.json()["results"]
+    assert results[0] == first
+    assert results[1]["status"] == "SCHEDULED"
+
+
+def test_cache_runs_handler_once():
+    """Concurrent requests with one key call the handler once"""
+    cache = IdempotencyCache()
+    calls = []
+
+    def handler():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"lead_id": "L1"}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.run("k", "fp", handler)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False] + [True] * 7
+    assert cache.hits == 7
+
+
+def test_cache_expiry_and_bound():
+    """Entries expire after ttl and the oldest are evicted past max_keys"""
+    cache = IdempotencyCache(max_keys=2, ttl=0.05)
+    for key in ("a", "b", "c"):
+        cache.run(key, "fp", lambda: key)
+    assert len(cache) == 2
+    assert cache.run("a", "fp", lambda: "again") == ("again", False)
+
+    time.sleep(0.06)
+    assert cache.run("b", "fp", lambda: "fresh") == ("fresh", False)
+
+    with pytest.raises(IdempotencyConflict):
+        cache.run("b", "other", lambda: None)
+
+
+def test_cache_run_many():
+    """run_many calls the handler only for items without a stored response"""
+    cache = IdempotencyCache()
+    cache.run("a", "fp-a", lambda: "single a")
+    calls = []
+
+    def handler(indices):
+        calls.append(indices)
+        return [{"error": "not found"} if i == 2 else f"batch {i}" for i in indices]
+
+    results = cache.run_many(["a", "b", "c", None], ["fp-a", "fp-b", "fp-c", "fp"], handler,
+                             cacheable=lambda response: "error" not in response)
+
+    assert calls == [[1, 2, 3]]
+    assert results == [("single a", True), ("batch 1", False), ({"error": "not found"}, False), ("batch 3", False)]
+    # Failed items are not stored, so they run again
+    assert cache.run("b", "fp-b", lambda: "again") == ("batch 1", True)
+    assert cache.run("c", "fp-c", lambda: "again") == ("again", False)
+
+    with pytest.raises(IdempotencyConflict):
+        cache.run_many(["d", "d"], ["fp", "fp"], handler)
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from jitter_buffer import JitterBuffer
+
+RATE = 24000
+FRAME = 480 * 2  # 20 ms at 24 kHz
+
+
+def pcm(ms, value=1):
+    return value.to_bytes(2, "little") * int(RATE * ms / 1000)
+
+
+def write(buf, data):
+    asyncio.run(buf.write(data))
+
+
+def test_constant_size_frames_in_order():
+    buf = JitterBuffer(RATE, target_ms=40)
+    data = bytes(range(256)) * 30  # 7680 bytes = 160 ms, in odd-sized chunks
+
+    async def drain():
+        for i in range(0, len(data), 700):
+            await buf.write(data[i:i + 700])
+        return [await buf.read() for _ in range(len(data) // FRAME)]
+
+    frames = asyncio.run(drain())
+    assert {len(f) for f in frames} == {FRAME}
+    assert b"".join(frames) == data
+    assert buf.underruns == 0
+    assert buf.frames_played == 8
+
+
+def test_underrun_pads_with_silence_and_reprimes():
+    buf = JitterBuffer(RATE, target_ms=20)
+
+    async def play():
+        await buf.write(pcm(30))
+        first = await buf.read()
+        second = await buf.read()
+        return first, second
+
+    first, second = asyncio.run(play())
+    assert first == pcm(20)
+    assert second == pcm(10) + b"\x00" * (FRAME // 2)
+    assert buf.underruns == 1
+    assert not buf.playing
+
+
+def test_overrun_waits_for_space():
+    buf = JitterBuffer(RATE, target_ms=20, max_ms=100)
+
+    async def play():
+        await buf.write(pcm(80, 1))
+        writer = asyncio.create_task(buf.write(pcm(40, 2)))
+        await asyncio.sleep(0.01)
+        assert not writer.done()  # 20 ms doesn't fit until playback frees it
+        assert buf.latency == pytest.approx(0.1)
+        frames = [await buf.read()]
+        await writer
+        frames += [await buf.read() for _ in range(5)]
+        return frames
+
+    assert b"".join(asyncio.run(play())) == pcm(80, 1) + pcm(40, 2)
+    assert buf.overruns == 1
+    assert buf.stats()["dropped_ms"] == 0
+
+
+def test_write_larger_than_buffer_goes_in_pieces():
+    buf = JitterBuffer(RATE, target_ms=20, max_ms=100)
+    data = pcm(60, 3) + pcm(100, 4)
+
+    async def play():
+        writer = asyncio.create_task(buf.write(data))
+        out = b""
+        while len(out) < len(data):
+            out += await buf.read_available()
+        await writer
+        return out
+
+    assert asyncio.run(play()) == data
+    assert buf.overruns == 1
+
+
+def test_clear_drops_audio_of_waiting_write():
+    buf = JitterBuffer(RATE, target_ms=20, max_ms=100)
+
+    async def barge_in():
+        await buf.write(pcm(100, 1))
+        writer = asyncio.create_task(buf.write(pcm(40, 2)))
+        await asyncio.sleep(0.01)
+        buf.clear()
+        await asyncio.wait_for(writer, 1)
+
+    asyncio.run(barge_in())
+    assert len(buf) == 0
+    assert buf.stats()["dropped_ms"] == 140
+
+
+def test_prime_waits_for_target_latency():
+    buf = JitterBuffer(RATE, target_ms=100)
+
+    async def play():
+        await buf.write(pcm(20))
+        reader = asyncio.create_task(buf.read())
+        await asyncio.sleep(0.01)
+        assert not reader.done()  # 20 ms buffered, target is 100 ms
+        await buf.write(pcm(100))
+        await asyncio.sleep(0)
+        return await reader
+
+    assert asyncio.run(play()) == pcm(20)
+    assert buf.playing
+
+
+def test_prime_gives_up_after_target_latency():
+    buf = JitterBuffer(RATE, target_ms=50)
+
+    async def play():
+        await buf.write(pcm(20))
+        return await asyncio.wait_for(buf.read(), 1)
+
+    assert asyncio.run(play()) == pcm(20)
+
+
+def test_clear_and_stats():
+    buf = JitterBuffer(RATE)
+    write(buf, pcm(200))
+    assert buf.stats()["latency_ms"] == 200
+    buf.clear()
+    assert len(buf) == 0
+    assert buf.stats()["peak_latency_ms"] == 200
+    assert buf.stats()["dropped_ms"] == 200
+
+
+def test_flush_plays_out_without_underrun():
+    buf = JitterBuffer(RATE, target_ms=1000)
+
+    async def play():
+        await buf.write(pcm(30))
+        buf.flush()
+        return await asyncio.wait_for(buf.read(), 0.1), await buf.read()
+
+    first, last = asyncio.run(play())
+    assert first == pcm(20)
+    assert last == pcm(10) + b"\x00" * (FRAME // 2)
+    assert buf.underruns == 0
@@ -0,0 +1,141 @@
+"""
+Unit tests for listing leads and visits
+Tests cursor pagination, filters, field projection and NDJSON streaming on
+GET /crm/leads and GET /crm/visits
+"""
+
+import json
+import pytest
+import requests
+from uuid import uuid4
+
+
+# Base URL for mock CRM
+BASE_URL = "http://localhost:8001"
+
+
+@pytest.fixture
+def city():
+    """A city name unique to this test so other leads don't match the filter"""
+    return f"City-{uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def created_leads(city):
+    """Fixture to create five leads in the same city"""
+    lead_ids = []
+    for i in range(5):
+        payload = {
+            "name": f"List Lead {i}",
+            "phone": f"700000000{i}",
+            "city": city,
+            "source": "Website" if i % 2 == 0 else "Referral"
+        }
+        response = requests.post(f"{BASE_URL}/crm/leads", json=payload)
+        assert response.status_code == 200
+        lead_ids.append(response.json()["lead_id"])
+    return lead_ids
+
+
+def test_list_leads_cursor_pagination(city, created_leads):
+    """Test paging through filtered leads with next_cursor"""
+    seen = []
+    params = {"city": city, "limit": 2}
+
+    while True:
+        response = requests.get(f"{BASE_URL}/crm/leads", params=params)
+        assert response.status_code == 200
+        data = response.json()
+
+        assert len(data["leads"]) <= 2
+        seen.extend(lead["lead_id"] for lead in data["leads"])
+
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert seen == created_leads
+
+
+def test_list_leads_filter_by_source(city, created_leads):
+    """Test combining city and source filters"""
+    response = requests.get(
+        f"{BASE_URL}/crm/leads",
+        params={"city": city, "source": "Referral"}
+    )
+
+    assert response.status_code == 200
+    leads = response.json()["leads"]
+    assert [lead["lead_id"] for lead in leads] == [created_leads[1], created_leads[3]]
+
+
+def test_list_leads_field_projection(city, created_leads):
+    """Test returning only the requested fields"""
+    response = requests.get(
+        f"{BASE_URL}/crm/leads",
+        params={"city": city, "fields": "lead_id,status"}
+    )
+
+    assert response.status_code == 200
+    for lead in response.json()["leads"]:
+        assert set(lead) == {"lead_id", "status"}
+
+
+def test_list_leads_unknown_field():
+    """Test projection with a field that does not exist"""
+    response = requests.get(f"{BASE_URL}/crm/leads", params={"fields": "lead_id,password"})
+
+    assert response.status_code == 400
+
+
+def test_list_leads_invalid_cursor():
+    """Test listing with a malformed cursor"""
+    response = requests.get(f"{BASE_URL}/crm/leads", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_list_leads_limit_too_large():
+    """Test that page size is capped"""
+    response = requests.get(f"{BASE_URL}/crm/leads", params={"limit": 100000})
+
+    assert response.status_code == 422
+
+
+def test_list_leads_ndjson_stream(city, created_leads):
+    """Test streaming every matching lead as NDJSON across internal pages"""
+    response = requests.get(
+        f"{BASE_URL}/crm/leads",
+        params={"city": city, "format": "ndjson", "limit": 2},
+        stream=True
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    leads = [json.loads(line) for line in response.iter_lines() if line]
+    assert [lead["lead_id"] for lead in leads] == created_leads
+
+
+def test_list_visits_filter_by_lead(created_leads):
+    """Test listing visits for a single lead"""
+    lead_id = created_leads[0]
+    for day in (5, 6):
+        response = requests.post(f"{BASE_URL}/crm/visits", json={
+            "lead_id": lead_id,
+            "visit_time": f"2025-10-0{day}T15:00:00+05:30"
+        })
+        assert response.status_code == 200
+
+    response = requests.get(f"{BASE_URL}/crm/visits", params={"lead_id": lead_id})
+
+    assert response.status_code == 200
+    visits = response.json()["visits"]
+    assert len(visits) == 2
+    assert all(visit["lead_id"] == lead_id for visit in visits)
+
+
+if __name__ == "__main__":
+    print("Running Lead List Tests...")
+    print("Make sure mock CRM server is running on port 8001!")
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,106 @@
+"""
+Unit tests for lead lookups and phone-based duplicate detection
+Tests /crm/leads/lookup, /crm/leads/{lead_id}, /crm/leads/{lead_id}/visits
+and POST /crm/leads?dedup=true
+"""
+
+import random
+import pytest
+import requests
+
+
+# Base URL for mock CRM
+BASE_URL = "http://localhost:8001"
+
+
+@pytest.fixture
+def phone():
+    """A phone number unlikely to be used by any other test"""
+    return "6" + "".join(random.choice("0123456789") for _ in range(9))
+
+
+def test_lookup_by_phone(phone):
+    """Test finding a lead by phone, ignoring +91 prefix and spaces"""
+    payload = {"name": "Lookup Lead", "phone": phone, "city": "Pune"}
+    response = requests.post(f"{BASE_URL}/crm/leads", json=payload)
+    assert response.status_code == 200
+    lead_id = response.json()["lead_id"]
+
+    formatted = f"+91 {phone[:5]} {phone[5:]}"
+    response = requests.get(f"{BASE_URL}/crm/leads/lookup", params={"phone": formatted})
+
+    assert response.status_code == 200
+    leads = response.json()["leads"]
+    assert [lead["lead_id"] for lead in leads] == [lead_id]
+
+
+def test_lookup_unknown_phone():
+    """Test lookup for a phone with no leads"""
+    response = requests.get(f"{BASE_URL}/crm/leads/lookup", params={"phone": "0000000001"})
+
+    assert response.status_code == 200
+    assert response.json()["leads"] == []
+
+
+def test_create_lead_dedup_returns_existing(phone):
+    """Test that dedup mode returns the existing lead for a known phone"""
+    payload = {"name": "Dedup Lead", "phone": phone, "city": "Pune"}
+
+    first = requests.post(f"{BASE_URL}/crm/leads", params={"dedup": "true"}, json=payload)
+    assert first.status_code == 200
+    assert first.json()["duplicate"] is False
+
+    payload["phone"] = "+91" + phone
+    second = requests.post(f"{BASE_URL}/crm/leads", params={"dedup": "true"}, json=payload)
+    assert second.status_code == 200
+    data = second.json()
+
+    assert data["duplicate"] is True
+    assert data["lead_id"] == first.json()["lead_id"]
+
+    response = requests.get(f"{BASE_URL}/crm/leads/lookup", params={"phone": phone})
+    assert len(response.json()["leads"]) == 1
+
+
+def test_create_lead_without_dedup_allows_duplicates(phone):
+    """Test that duplicates are still created when dedup is off"""
+    payload = {"name": "Twin Lead", "phone": phone, "city": "Pune"}
+
+    first = requests.post(f"{BASE_URL}/crm/leads", json=payload)
+    second = requests.post(f"{BASE_URL}/crm/leads", json=payload)
+
+    assert first.json()["lead_id"] != second.json()["lead_id"]
+
+
+def test_get_lead_and_visits(phone):
+    """Test fetching a single lead and its visits"""
+    payload = {"name": "Visit Lead", "phone": phone, "city": "Pune"}
+    lead_id = requests.post(f"{BASE_URL}/crm/leads", json=payload).json()["lead_id"]
+    requests.post(f"{BASE_URL}/crm/visits", json={
+        "lead_id": lead_id,
+        "visit_time": "2025-10-05T15:00:00+05:30"
+    })
+
+    response = requests.get(f"{BASE_URL}/crm/leads/{lead_id}")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Visit Lead"
+
+    response = requests.get(f"{BASE_URL}/crm/leads/{lead_id}/visits")
+    assert response.status_code == 200
+    visits = response.json()["visits"]
+    assert len(visits) == 1
+    assert visits[0]["lead_id"] == lead_id
+
+
+def test_get_lead_not_found():
+    """Test fetching a lead that does not exist"""
+    fake_lead_id = "00000000-0000-0000-0000-000000000000"
+
+    assert requests.get(f"{BASE_URL}/crm/leads/{fake_lead_id}").status_code == 404
+    assert requests.get(f"{BASE_URL}/crm/leads/{fake_lead_id}/visits").status_code == 404
+
+
+if __name__ == "__main__":
+    print("Running Lead Lookup Tests...")
+    print("Make sure mock CRM server is running on port 8001!")
+    pytest.main([__file__, "-v"])
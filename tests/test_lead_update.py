@@ -234,6 +234,59 @@ def test_update_lead_with_long_notes(created_lead):
     assert response.status_code == 200
 
 
+def test_get_lead_returns_version_as_etag(created_lead):
+    """GET returns the lead's version and the same value as ETag"""
+    response = requests.get(f"{BASE_URL}/crm/leads/{created_lead}")
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_update_with_matching_if_match(created_lead):
+    """If-Match with the current version updates the lead and returns the next ETag"""
+    response = requests.post(
+        f"{BASE_URL}/crm/leads/{created_lead}/status",
+        json={"status": "IN_PROGRESS"},
+        headers={"If-Match": '"1"'},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+
+
+def test_update_with_stale_if_match_is_rejected(created_lead):
+    """A stale If-Match gets 412 and the lead keeps the other writer's change"""
+    first = requests.post(
+        f"{BASE_URL}/crm/leads/{created_lead}/status",
+        json={"status": "WON"},
+        headers={"If-Match": '"1"'},
+    )
+    assert first.status_code == 200
+
+    second = requests.post(
+        f"{BASE_URL}/crm/leads/{created_lead}/status",
+        json={"status": "LOST"},
+        headers={"If-Match": '"1"'},
+    )
+
+    assert second.status_code == 412
+    assert second.headers["ETag"] == '"2"'
+    assert requests.get(f"{BASE_URL}/crm/leads/{created_lead}").json()["status"] == "WON"
+
+
+def test_update_with_malformed_if_match(created_lead):
+    """An If-Match that is not a version is a client error"""
+    response = requests.post(
+        f"{BASE_URL}/crm/leads/{created_lead}/status",
+        json={"status": "WON"},
+        headers={"If-Match": "yesterday"},
+    )
+
+    assert response.status_code == 400
+
+
 if __name__ == "__main__":
     print("Running Lead Update Tests...")
     print("Make sure mock CRM server is running on port 8001!")
@@ -0,0 +1,184 @@
+"""
+End-to-end AudioLoop runs against the local Live API stand-in
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot  # noqa: E402
+import local_live  # noqa: E402
+from audio_io import MemorySink, MemorySource, SEND_SAMPLE_RATE  # noqa: E402
+
+
+def speech(seconds, silence_after):
+    t = np.arange(int(SEND_SAMPLE_RATE * seconds)) / SEND_SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 300 * t) * 8000).astype("<i2").tobytes()
+    return pcm + b"\x00" * (int(SEND_SAMPLE_RATE * silence_after) * 2)
+
+
+def fake_tools(monkeypatch):
+    calls = []
+
+    def tool(name, result):
+        async def call(*args, idempotency_key=None):
+            calls.append((name, args))
+            return result
+        monkeypatch.setitem(live_voice_bot.TOOL_FUNCTIONS, name, call)
+
+    tool("createLead", {"lead_id": "lead-1", "status": "NEW"})
+    tool("scheduleVisit", {"visit_id": "visit-1", "status": "SCHEDULED"})
+    tool("updateLeadStatus", {"lead_id": "lead-1", "status": "IN_PROGRESS"})
+    return calls
+
+
+def run_against_local(monkeypatch, script, pcm):
+    server = local_live.LocalLiveServer(script)
+    sink = MemorySink()
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(pcm, realtime=True), sink=sink, vad_mode="off"
+    )
+
+    async def main():
+        async with server.serve("127.0.0.1", 0) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            client = local_live.LocalLiveClient(f"ws://127.0.0.1:{port}")
+            monkeypatch.setattr(live_voice_bot, "client", client)
+            await loop.run_session()
+
+    asyncio.run(main())
+    return server, loop, sink
+
+
+def test_scripted_tool_calls_reach_the_crm_and_audio_plays(monkeypatch):
+    calls = fake_tools(monkeypatch)
+    script = {
+        "turn_silence_ms": 200,
+        "turns": [[dict(step, pace=0) if "audio_ms" in step else step for step in turn]
+                  for turn in local_live.DEFAULT_SCRIPT["turns"]],
+    }
+    pcm = b"".join(speech(0.3, 0.7) for _ in range(3))
+
+    server, loop, sink = run_against_local(monkeypatch, script, pcm)
+
+    assert [name for name, _ in calls] == ["createLead", "scheduleVisit", "updateLeadStatus"]
+    # Later calls use the lead id returned by createLead
+    assert calls[1][1][0] == "lead-1"
+    assert calls[2][1][:2] == ("lead-1", "IN_PROGRESS")
+    assert server.stats()["turns"] == 3
+    assert server.stats()["tool_calls"] == 3
+    # 1.2 + 1.0 + 0.8 seconds of 24 kHz model audio
+    assert len(sink.data) == int(local_live.RECEIVE_SAMPLE_RATE * 3.0) * 2
+
+
+def batch_loop(monkeypatch, batch, timeout):
+    monkeypatch.setitem(live_voice_bot.BATCH_TOOL_FUNCTIONS, "createLead", batch)
+    monkeypatch.setattr(live_voice_bot, "TOOL_CALL_TIMEOUT", timeout)
+    loop = live_voice_bot.AudioLoop(source=MemorySource(b""), sink=MemorySink(), vad_mode="off")
+    fcs = [
+        SimpleNamespace(id=f"call-{i}", name="createLead", args={"name": f"Lead {i}"})
+        for i in range(2)
+    ]
+    return loop, fcs
+
+
+def test_batch_timeout_retries_each_call_in_remaining_budget(monkeypatch):
+    """A batch that times out early is retried call by call, within the same deadline"""
+    keys = []
+
+    async def failing_batch(items, item_keys):
+        keys.extend(item_keys)
+        await asyncio.sleep(0.05)
+        raise asyncio.TimeoutError
+
+    async def create_lead(name, *args, idempotency_key=None):
+        keys.append(idempotency_key)
+        if name == "Lead 1":
+            await asyncio.sleep(10)  # misses what is left of the deadline
+        return {"lead_id": "lead-1", "status": "NEW"}
+
+    monkeypatch.setitem(live_voice_bot.TOOL_FUNCTIONS, "createLead", create_lead)
+    loop, fcs = batch_loop(monkeypatch, failing_batch, 0.3)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        results = await loop.execute_batch("createLead", fcs)
+        return results, asyncio.get_running_loop().time() - started
+
+    results, elapsed = asyncio.run(run())
+
+    assert [fc for fc, _ in results] == fcs
+    assert results[0][1] == {"lead_id": "lead-1", "status": "NEW"}
+    assert "timed out" in results[1][1]["error"]
+    assert elapsed < 0.45
+    # The batch and the single calls use the same per-call keys
+    assert keys[:2] == [loop.idempotency_key(fc) for fc in fcs]
+    assert sorted(keys[2:]) == keys[:2]
+
+
+def test_batch_timeout_with_budget_spent(monkeypatch):
+    """A batch that uses up the whole deadline reports the timeout for every call"""
+    calls = fake_tools(monkeypatch)
+
+    async def slow_batch(items, item_keys):
+        await asyncio.sleep(1)
+
+    loop, fcs = batch_loop(monkeypatch, slow_batch, 0.05)
+
+    results = asyncio.run(loop.execute_batch("createLead", fcs))
+
+    assert [fc for fc, _ in results] == fcs
+    assert all("timed out" in result["error"] for _, result in results)
+    assert calls == []
+
+
+def test_caller_speech_interrupts_scripted_audio(monkeypatch):
+    fake_tools(monkeypatch)
+    script = {"turn_silence_ms": 200, "turns": [[{"audio_ms": 3000, "chunk_ms": 40, "pace": 1.0}]]}
+    # The second utterance starts while the first answer is still playing
+    pcm = speech(0.3, 0.6) + speech(0.3, 0.8)
+
+    server, loop, sink = run_against_local(monkeypatch, script, pcm)
+
+    assert server.stats()["interruptions"] == 1
+    assert loop.interruptions == 1
+    assert len(sink.data) < int(local_live.RECEIVE_SAMPLE_RATE * 3.0) * 2
+
+
+def test_unanswered_tool_call_ends_the_turn(monkeypatch):
+    """A client that never answers a tool call gets an error turn, not a dropped connection"""
+    monkeypatch.setattr(local_live, "TOOL_RESPONSE_TIMEOUT", 0.1)
+    server = local_live.LocalLiveServer(
+        {"turns": [[{"tool_call": "createLead", "args": {}}, {"audio_ms": 40, "pace": 0}]]}
+    )
+
+    async def main():
+        async with server.serve("127.0.0.1", 0) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            client = local_live.LocalLiveClient(f"ws://127.0.0.1:{port}")
+            async with client.connect("local", live_voice_bot.get_config()) as session:
+                turns = []
+                for _ in range(2):
+                    await session.send(input="hello", end_of_turn=True)
+                    turns.append([message async for message in session.receive()])
+                return turns
+
+    turns = asyncio.run(asyncio.wait_for(main(), 5))
+
+    for messages in turns:
+        call_id = messages[0].tool_call.function_calls[0].id
+        assert messages[1].tool_call_cancellation.ids == [call_id]
+        assert messages[2].server_content.model_turn.parts[0].text == "Tool call timed out"
+        assert messages[-1].server_content.turn_complete
+    assert server.stats()["tool_timeouts"] == 2
+    assert server.stats()["turns"] == 2
+
+
+def test_placeholders_are_filled_from_tool_responses():
+    known = {"lead_id": "lead-7"}
+    args = {"lead_id": "{lead_id}", "notes": ["{lead_id}", "{missing}"], "n": 3}
+    assert local_live._fill(args, known) == {"lead_id": "lead-7", "notes": ["lead-7", "{missing}"], "n": 3}
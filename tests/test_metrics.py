@@ -0,0 +1,116 @@
+"""
+Unit tests for the latency histograms and the /metrics endpoints
+"""
+
+import asyncio
+
+import pytest
+import requests
+
+from metrics import MetricsRegistry, serve_metrics
+
+# Base URL for mock CRM
+BASE_URL = "http://localhost:8001"
+
+
+def test_quantiles_from_buckets():
+    registry = MetricsRegistry()
+    h = registry.histogram("t_seconds", "test", buckets=(0.01, 0.1, 1.0))
+    assert h.quantile(0.5) is None
+
+    for _ in range(90):
+        h.observe(0.005)
+    for _ in range(10):
+        h.observe(0.5)
+
+    assert h.quantile(0.5) == pytest.approx(0.01 * 50 / 90)
+    assert 0.1 < h.quantile(0.95) < 1.0
+    assert h.summary()["count"] == 100
+    assert h.summary()["p99_ms"] > h.summary()["p95_ms"] > h.summary()["p50_ms"]
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.histogram("t_seconds", "Test latency", buckets=(0.1, 1.0), tool="createLead").observe(0.2)
+    registry.histogram("t_seconds", tool="createLead").observe(5)
+
+    text = registry.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{tool="createLead",le="0.1"} 0' in text
+    assert 't_seconds_bucket{tool="createLead",le="1.0"} 1' in text
+    assert 't_seconds_bucket{tool="createLead",le="+Inf"} 2' in text
+    assert 't_seconds_count{tool="createLead"} 2' in text
+    assert 't_seconds_sum{tool="createLead"} 5.2' in text
+
+
+def test_same_labels_same_histogram():
+    registry = MetricsRegistry()
+    a = registry.histogram("t_seconds", route="/a", method="GET")
+    assert registry.histogram("t_seconds", method="GET", route="/a") is a
+    assert registry.histogram("t_seconds", route="/b", method="GET") is not a
+
+
+def test_render_gauges_and_counters():
+    registry = MetricsRegistry()
+    state = {"open": 0, "opened": 0}
+    registry.gauge("t_state", "Test state", lambda: state["open"], state="open")
+    registry.counter("t_opened_total", "Test opens", lambda: state["opened"])
+    state.update(open=1, opened=3)
+
+    text = registry.render()
+    assert "# TYPE t_state gauge" in text
+    assert 't_state{state="open"} 1' in text
+    assert "# TYPE t_opened_total counter" in text
+    assert "t_opened_total 3" in text
+
+
+def test_bot_exports_crm_breaker(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    import live_voice_bot
+    from crm_client import CircuitBreaker
+
+    monkeypatch.setattr(live_voice_bot.crm, "breaker", CircuitBreaker(failure_threshold=1))
+    live_voice_bot.crm.breaker.record_failure()
+
+    text = live_voice_bot.REGISTRY.render()
+    assert 'crm_circuit_breaker_state{state="open"} 1' in text
+    assert 'crm_circuit_breaker_state{state="closed"} 0' in text
+    assert "crm_circuit_breaker_opened_total 1" in text
+
+
+def test_bot_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.histogram("voice_response_latency_seconds", "test").observe(0.4)
+
+    async def scrape():
+        server = await serve_metrics("127.0.0.1", 0, registry)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response.decode()
+        finally:
+            server.close()
+
+    response = asyncio.run(scrape())
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert "voice_response_latency_seconds_count 1" in response
+
+
+def test_crm_metrics_endpoint():
+    """CRM requests are timed per route template"""
+    created = requests.post(
+        f"{BASE_URL}/crm/leads",
+        json={"name": "Metrics Lead", "phone": "9222222222", "city": "Pune"},
+    )
+    requests.get(f"{BASE_URL}/crm/leads/{created.json()['lead_id']}")
+
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/crm/leads",status="200"' in response.text
+    assert 'route="/crm/leads/{lead_id}"' in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
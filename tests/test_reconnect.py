@@ -0,0 +1,181 @@
+"""
+Live API reconnects: session resumption, gap buffering and give-up rules
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+from google.genai import errors
+from websockets.exceptions import ConnectionClosedError
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot  # noqa: E402
+from audio_io import MemorySink, MemorySource  # noqa: E402
+from tests.fake_live import server_message  # noqa: E402
+
+CHUNK = 2048  # bytes per MemorySource read (1024 samples)
+
+
+class FlakyLiveSession:
+    """Echoes audio; hands out a resumption handle, then fails after ``fail_after`` chunks"""
+
+    def __init__(self, handle, fail_after=None, error=None, go_away=False):
+        self.responses = asyncio.Queue()
+        self.received = []
+        self.handle = handle
+        self.fail_after = fail_after
+        self.error = error or ConnectionClosedError(None, None)
+        self.go_away = go_away
+
+    async def send(self, input=None, end_of_turn=False):
+        self.received.append(input["data"])
+        await self.responses.put(server_message(data=input["data"]))
+        if len(self.received) == self.fail_after:
+            await self.responses.put(server_message(go_away=True) if self.go_away else self.error)
+
+    async def receive(self):
+        yield server_message(resumption_handle=self.handle)
+        while True:
+            response = await self.responses.get()
+            if isinstance(response, Exception):
+                raise response
+            yield response
+
+
+def scripted_connect(monkeypatch, sessions, reconnect_delay=0.0):
+    """Hand out ``sessions`` in order; later connects wait ``reconnect_delay``"""
+    configs = []
+
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        configs.append(config)
+        if len(configs) > 1:
+            await asyncio.sleep(reconnect_delay)
+        yield sessions[len(configs) - 1]
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    return configs
+
+
+def run(pcm, tail_seconds=0.5):
+    sink = MemorySink()
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(pcm, realtime=True, tail_seconds=tail_seconds), sink=sink, vad_mode="off"
+    )
+    asyncio.run(loop.run_session())
+    return loop, sink
+
+
+def test_reconnect_resumes_and_flushes_gap(monkeypatch):
+    first = FlakyLiveSession("handle-1", fail_after=3)
+    second = FlakyLiveSession("handle-2")
+    configs = scripted_connect(monkeypatch, [first, second], reconnect_delay=0.3)
+    gaps_before = live_voice_bot.RECONNECT_GAP.count
+
+    pcm = bytes(range(1, 256)) * 80  # ~10 chunks of caller audio
+    loop, sink = run(pcm)
+
+    assert loop.reconnects == 1
+    assert live_voice_bot.RECONNECT_GAP.count == gaps_before + 1
+    assert configs[0].session_resumption.handle is None
+    assert configs[1].session_resumption.handle == "handle-1"
+    assert loop.resumption_handle == "handle-2"
+    # Nothing the caller said was lost: audio captured during the gap was
+    # sent on the new connection, in order
+    assert b"".join(first.received + second.received)[:len(pcm)] == pcm
+    assert loop.gap_dropped_bytes == 0
+
+
+def test_gap_buffer_is_bounded(monkeypatch):
+    first = FlakyLiveSession("handle-1", fail_after=1)
+    second = FlakyLiveSession("handle-2")
+    scripted_connect(monkeypatch, [first, second], reconnect_delay=0.5)
+    monkeypatch.setattr(live_voice_bot, "RECONNECT_BUFFER_SECONDS", 3 * CHUNK / 2 / 16000)
+
+    pcm = bytes(range(1, 256)) * 80
+    loop, sink = run(pcm)
+
+    assert loop.reconnects == 1
+    assert loop.gap_dropped_bytes > 0
+    # The newest audio from the gap survives, the oldest was dropped
+    sent = b"".join(first.received + second.received)
+    assert len(sent) < len(pcm) + int(0.5 * 32000)
+    assert sent[:CHUNK] == pcm[:CHUNK]
+
+
+class TextLiveSession(FlakyLiveSession):
+    """Records typed text; drops the connection on the first text if ``fail_on_text``"""
+
+    def __init__(self, handle, fail_on_text=False):
+        super().__init__(handle)
+        self.fail_on_text = fail_on_text
+        self.texts = []
+
+    async def send(self, input=None, end_of_turn=False):
+        if isinstance(input, str):
+            if self.fail_on_text:
+                await self.responses.put(self.error)
+                raise self.error
+            self.texts.append((input, end_of_turn))
+
+
+def test_typed_text_survives_reconnect(monkeypatch):
+    first = TextLiveSession("handle-1", fail_on_text=True)
+    second = TextLiveSession("handle-2")
+    scripted_connect(monkeypatch, [first, second], reconnect_delay=0.1)
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(b"\x00" * CHUNK * 4, realtime=True, tail_seconds=0.5),
+        sink=MemorySink(),
+        vad_mode="off",
+    )
+
+    async def main():
+        session = asyncio.create_task(loop.run_session())
+        await loop.connected.wait()
+        await loop.send_user_text("Book a visit for Sunday")
+        await session
+
+    asyncio.run(main())
+
+    assert loop.reconnects == 1
+    assert second.texts == [("Book a visit for Sunday", True)]
+
+
+def test_go_away_reconnects_immediately(monkeypatch):
+    first = FlakyLiveSession("handle-1", fail_after=2, go_away=True)
+    second = FlakyLiveSession("handle-2")
+    configs = scripted_connect(monkeypatch, [first, second])
+
+    loop, sink = run(bytes(range(1, 256)) * 40)
+
+    assert loop.reconnects == 1
+    assert configs[1].session_resumption.handle == "handle-1"
+
+
+def test_fatal_close_is_not_retried(monkeypatch):
+    policy_violation = errors.APIError(1008, {"error": {"message": "bad request"}})
+    first = FlakyLiveSession("handle-1", fail_after=1, error=policy_violation)
+    configs = scripted_connect(monkeypatch, [first])
+
+    loop, sink = run(bytes(range(1, 256)) * 40)
+
+    assert len(configs) == 1
+    assert loop.reconnects == 0
+
+
+@pytest.mark.parametrize(
+    "exc, lost",
+    [
+        (ConnectionClosedError(None, None), True),
+        (errors.APIError(1011, {}), True),
+        (errors.APIError(1008, {}), False),
+        (ExceptionGroup("tasks", [ConnectionResetError()]), True),
+        (ExceptionGroup("tasks", [ConnectionResetError(), ValueError()]), False),
+        (ValueError(), False),
+    ],
+)
+def test_connection_lost(exc, lost):
+    assert live_voice_bot.connection_lost(exc) is lost
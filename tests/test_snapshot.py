@@ -0,0 +1,175 @@
+"""
+Unit tests for snapshot + log replay recovery of the in-memory CRM store
+"""
+
+import csv
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from crm_compact import CompactStorage
+from crm_snapshot import recover, write_snapshot
+from crm_storage import MemoryStorage
+from crm_writer import CSVWriteBehind
+
+
+@pytest.fixture
+def csv_paths(tmp_path):
+    """CSV logs with the same headers mock_crm.py writes"""
+    paths = {
+        "leads": str(tmp_path / "crm_leads.csv"),
+        "visits": str(tmp_path / "crm_visits.csv"),
+        "updates": str(tmp_path / "crm_updates.csv"),
+    }
+    headers = {
+        "leads": ['lead_id', 'name', 'phone', 'city', 'source', 'status', 'created_at'],
+        "visits": ['visit_id', 'lead_id', 'visit_time', 'notes', 'status', 'created_at'],
+        "updates": ['lead_id', 'old_status', 'new_status', 'notes', 'updated_at', 'version'],
+    }
+    for name, path in paths.items():
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(headers[name])
+    return paths
+
+
+def add_lead(storage, writer, csv_paths, name):
+    """Create a lead the way the /crm/leads handler does"""
+    lead_id = str(uuid4())
+    created_at = datetime.now().isoformat()
+    storage.add_lead({
+        "name": name, "phone": "9876543210", "city": "Mumbai", "source": None,
+        "lead_id": lead_id, "status": "NEW", "created_at": created_at,
+    })
+    writer.append(csv_paths["leads"], [lead_id, name, "9876543210", "Mumbai", "", "NEW", created_at])
+    return lead_id
+
+
+def add_visit(storage, writer, csv_paths, lead_id):
+    visit_id = str(uuid4())
+    visit_time = datetime.fromisoformat("2025-10-05T15:00:00+05:30")
+    created_at = datetime.now().isoformat()
+    storage.add_visit({
+        "lead_id": lead_id, "visit_time": visit_time, "notes": None,
+        "visit_id": visit_id, "status": "SCHEDULED", "created_at": created_at,
+    })
+    writer.append(csv_paths["visits"], [visit_id, lead_id, str(visit_time), "", "SCHEDULED", created_at])
+    return visit_id
+
+
+def update_status(storage, writer, csv_paths, lead_id, status, notes=None):
+    old_status, lead = storage.update_lead_status(lead_id, status, notes)
+    writer.append(
+        csv_paths["updates"],
+        [lead_id, old_status, status, notes or "", datetime.now().isoformat(), lead["version"]],
+    )
+
+
+def test_full_log_replay_without_snapshot(tmp_path, csv_paths):
+    """With no snapshot every CSV row is replayed, including status updates"""
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+    lead_id = add_lead(storage, writer, csv_paths, "Rohan Sharma")
+    visit_id = add_visit(storage, writer, csv_paths, lead_id)
+    update_status(storage, writer, csv_paths, lead_id, "WON", "Booked unit A2")
+    writer.close()
+
+    restored = MemoryStorage()
+    stats = recover(restored, str(tmp_path / "missing.msgpack"), csv_paths)
+
+    assert not stats.from_snapshot
+    assert stats.replayed_rows == 3
+    assert restored.leads == storage.leads
+    assert restored.visits == storage.visits
+
+
+def test_snapshot_plus_tail(tmp_path, csv_paths):
+    """Only rows written after the snapshot are replayed"""
+    snapshot_path = str(tmp_path / "crm_snapshot.msgpack")
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+
+    first = [add_lead(storage, writer, csv_paths, f"Lead {i}") for i in range(10)]
+    add_visit(storage, writer, csv_paths, first[0])
+    update_status(storage, writer, csv_paths, first[1], "IN_PROGRESS")
+    assert write_snapshot(storage, writer, snapshot_path, csv_paths) == 11
+
+    later = add_lead(storage, writer, csv_paths, "Later Lead")
+    update_status(storage, writer, csv_paths, first[1], "WON", "Closed")
+    update_status(storage, writer, csv_paths, later, "FOLLOW_UP")
+    writer.close()
+
+    restored = MemoryStorage()
+    stats = recover(restored, snapshot_path, csv_paths)
+
+    assert stats.from_snapshot
+    assert stats.replayed_rows == 3
+    assert stats.leads == 11
+    assert stats.visits == 1
+    assert restored.leads == storage.leads
+    assert restored.visits == storage.visits
+
+
+def test_torn_last_row_is_skipped(tmp_path, csv_paths):
+    """A partially written final row (crash mid-write) does not break recovery"""
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+    add_lead(storage, writer, csv_paths, "Rohan Sharma")
+    writer.close()
+    with open(csv_paths["leads"], 'a', encoding='utf-8') as f:
+        f.write("dead-beef,Half")
+
+    restored = MemoryStorage()
+    stats = recover(restored, str(tmp_path / "missing.msgpack"), csv_paths)
+
+    assert stats.leads == 1
+
+
+def test_racing_updates_logged_out_of_order(tmp_path, csv_paths):
+    """The highest version wins even when its row was logged first"""
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+    lead_id = add_lead(storage, writer, csv_paths, "Rohan Sharma")
+    now = datetime.now().isoformat()
+    writer.append(csv_paths["updates"], [lead_id, "IN_PROGRESS", "WON", "", now, 3])
+    writer.append(csv_paths["updates"], [lead_id, "NEW", "IN_PROGRESS", "", now, 2])
+    writer.close()
+
+    restored = MemoryStorage()
+    recover(restored, str(tmp_path / "missing.msgpack"), csv_paths)
+
+    assert restored.get_lead(lead_id)["status"] == "WON"
+    assert restored.get_lead(lead_id)["version"] == 3
+    assert [lead["lead_id"] for lead in restored.list_leads(status="WON")[0]] == [lead_id]
+
+
+def test_unversioned_update_rows_still_replay(tmp_path, csv_paths):
+    """Update rows logged before versions existed are applied in log order"""
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+    lead_id = add_lead(storage, writer, csv_paths, "Rohan Sharma")
+    now = datetime.now().isoformat()
+    writer.append(csv_paths["updates"], [lead_id, "NEW", "IN_PROGRESS", "", now])
+    writer.append(csv_paths["updates"], [lead_id, "IN_PROGRESS", "LOST", "Gone quiet", now])
+    writer.close()
+
+    restored = MemoryStorage()
+    recover(restored, str(tmp_path / "missing.msgpack"), csv_paths)
+
+    lead = restored.get_lead(lead_id)
+    assert (lead["status"], lead["notes"], lead["version"]) == ("LOST", "Gone quiet", 3)
+
+
+def test_compact_store_restores_from_memory_snapshot(tmp_path, csv_paths):
+    """The compact engine reads the same snapshot and logs as the memory one"""
+    snapshot_path = str(tmp_path / "crm_snapshot.msgpack")
+    storage, writer = MemoryStorage(), CSVWriteBehind()
+    first = [add_lead(storage, writer, csv_paths, f"Lead {i}") for i in range(5)]
+    add_visit(storage, writer, csv_paths, first[0])
+    update_status(storage, writer, csv_paths, first[1], "IN_PROGRESS", "Called back")
+    write_snapshot(storage, writer, snapshot_path, csv_paths)
+    add_lead(storage, writer, csv_paths, "Later Lead")
+    update_status(storage, writer, csv_paths, first[1], "WON")
+    writer.close()
+
+    restored = CompactStorage()
+    stats = recover(restored, snapshot_path, csv_paths)
+
+    assert (stats.leads, stats.visits) == (6, 1)
+    assert restored.leads == storage.leads
+    assert restored.visits == storage.visits
@@ -0,0 +1,77 @@
+"""
+Lazy startup: cheap import, cached Live API objects, per-phase timings
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot  # noqa: E402
+from audio_io import MemorySink, MemorySource  # noqa: E402
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_import_loads_neither_genai_nor_pyaudio():
+    code = (
+        "import sys, live_voice_bot\n"
+        "print(sorted(m for m in ('google.genai', 'pyaudio') if m in sys.modules))\n"
+        "print(round(live_voice_bot.STARTUP_TIMES['import'], 3))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        env={**os.environ, "GEMINI_API_KEY": "test-key"},
+    ).stdout.splitlines()
+    assert out[0] == "[]"
+    assert float(out[1]) > 0
+
+
+def test_tools_and_config_are_built_once():
+    assert live_voice_bot.get_config() is live_voice_bot.get_config()
+    assert live_voice_bot.CONFIG is live_voice_bot.get_config()
+    assert live_voice_bot.get_config().tools == live_voice_bot.get_tools()
+    names = [fd.name for fd in live_voice_bot.tools[0].function_declarations]
+    assert names == list(live_voice_bot.TOOL_FUNCTIONS)
+
+
+def test_start_up_opens_devices_once_and_logs_phases(monkeypatch):
+    events = []
+    monkeypatch.setattr(live_voice_bot, "log_event", lambda event, *a, **f: events.append((event, f)))
+
+    class CountingSource(MemorySource):
+        starts = 0
+
+        async def start(self):
+            CountingSource.starts += 1
+
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        class Session:
+            async def send(self, input=None, end_of_turn=False):
+                pass
+
+            async def receive(self):
+                await asyncio.Event().wait()
+                yield
+
+        yield Session()
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    loop = live_voice_bot.AudioLoop(source=CountingSource(b"\x01\x00" * 2048), sink=MemorySink(), vad_mode="off")
+
+    async def main():
+        await loop.start_up()
+        await loop.run_session()
+
+    asyncio.run(main())
+
+    assert loop.devices_started
+    assert CountingSource.starts == 1
+    ready = dict(events)["startup.ready"]
+    assert {"import_ms", "devices_ms", "ready_ms"} <= set(ready)
+    assert ready["ready_ms"] >= ready["import_ms"]
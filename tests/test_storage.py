@@ -0,0 +1,386 @@
+"""
+Unit tests for the mock CRM storage engines
+Every engine must behave like the original in-memory dicts
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from crm_compact import CompactStorage
+from crm_storage import MemoryStorage, SQLiteStorage, PostgresStorage, VersionConflict, create_storage
+
+
+@pytest.fixture(params=["memory", "compact", "sqlite", "postgres"])
+def storage(request, tmp_path):
+    """Yield each storage engine in turn (postgres only if CRM_TEST_DATABASE_URL is set)"""
+    if request.param == "memory":
+        engine = MemoryStorage()
+    elif request.param == "compact":
+        engine = CompactStorage()
+    elif request.param == "sqlite":
+        engine = SQLiteStorage(str(tmp_path / "crm.db"))
+    else:
+        conninfo = os.getenv("CRM_TEST_DATABASE_URL")
+        if not conninfo:
+            pytest.skip("CRM_TEST_DATABASE_URL not set")
+        engine = PostgresStorage(conninfo, min_size=1, max_size=2)
+    yield engine
+    engine.close()
+
+
+def make_lead(**overrides):
+    lead = {
+        "name": "Rohan Sharma",
+        "phone": "9876543210",
+        "city": "Gurgaon",
+        "source": "Instagram",
+        "lead_id": str(uuid4()),
+        "status": "NEW",
+        "created_at": datetime.now().isoformat(),
+    }
+    lead.update(overrides)
+    return lead
+
+
+def test_add_and_get_lead(storage):
+    """A stored lead is returned unchanged"""
+    lead = make_lead()
+    storage.add_lead(lead)
+
+    assert storage.get_lead(lead["lead_id"]) == lead
+
+
+def test_get_missing_lead(storage):
+    """Unknown lead ids return None"""
+    assert storage.get_lead(str(uuid4())) is None
+
+
+def test_update_lead_status(storage):
+    """Status updates return the old status and the updated lead"""
+    lead = make_lead()
+    storage.add_lead(lead)
+
+    old_status, updated = storage.update_lead_status(lead["lead_id"], "WON", "Booked unit A2")
+
+    assert old_status == "NEW"
+    assert updated["status"] == "WON"
+    assert updated["notes"] == "Booked unit A2"
+    assert storage.get_lead(lead["lead_id"])["status"] == "WON"
+
+
+def test_update_missing_lead(storage):
+    """Updating an unknown lead returns None"""
+    assert storage.update_lead_status(str(uuid4()), "WON") is None
+
+
+def test_list_preserves_insertion_order(storage):
+    """Leads and visits are listed in the order they were created"""
+    leads = [make_lead(name=f"Lead {i}") for i in range(5)]
+    for lead in leads:
+        storage.add_lead(lead)
+    storage.add_visit({
+        "lead_id": leads[0]["lead_id"],
+        "visit_time": datetime.fromisoformat("2025-10-05T15:00:00+05:30"),
+        "notes": "Site visit",
+        "visit_id": str(uuid4()),
+        "status": "SCHEDULED",
+        "created_at": datetime.now().isoformat(),
+    })
+
+    listed = [lead["lead_id"] for lead in storage.list_leads()[0]]
+    assert listed[-5:] == [lead["lead_id"] for lead in leads]
+
+    visits = storage.list_visits()[0]
+    assert visits[-1]["lead_id"] == leads[0]["lead_id"]
+    assert visits[-1]["status"] == "SCHEDULED"
+
+
+def test_create_storage_unknown_engine():
+    """An unknown CRM_STORAGE value is rejected"""
+    with pytest.raises(ValueError):
+        create_storage("mongodb")
+
+
+def test_list_leads_paginates(storage):
+    """Following next cursors visits every lead exactly once"""
+    leads = [make_lead(name=f"Lead {i}") for i in range(7)]
+    for lead in leads:
+        storage.add_lead(lead)
+
+    seen, after = [], 0
+    while True:
+        page, after = storage.list_leads(after=after, limit=3)
+        assert len(page) <= 3
+        seen.extend(lead["lead_id"] for lead in page)
+        if after is None:
+            break
+
+    assert seen == [lead["lead_id"] for lead in leads]
+
+
+def test_list_leads_filters(storage):
+    """Filters narrow the listing across pages"""
+    storage.add_lead(make_lead(city="Mumbai", status="NEW", created_at="2025-10-01T10:00:00"))
+    storage.add_lead(make_lead(city="Delhi", status="NEW", created_at="2025-10-02T10:00:00"))
+    storage.add_lead(make_lead(city="Mumbai", status="WON", created_at="2025-10-03T10:00:00"))
+    storage.add_lead(make_lead(city="Mumbai", source=None, created_at="2025-10-04T10:00:00"))
+
+    mumbai, _ = storage.list_leads(city="Mumbai")
+    assert len(mumbai) == 3
+
+    new_in_mumbai, _ = storage.list_leads(city="Mumbai", status="NEW")
+    assert [lead["created_at"] for lead in new_in_mumbai] == ["2025-10-01T10:00:00", "2025-10-04T10:00:00"]
+
+    window, _ = storage.list_leads(created_from="2025-10-02T00:00:00", created_to="2025-10-04T00:00:00")
+    assert [lead["city"] for lead in window] == ["Delhi", "Mumbai"]
+
+    with pytest.raises(ValueError):
+        storage.list_leads(colour="red")
+
+
+def test_add_lead_unique(storage):
+    """A second lead with the same normalized phone returns the first"""
+    first = make_lead(phone="9876543210")
+    lead, created = storage.add_lead_unique(first)
+    assert created
+    assert lead["lead_id"] == first["lead_id"]
+
+    lead, created = storage.add_lead_unique(make_lead(phone="+91 98765 43210"))
+    assert not created
+    assert lead["lead_id"] == first["lead_id"]
+
+    assert [lead["lead_id"] for lead in storage.find_leads_by_phone("09876543210")] == [first["lead_id"]]
+
+
+def test_status_index_follows_updates(storage):
+    """Filtering by status reflects status changes"""
+    leads = [make_lead(city="Nagpur") for _ in range(4)]
+    for lead in leads:
+        storage.add_lead(lead)
+    storage.update_lead_status(leads[2]["lead_id"], "WON")
+    storage.update_lead_status(leads[0]["lead_id"], "WON")
+
+    won, _ = storage.list_leads(city="Nagpur", status="WON")
+    assert [lead["lead_id"] for lead in won] == [leads[0]["lead_id"], leads[2]["lead_id"]]
+
+    new, _ = storage.list_leads(city="Nagpur", status="NEW")
+    assert [lead["lead_id"] for lead in new] == [leads[1]["lead_id"], leads[3]["lead_id"]]
+
+
+def test_status_updates_bump_the_version(storage):
+    """Leads start at version 1 and every status update adds one"""
+    lead = make_lead()
+    storage.add_lead(lead)
+    assert storage.get_lead(lead["lead_id"])["version"] == 1
+
+    _, updated = storage.update_lead_status(lead["lead_id"], "IN_PROGRESS")
+    assert updated["version"] == 2
+    _, updated = storage.update_lead_status(lead["lead_id"], "WON", expected_version=2)
+    assert updated["version"] == 3
+    assert storage.get_lead(lead["lead_id"])["version"] == 3
+
+
+def test_stale_expected_version_is_rejected(storage):
+    """A conditional update against an old version changes nothing"""
+    lead = make_lead()
+    storage.add_lead(lead)
+    storage.update_lead_status(lead["lead_id"], "IN_PROGRESS")
+
+    with pytest.raises(VersionConflict) as conflict:
+        storage.update_lead_status(lead["lead_id"], "LOST", expected_version=1)
+
+    assert (conflict.value.expected, conflict.value.current) == (1, 2)
+    current = storage.get_lead(lead["lead_id"])
+    assert (current["status"], current["version"]) == ("IN_PROGRESS", 2)
+
+
+def test_concurrent_conditional_updates_lose_nothing(storage):
+    """Threads retrying on conflict apply every update exactly once"""
+    lead = make_lead()
+    storage.add_lead(lead)
+    threads, per_thread = 8, 20
+    versions = []
+
+    def worker(status):
+        for _ in range(per_thread):
+            while True:
+                version = storage.get_lead(lead["lead_id"])["version"]
+                try:
+                    _, updated = storage.update_lead_status(lead["lead_id"], status, expected_version=version)
+                except VersionConflict:
+                    continue
+                versions.append(updated["version"])
+                break
+
+    workers = [
+        threading.Thread(target=worker, args=(("IN_PROGRESS", "FOLLOW_UP")[i % 2],))
+        for i in range(threads)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    assert sorted(versions) == list(range(2, 2 + threads * per_thread))
+    assert storage.get_lead(lead["lead_id"])["version"] == 1 + threads * per_thread
+
+
+def make_visit(lead_id, visit_time, **overrides):
+    visit = {
+        "lead_id": lead_id,
+        "visit_time": datetime.fromisoformat(visit_time),
+        "notes": None,
+        "visit_id": str(uuid4()),
+        "status": "SCHEDULED",
+        "created_at": datetime.now().isoformat(),
+    }
+    visit.update(overrides)
+    return visit
+
+
+def test_schedule_visits_rejects_overlaps(storage):
+    """A visit starting within one slot of the lead's other visits is refused"""
+    lead, other = make_lead(), make_lead(phone="9876500000")
+    storage.add_lead(lead)
+    storage.add_lead(other)
+    first = make_visit(lead["lead_id"], "2025-10-05T15:00:00+05:30")
+    hour = 3600
+
+    results = storage.schedule_visits([
+        first,
+        make_visit(lead["lead_id"], "2025-10-05T15:30:00+05:30"),
+        make_visit(lead["lead_id"], "2025-10-05T16:00:00+05:30"),
+        make_visit(lead["lead_id"], "2025-10-05T14:00:00+05:30"),
+        make_visit(other["lead_id"], "2025-10-05T15:00:00+05:30"),
+        make_visit(str(uuid4()), "2025-10-05T15:00:00+05:30"),
+    ], slot_seconds=hour)
+
+    # Back-to-back slots and other leads' visits do not overlap
+    assert [r if r is None else len(r) for r in results] == [0, 1, 0, 0, 0, None]
+    assert results[1][0]["visit_id"] == first["visit_id"]
+    assert len(storage.list_visits(lead_id=lead["lead_id"])[0]) == 3
+    # Without a slot length anything goes
+    assert storage.schedule_visits([make_visit(lead["lead_id"], "2025-10-05T15:00:00+05:30")]) == [[]]
+
+
+def test_visits_between_pages_in_time_order(storage):
+    """Range queries return [start, end) sorted by time, a page at a time"""
+    lead, other = make_lead(), make_lead(phone="9876500000")
+    storage.add_lead(lead)
+    storage.add_lead(other)
+    hours = [17, 9, 14, 11, 20]
+    for hour in hours:
+        storage.add_visit(make_visit(lead["lead_id"], f"2031-03-04T{hour:02d}:00:00+05:30"))
+    storage.add_visit(make_visit(other["lead_id"], "2031-03-04T12:00:00+05:30"))
+    start = datetime.fromisoformat("2031-03-04T10:00:00+05:30").timestamp()
+    end = datetime.fromisoformat("2031-03-04T20:00:00+05:30").timestamp()
+
+    def visit_hours(visits):
+        return [datetime.fromisoformat(str(v["visit_time"])).hour for v in visits]
+
+    page, after = storage.visits_between(start, end, limit=2)
+    assert visit_hours(page) == [11, 12]
+    page, after = storage.visits_between(start, end, after=after, limit=2)
+    assert visit_hours(page) == [14, 17]
+    assert after is None
+
+    page, _ = storage.visits_between(start, end, lead_id=lead["lead_id"])
+    assert visit_hours(page) == [11, 14, 17]
+    assert storage.visits_between(end, end + 3600, lead_id=other["lead_id"]) == ([], None)
+
+
+def test_compact_keeps_odd_ids_and_timestamps():
+    """Values the compact columns cannot pack are kept exactly as given"""
+    storage = CompactStorage()
+    lead = make_lead(lead_id="LEAD-7", created_at="yesterday", source=None)
+    upper = make_lead(lead_id=str(uuid4()).upper(), phone="0123", created_at="2025-10-05T15:00:00+05:30")
+    storage.add_lead(lead)
+    storage.add_lead(upper)
+    visit = make_visit("LEAD-7", "2025-10-05T15:00:00", visit_id="visit-1", notes="")
+    storage.add_visit(visit)
+
+    assert storage.get_lead("LEAD-7") == lead
+    assert storage.get_lead(upper["lead_id"]) == upper
+    assert storage.find_leads_by_phone("0123") == [upper]
+    assert storage.list_visits(lead_id="LEAD-7")[0] == [visit]
+    assert dict(storage.leads) == {"LEAD-7": lead, upper["lead_id"]: upper}
+
+
+def test_reads_return_consistent_copies(storage):
+    """get_lead() and find_leads_by_phone() never see half of a status update"""
+    lead = make_lead(phone="9811122233")
+    storage.add_lead(lead)
+    # Odd versions are FOLLOW_UP and even ones IN_PROGRESS (version 1 is NEW)
+    stop = threading.Event()
+    torn = []
+
+    def updater():
+        version = 1
+        while not stop.is_set():
+            version += 1
+            storage.update_lead_status(lead["lead_id"], "IN_PROGRESS" if version % 2 == 0 else "FOLLOW_UP")
+
+    def check(read):
+        if read["version"] > 1 and read["status"] != ("IN_PROGRESS" if read["version"] % 2 == 0 else "FOLLOW_UP"):
+            torn.append(read)
+
+    thread = threading.Thread(target=updater)
+    thread.start()
+    try:
+        for _ in range(300):
+            check(storage.get_lead(lead["lead_id"]))
+            check(storage.find_leads_by_phone(lead["phone"])[0])
+        snapshot = storage.get_lead(lead["lead_id"])
+        seen = dict(snapshot)
+        while storage.get_lead(lead["lead_id"])["version"] == seen["version"]:
+            pass
+    finally:
+        stop.set()
+        thread.join()
+
+    assert torn == []
+    # Later updates do not change a dict that was already returned
+    assert snapshot == seen
+
+
+def test_pages_are_copies(storage):
+    """A page being encoded is not changed by a status update made meanwhile"""
+    lead = make_lead(phone="9811122244")
+    storage.add_lead(lead)
+    stop = threading.Event()
+    torn = []
+
+    def updater():
+        version = 1
+        while not stop.is_set():
+            version += 1
+            storage.update_lead_status(
+                lead["lead_id"], "IN_PROGRESS" if version % 2 == 0 else "FOLLOW_UP", notes=f"call {version}"
+            )
+
+    thread = threading.Thread(target=updater)
+    thread.start()
+    try:
+        for _ in range(300):
+            page, _ = storage.list_leads()
+            encoded = json.loads(json.dumps(page[0], default=str))
+            if encoded["version"] > 1 and (
+                encoded["status"] != ("IN_PROGRESS" if encoded["version"] % 2 == 0 else "FOLLOW_UP")
+                or encoded["notes"] != f"call {encoded['version']}"
+            ):
+                torn.append(encoded)
+        page, _ = storage.list_leads()
+        seen = [dict(row) for row in page]
+        while storage.get_lead(lead["lead_id"])["version"] == seen[0]["version"]:
+            pass
+    finally:
+        stop.set()
+        thread.join()
+
+    assert torn == []
+    assert page == seen
@@ -0,0 +1,89 @@
+"""
+Unit tests for the G.711 codec and the streaming telephony source/sink
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from audio_io import MemorySink, MemorySource
+from telephony import ALAW, ULAW, StreamResampler, TelephonySink, TelephonySource, decode, encode
+
+
+def sine(rate, seconds, freq=440, level=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * freq * t) * level).astype(np.int16)
+
+
+@pytest.mark.parametrize("codec", [ULAW, ALAW])
+def test_codec_matches_reference(codec):
+    audioop = pytest.importorskip("audioop")
+    every_sample = np.arange(-32768, 32768, dtype=np.int16)
+    every_byte = bytes(range(256))
+    lin2 = audioop.lin2ulaw if codec == ULAW else audioop.lin2alaw
+    to_lin = audioop.ulaw2lin if codec == ULAW else audioop.alaw2lin
+
+    assert encode(every_sample, codec) == lin2(every_sample.tobytes(), 2)
+    assert decode(every_byte, codec).tobytes() == to_lin(every_byte, 2)
+
+
+@pytest.mark.parametrize("codec", [ULAW, ALAW])
+def test_codec_round_trip(codec):
+    x = sine(8000, 0.1)
+    y = decode(encode(x, codec), codec)
+    # G.711 keeps ~12 bits of precision: error stays within a few percent
+    assert np.max(np.abs(y.astype(int) - x)) < 0.04 * 8000 + 16
+
+
+def test_streaming_resampler_matches_one_shot():
+    x = sine(24000, 0.5)
+    whole = StreamResampler(24000, 8000)
+    expected = np.concatenate([whole.process(x), whole.process(x[:0], last=True)])
+
+    chunked = StreamResampler(24000, 8000)
+    parts = [chunked.process(x[i:i + 997]) for i in range(0, len(x), 997)]
+    parts.append(chunked.process(x[:0], last=True))
+
+    # Same output whatever the chunking (to within int16 dither)
+    streamed = np.concatenate(parts)
+    assert len(streamed) == len(expected) == 4000
+    assert np.max(np.abs(streamed.astype(int) - expected)) <= 4
+
+
+def test_telephony_source_upsamples_to_16k():
+    ulaw = encode(sine(8000, 1.0), ULAW)
+    source = TelephonySource(MemorySource(ulaw, chunk_size=80), ULAW)
+
+    async def read_all():
+        await source.start()
+        out = b""
+        while (chunk := await source.read()) is not None:
+            out += chunk
+        return out
+
+    pcm = np.frombuffer(asyncio.run(read_all()), dtype=np.int16)
+    assert len(pcm) == 16000
+    assert 7000 < np.max(np.abs(pcm[1000:-1000])) < 9000
+
+
+def test_telephony_sink_downsamples_and_encodes():
+    inner = MemorySink()
+    sink = TelephonySink(inner, ALAW)
+    pcm = sine(24000, 1.0).tobytes()
+
+    async def play():
+        await sink.start()
+        for i in range(0, len(pcm), 960):
+            await sink.write(pcm[i:i + 960])
+
+    asyncio.run(play())
+    # One byte per 8 kHz sample, less what the resampler is still holding
+    assert 7800 < len(inner.data) <= 8000
+    samples = decode(bytes(inner.data), ALAW)
+    assert 7000 < np.max(np.abs(samples[1000:])) < 9000
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        TelephonySource(MemorySource(b""), "gsm")
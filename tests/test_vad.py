@@ -0,0 +1,166 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import live_voice_bot  # noqa: E402
+from tests.fake_live import server_message  # noqa: E402
+from audio_io import MemorySink, MemorySource  # noqa: E402
+from vad import (  # noqa: E402
+    ACTIVITY_END,
+    ACTIVITY_START,
+    VAD_DROP,
+    VAD_THIN,
+    ActivityMarker,
+    VoiceActivityDetector,
+    create_vad,
+)
+
+RATE = 16000
+CHUNK = 1024  # samples, 64 ms
+
+
+def tone(seconds, freq=220, level=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * freq * t) * level * 32767).astype("<i2").tobytes()
+
+
+def noise(seconds, level=0.002, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * RATE)) * level * 32767).astype("<i2").tobytes()
+
+
+def chunks(pcm):
+    step = CHUNK * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+
+def run(vad, pcm):
+    out = []
+    for chunk in chunks(pcm):
+        out.extend(vad.process(chunk))
+    return out
+
+
+def markers(out):
+    return [item.kind for item in out if isinstance(item, ActivityMarker)]
+
+
+def test_tone_is_speech_and_noise_is_not():
+    vad = VoiceActivityDetector(RATE)
+    assert not vad.is_speech(noise(0.064))
+    assert vad.is_speech(tone(0.064))
+    assert not vad.is_speech(b"\x00" * CHUNK * 2)
+
+
+def test_markers_around_speech():
+    vad = VoiceActivityDetector(RATE, mode=VAD_DROP, hangover_ms=300)
+    out = run(vad, noise(1) + tone(1) + noise(1, seed=1))
+
+    assert markers(out) == [ACTIVITY_START, ACTIVITY_END]
+    assert vad.stats.speech_segments == 1
+    assert not vad.active
+
+
+def test_preroll_forwards_audio_before_onset():
+    silence = noise(16 * CHUNK / RATE)
+    speech = tone(8 * CHUNK / RATE)
+    vad = VoiceActivityDetector(RATE, mode=VAD_DROP, preroll_ms=200)
+    out = run(vad, silence + speech)
+
+    assert isinstance(out[0], ActivityMarker) and out[0].kind == ACTIVITY_START
+    # The last ~200 ms of silence follows the marker, in order, then the speech
+    held = b"".join(out[1:-8])
+    assert held == silence[-len(held):]
+    assert 0.2 <= len(held) / (2 * RATE) < 0.2 + CHUNK / RATE
+    assert b"".join(out[-8:]) == speech
+
+
+def test_hangover_keeps_trailing_audio():
+    pcm = tone(0.5) + noise(2)
+    short = VoiceActivityDetector(RATE, mode=VAD_DROP, hangover_ms=100)
+    long = VoiceActivityDetector(RATE, mode=VAD_DROP, hangover_ms=1000)
+    run(short, pcm)
+    run(long, pcm)
+    assert long.stats.chunks_sent > short.stats.chunks_sent
+
+
+def test_drop_sends_no_silence_and_thin_sends_some():
+    pcm = noise(3)
+    drop = VoiceActivityDetector(RATE, mode=VAD_DROP)
+    thin = VoiceActivityDetector(RATE, mode=VAD_THIN, thin_every=4)
+
+    assert run(drop, pcm) == []
+    sent = run(thin, pcm)
+    assert len(sent) == len(chunks(pcm)) // 4
+    assert drop.stats.saved_ratio == 1.0
+    assert 0.7 < thin.stats.saved_ratio < 0.8
+
+
+def test_noise_floor_adapts():
+    loud_hum = noise(3, level=0.02)  # ~ -34 dBFS, above the fixed threshold
+    vad = VoiceActivityDetector(RATE, mode=VAD_DROP)
+    out = run(vad, loud_hum)
+    assert vad.noise_db > vad.energy_db
+    # Speech over the hum is still detected
+    out = run(vad, tone(0.5, level=0.5))
+    assert markers(out) == [ACTIVITY_START]
+
+
+def test_create_vad():
+    assert create_vad("off") is None
+    assert create_vad("drop").mode == VAD_DROP
+    with pytest.raises(ValueError):
+        create_vad("bogus")
+
+
+class EchoLiveSession:
+    """Echoes audio back and records activity markers"""
+
+    def __init__(self):
+        self.sent = asyncio.Queue()
+        self.activity = []
+
+    async def send(self, input=None, end_of_turn=False):
+        if isinstance(input, dict):
+            await self.sent.put(input["data"])
+
+    async def send_realtime_input(self, activity_start=None, activity_end=None, **kwargs):
+        self.activity.append("start" if activity_start is not None else "end")
+
+    async def receive(self):
+        while True:
+            data = await self.sent.get()
+            yield server_message(data=data)
+
+
+def test_audio_loop_drop_mode(monkeypatch):
+    """Only speech reaches the model, framed by explicit activity markers"""
+    sessions = []
+    configs = []
+
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        configs.append(config)
+        sessions.append(EchoLiveSession())
+        yield sessions[-1]
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+    speech = tone(0.5)
+    pcm = noise(0.5) + speech + noise(1.5, seed=1)
+    sink = MemorySink()
+    loop = live_voice_bot.AudioLoop(
+        source=MemorySource(pcm, realtime=True), sink=sink, vad_mode=VAD_DROP
+    )
+    loop.vad.hangover = 0.3
+
+    asyncio.run(loop.run_session())
+
+    assert sessions[0].activity == ["start", "end"]
+    assert configs[0].realtime_input_config.automatic_activity_detection.disabled
+    assert loop.vad.stats.saved_ratio > 0.3
+    assert speech[:CHUNK * 2] in bytes(sink.data)
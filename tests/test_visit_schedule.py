@@ -180,6 +180,59 @@ def test_schedule_visit_with_timezone(created_lead):
     assert response.status_code == 200
 
 
+def test_schedule_overlapping_visit_conflicts(created_lead):
+    """A second visit for the lead inside the first one's slot gets 409"""
+    first = requests.post(
+        f"{BASE_URL}/crm/visits",
+        json={"lead_id": created_lead, "visit_time": "2031-05-06T15:00:00+05:30"},
+    )
+    assert first.status_code == 200
+
+    response = requests.post(
+        f"{BASE_URL}/crm/visits",
+        json={"lead_id": created_lead, "visit_time": "2031-05-06T15:30:00+05:30"},
+    )
+
+    assert response.status_code == 409
+    conflicts = response.json()["detail"]["conflicts"]
+    assert [c["visit_id"] for c in conflicts] == [first.json()["visit_id"]]
+
+
+def test_visits_in_range(created_lead):
+    """The range endpoint returns the lead's visits in the window in time order"""
+    ids = {}
+    for hour in (16, 10, 13, 19):
+        response = requests.post(
+            f"{BASE_URL}/crm/visits",
+            json={"lead_id": created_lead, "visit_time": f"2031-05-07T{hour}:00:00+05:30"},
+        )
+        ids[hour] = response.json()["visit_id"]
+
+    params = {
+        "start": "2031-05-07T13:00:00+05:30",
+        "end": "2031-05-07T19:00:00+05:30",
+        "lead_id": created_lead,
+        "limit": 1,
+    }
+    first = requests.get(f"{BASE_URL}/crm/visits/range", params=params).json()
+    second = requests.get(
+        f"{BASE_URL}/crm/visits/range", params={**params, "cursor": first["next_cursor"]}
+    ).json()
+
+    assert [v["visit_id"] for v in first["visits"] + second["visits"]] == [ids[13], ids[16]]
+    assert second["next_cursor"] is None
+
+
+def test_visits_in_range_rejects_empty_window():
+    """end must come after start"""
+    response = requests.get(
+        f"{BASE_URL}/crm/visits/range",
+        params={"start": "2031-05-07T13:00:00", "end": "2031-05-07T13:00:00"},
+    )
+
+    assert response.status_code == 400
+
+
 if __name__ == "__main__":
     print("Running Visit Schedule Tests...")
     print("Make sure mock CRM server is running on port 8001!")
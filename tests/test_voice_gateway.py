@@ -0,0 +1,158 @@
+"""
+Unit tests for the multi-session voice gateway (Live API replaced by a fake)
+"""
+
+import asyncio
+import json
+import os
+import signal
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+import live_voice_bot
+import voice_gateway
+from tests.fake_live import server_message
+from telephony import decode, encode
+from voice_gateway import TRY_AGAIN_LATER, VoiceGateway
+
+
+class FakeLiveSession:
+    """Echoes every audio chunk back as model audio and answers text with text"""
+
+    def __init__(self):
+        self.responses = asyncio.Queue()
+
+    async def send(self, input, end_of_turn=False):
+        if isinstance(input, dict):
+            await self.responses.put(server_message(data=input["data"]))
+        else:
+            await self.responses.put(server_message(text=f"echo: {input}"))
+
+    async def receive(self):
+        # One never-ending turn (a real turn ends at turn_complete)
+        while True:
+            yield await self.responses.get()
+
+
+@pytest.fixture
+def fake_live(monkeypatch):
+    @asynccontextmanager
+    async def fake_connect(model, config):
+        yield FakeLiveSession()
+
+    monkeypatch.setattr(live_voice_bot.client.aio.live, "connect", fake_connect)
+
+
+async def start_gateway(max_sessions, codec="pcm"):
+    gateway = VoiceGateway(max_sessions=max_sessions, vad_mode="off", codec=codec)
+    server = await serve(gateway.handle_caller, "127.0.0.1", 0).__aenter__()
+    port = next(iter(server.sockets)).getsockname()[1]
+    return gateway, server, f"ws://127.0.0.1:{port}"
+
+
+def test_concurrent_sessions_are_independent(fake_live):
+    """Each caller gets its own session and only its own audio back"""
+
+    async def scenario():
+        gateway, server, url = await start_gateway(max_sessions=10)
+        callers = [await connect(url) for _ in range(5)]
+        hellos = [json.loads(await ws.recv()) for ws in callers]
+        assert len({hello["session_id"] for hello in hellos}) == 5
+        assert gateway.stats()["active"] == 5
+
+        for i, ws in enumerate(callers):
+            await ws.send(bytes([i]) * 320)
+        for i, ws in enumerate(callers):
+            assert await asyncio.wait_for(ws.recv(), 2) == bytes([i]) * 320
+
+        await callers[0].send("hello")
+        assert json.loads(await asyncio.wait_for(callers[0].recv(), 2)) == {
+            "type": "text",
+            "text": "echo: hello",
+        }
+
+        for ws in callers:
+            await ws.close()
+        for _ in range(50):
+            if not gateway.sessions:
+                break
+            await asyncio.sleep(0.02)
+        assert gateway.stats()["active"] == 0
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_max_sessions_enforced(fake_live):
+    """Callers beyond max_sessions are turned away with 1013"""
+
+    async def scenario():
+        gateway, server, url = await start_gateway(max_sessions=1)
+        first = await connect(url)
+        await first.recv()
+
+        second = await connect(url)
+        with pytest.raises(ConnectionClosed) as e:
+            await asyncio.wait_for(second.recv(), 2)
+        assert e.value.rcvd.code == TRY_AGAIN_LATER
+        assert gateway.stats()["rejected"] == 1
+
+        await first.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_telephony_caller(fake_live):
+    """A G.711 caller sends and receives 8 kHz mu-law frames"""
+
+    async def scenario():
+        gateway, server, url = await start_gateway(max_sessions=1, codec="ulaw")
+        ws = await connect(url)
+        await ws.recv()  # session hello
+
+        t = np.arange(8000) / 8000
+        speech = (np.sin(2 * np.pi * 300 * t) * 8000).astype(np.int16)
+        for i in range(0, len(speech), 160):  # 20 ms frames
+            await ws.send(encode(speech[i:i + 160], "ulaw"))
+
+        received = b""
+        while len(received) < 2000:
+            received += await asyncio.wait_for(ws.recv(), 2)
+        # The fake echoes 16 kHz audio as if it were 24 kHz model audio, so
+        # the caller gets it back 8 kHz-encoded at 2/3 the length
+        samples = decode(received, "ulaw").astype(np.float64)
+        assert np.sqrt(np.mean(samples[500:] ** 2)) > 3000
+
+        await ws.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_repeated_stop_signals(monkeypatch):
+    """A second SIGTERM while the gateway is shutting down is ignored"""
+    monkeypatch.setattr(voice_gateway, "warm_up", lambda: None)
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        serving = asyncio.create_task(VoiceGateway(vad_mode="off").serve("127.0.0.1", 0))
+        await asyncio.sleep(0.2)
+        os.kill(os.getpid(), signal.SIGTERM)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(serving, 5)
+
+    asyncio.run(main())
+    assert errors == []
@@ -0,0 +1,200 @@
+"""
+Client-side voice activity detection for the uplink audio
+
+``VoiceActivityDetector.process(chunk)`` sits between the audio source and
+``out_queue``. It splits each chunk into short frames and scores them all at
+once with NumPy (RMS energy in dBFS and zero-crossing rate), then decides
+what to forward:
+
+- speech chunks are forwarded, preceded by up to ``preroll_ms`` of the
+  silence that was held back just before them, so word onsets aren't clipped
+- after speech, ``hangover_ms`` of trailing audio is still forwarded so
+  pauses inside a sentence (and the server's own end-of-turn detection) see
+  real silence
+- other silent chunks are dropped (``drop``) or only one in ``thin_every``
+  is forwarded (``thin``)
+
+``ActivityMarker`` items mark where speech starts and ends.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Union
+
+import numpy as np
+
+VAD_OFF = "off"
+VAD_THIN = "thin"  # forward one silent chunk in thin_every; server-side VAD stays on
+VAD_DROP = "drop"  # forward no silence; send explicit activity start/end instead
+
+VAD_MODE = os.getenv("VAD_MODE", VAD_THIN)
+VAD_ENERGY_DB = float(os.getenv("VAD_ENERGY_DB", "-50"))
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+VAD_ZCR_MAX = float(os.getenv("VAD_ZCR_MAX", "0.35"))
+VAD_HANGOVER_MS = float(os.getenv("VAD_HANGOVER_MS", "800"))
+VAD_PREROLL_MS = float(os.getenv("VAD_PREROLL_MS", "200"))
+VAD_THIN_EVERY = int(os.getenv("VAD_THIN_EVERY", "8"))
+
+ACTIVITY_START = "start"
+ACTIVITY_END = "end"
+
+# Frames louder than the threshold by this much count as speech whatever their ZCR
+_LOUD_MARGIN_DB = 15.0
+
+
+@dataclass
+class ActivityMarker:
+    kind: str  # ACTIVITY_START or ACTIVITY_END
+    at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class VADStats:
+    chunks_in: int = 0
+    chunks_sent: int = 0
+    bytes_in: int = 0
+    bytes_sent: int = 0
+    speech_segments: int = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        """Fraction of uplink audio bytes not sent"""
+        return 1 - self.bytes_sent / self.bytes_in if self.bytes_in else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_sent": self.chunks_sent,
+            "speech_segments": self.speech_segments,
+            "saved_ratio": round(self.saved_ratio, 3),
+        }
+
+
+class VoiceActivityDetector:
+    """Energy + zero-crossing VAD with hangover and pre-roll over 16-bit PCM chunks
+
+    The energy threshold is ``energy_db`` or ``margin_db`` above a running
+    estimate of the background noise, whichever is higher. A frame is speech
+    when it is above the threshold and its zero-crossing rate is below
+    ``zcr_max`` (broadband hiss crosses zero far more often than voice), or
+    when it is much louder than the threshold.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        mode: str = VAD_MODE,
+        frame_ms: float = 20,
+        energy_db: float = VAD_ENERGY_DB,
+        margin_db: float = VAD_MARGIN_DB,
+        zcr_max: float = VAD_ZCR_MAX,
+        hangover_ms: float = VAD_HANGOVER_MS,
+        preroll_ms: float = VAD_PREROLL_MS,
+        thin_every: int = VAD_THIN_EVERY,
+    ):
+        if mode not in (VAD_THIN, VAD_DROP):
+            raise ValueError(f"Unknown VAD mode: {mode}")
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.energy_db = energy_db
+        self.margin_db = margin_db
+        self.zcr_max = zcr_max
+        self.hangover = hangover_ms / 1000
+        self.preroll = preroll_ms / 1000
+        self.thin_every = max(1, thin_every)
+
+        self.noise_db = energy_db - margin_db
+        self.active = False
+        self.last_speech_at = None  # when the latest speech chunk was processed
+        self._hangover_left = 0.0
+        self._preroll = deque()
+        self._preroll_seconds = 0.0
+        self._silent_chunks = 0
+        self.stats = VADStats()
+
+    def is_speech(self, chunk: bytes) -> bool:
+        """Score every frame of ``chunk`` at once; True if any frame is speech"""
+        samples = np.frombuffer(chunk, dtype="<i2")
+        usable = len(samples) // self.frame_len * self.frame_len
+        if usable:
+            frames = samples[:usable].reshape(-1, self.frame_len)
+        elif len(samples) > 1:
+            frames = samples.reshape(1, -1)  # shorter than one frame
+        else:
+            return False
+
+        scaled = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(scaled * scaled, axis=1))
+        db = 20 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+
+        threshold = max(self.energy_db, self.noise_db + self.margin_db)
+        voiced = (db > threshold) & (zcr < self.zcr_max)
+        speech = voiced | (db > threshold + _LOUD_MARGIN_DB)
+
+        background = db[~voiced]
+        if len(background):
+            # Track the background level from unvoiced frames, so steady loud
+            # hiss raises the floor instead of counting as speech forever
+            self.noise_db = 0.95 * self.noise_db + 0.05 * float(background.mean())
+        return bool(speech.any())
+
+    def process(self, chunk: bytes) -> List[Union[bytes, ActivityMarker]]:
+        """Chunks to forward (in order), with markers at speech start/end"""
+        self.stats.chunks_in += 1
+        self.stats.bytes_in += len(chunk)
+        duration = len(chunk) / (2 * self.sample_rate)
+        out = []
+
+        if self.is_speech(chunk):
+            self.last_speech_at = time.monotonic()
+            if not self.active:
+                self.active = True
+                self.stats.speech_segments += 1
+                out.append(ActivityMarker(ACTIVITY_START))
+                out.extend(held for held, _ in self._preroll)
+                self._preroll.clear()
+                self._preroll_seconds = 0.0
+            self._hangover_left = self.hangover
+            out.append(chunk)
+        elif self.active:
+            out.append(chunk)
+            self._hangover_left -= duration
+            if self._hangover_left <= 0:
+                self.active = False
+                self._silent_chunks = 0
+                out.append(ActivityMarker(ACTIVITY_END))
+        else:
+            self._silent_chunks += 1
+            if self.mode == VAD_THIN and self._silent_chunks % self.thin_every == 0:
+                # Keep-alive: forwarded silence doesn't need to be replayed as pre-roll
+                self._preroll.clear()
+                self._preroll_seconds = 0.0
+                out.append(chunk)
+            else:
+                self._hold(chunk, duration)
+
+        for item in out:
+            if isinstance(item, bytes):
+                self.stats.chunks_sent += 1
+                self.stats.bytes_sent += len(item)
+        return out
+
+    def _hold(self, chunk: bytes, duration: float):
+        """Keep the most recent ``preroll`` seconds of dropped silence"""
+        self._preroll.append((chunk, duration))
+        self._preroll_seconds += duration
+        while self._preroll and self._preroll_seconds - self._preroll[0][1] >= self.preroll:
+            _, dropped = self._preroll.popleft()
+            self._preroll_seconds -= dropped
+
+
+def create_vad(mode: str = VAD_MODE, sample_rate: int = 16000):
+    """VAD for ``VAD_MODE`` (off | thin | drop); None when off"""
+    if mode == VAD_OFF:
+        return None
+    return VoiceActivityDetector(sample_rate=sample_rate, mode=mode)
@@ -0,0 +1,170 @@
+"""
+Multi-session voice gateway: many concurrent callers in one process
+
+Each caller connects over a websocket and gets its own Live API session
+(``GatewaySession``, an ``AudioLoop`` whose audio comes from and goes to the
+websocket instead of the local sound card). Every session runs on the same
+event loop and shares the Gemini client and the CRM connection pool.
+
+Websocket protocol:
+- caller -> gateway, binary frames: 16 kHz mono 16-bit PCM microphone audio
+- caller -> gateway, text frames: a typed message for the model
+- gateway -> caller, binary frames: 24 kHz mono 16-bit PCM model audio
+- gateway -> caller, text frames: JSON, ``{"type": "session", "session_id": ...}``
+  once on connect, then ``{"type": "text", "text": ...}`` for model text and
+  ``{"type": "interrupted"}`` when the caller talks over the model (drop any
+  model audio not yet played)
+
+With ``GATEWAY_AUDIO_CODEC=ulaw`` (or ``alaw``) binary frames in both
+directions are 8 kHz G.711 instead, as delivered by telephony providers;
+the gateway converts to and from the Live API's PCM rates.
+
+When ``GATEWAY_MAX_SESSIONS`` callers are connected, new connections are
+closed with code 1013 (try again later).
+"""
+
+import asyncio
+import json
+import os
+import signal
+import time
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from audio_io import WebSocketSink, WebSocketSource
+from event_log import WARNING, log_event, setup_event_log, shutdown_event_log
+from live_voice_bot import AudioLoop, crm, log_latency_stats, warm_up
+from metrics import METRICS_PORT, serve_metrics
+from telephony import TelephonySink, TelephonySource
+from vad import VAD_MODE
+
+GATEWAY_HOST = os.getenv("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "8765"))
+GATEWAY_MAX_SESSIONS = int(os.getenv("GATEWAY_MAX_SESSIONS", "50"))
+# Caller audio format: pcm | ulaw | alaw
+GATEWAY_AUDIO_CODEC = os.getenv("GATEWAY_AUDIO_CODEC", "pcm")
+
+# Websocket close code for "server overloaded, try again later"
+TRY_AGAIN_LATER = 1013
+
+
+class GatewaySession(AudioLoop):
+    """An AudioLoop whose microphone and speaker are one websocket caller
+
+    The session ends when the caller hangs up (the websocket source ends).
+    """
+
+    def __init__(self, websocket, vad_mode: str = VAD_MODE, codec: str = GATEWAY_AUDIO_CODEC):
+        source = WebSocketSource(websocket, on_text=self.send_user_text)
+        sink = WebSocketSink(websocket)
+        if codec != "pcm":
+            source = TelephonySource(source, codec)
+            sink = TelephonySink(sink, codec)
+        super().__init__(source=source, sink=sink, vad_mode=vad_mode)
+        self.websocket = websocket
+
+    async def listen_audio(self):
+        try:
+            await self.websocket.send(json.dumps({"type": "session", "session_id": self.session_key}))
+        except ConnectionClosed:
+            return
+        await super().listen_audio()
+
+    async def handle_text(self, text):
+        await self.send_event({"type": "text", "text": text})
+
+    async def handle_interrupted(self):
+        await self.send_event({"type": "interrupted"})
+
+    async def send_event(self, event: dict):
+        try:
+            await self.websocket.send(json.dumps(event))
+        except ConnectionClosed:
+            pass
+
+
+class VoiceGateway:
+    """Websocket server running one GatewaySession per connected caller"""
+
+    def __init__(
+        self,
+        max_sessions: int = GATEWAY_MAX_SESSIONS,
+        vad_mode: str = VAD_MODE,
+        codec: str = GATEWAY_AUDIO_CODEC,
+    ):
+        self.max_sessions = max_sessions
+        self.vad_mode = vad_mode
+        self.codec = codec
+        self.sessions = set()
+
+        # Counters for monitoring
+        self.sessions_started = 0
+        self.sessions_rejected = 0
+
+    async def handle_caller(self, websocket):
+        if len(self.sessions) >= self.max_sessions:
+            self.sessions_rejected += 1
+            log_event("gateway.session_rejected", WARNING, active=len(self.sessions))
+            await websocket.close(TRY_AGAIN_LATER, "Gateway at capacity")
+            return
+
+        session = GatewaySession(websocket, self.vad_mode, self.codec)
+        self.sessions.add(session)
+        self.sessions_started += 1
+        started = time.monotonic()
+        log_event("gateway.session_started", session_id=session.session_key, active=len(self.sessions))
+        try:
+            await session.run_session()
+        finally:
+            self.sessions.discard(session)
+            log_event(
+                "gateway.session_ended",
+                session_id=session.session_key,
+                seconds=round(time.monotonic() - started, 1),
+                active=len(self.sessions),
+            )
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "started": self.sessions_started,
+            "rejected": self.sessions_rejected,
+        }
+
+    async def serve(self, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT):
+        """Serve callers until SIGINT/SIGTERM"""
+        stop = asyncio.get_running_loop().create_future()
+
+        def request_stop():
+            # A second Ctrl+C / SIGTERM while shutting down is a no-op
+            if not stop.done():
+                stop.set_result(None)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # e.g. Windows; Ctrl+C still raises KeyboardInterrupt
+
+        metrics_server = await serve_metrics() if METRICS_PORT else None
+        try:
+            # Load the Live API client now rather than on the first caller
+            await asyncio.to_thread(warm_up)
+            async with serve(self.handle_caller, host, port):
+                log_event("gateway.listening", host=host, port=port, max_sessions=self.max_sessions)
+                await stop
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            log_latency_stats()
+            await crm.aclose()
+
+
+if __name__ == "__main__":
+    setup_event_log()
+    try:
+        asyncio.run(VoiceGateway().serve())
+    finally:
+        shutdown_event_log()